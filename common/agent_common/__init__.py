@@ -0,0 +1 @@
+#Modules shared by the text and voice agents: pooled Azure OpenAI clients, the rate limit scheduler, single-flight, embedding cache and batcher, token counting and metrics.
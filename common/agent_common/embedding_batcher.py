@@ -0,0 +1,111 @@
+#Micro-batching of embedding requests: concurrent single-text requests are coalesced into one embeddings call.
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from agent_common.llm_scheduler import get_llm_scheduler
+
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests for up to `max_wait_ms` or `max_batch_size` inputs, sends them as one
+    `embeddings.create(input=[...])` call and hands each caller its own vector.
+
+    `embed` blocks the calling thread and `aembed` awaits without blocking the event loop; both can be used
+    from any number of threads or tasks at once. Batches are sent from a small thread pool so a slow call
+    does not stop the next batch from forming.
+
+    Args:
+        client: An AzureOpenAI client.
+        model (str): The embedding deployment.
+        max_batch_size (int): Maximum inputs per embeddings call.
+        max_wait_ms (float): How long the first request of a batch waits for company.
+        max_in_flight (int): Maximum embeddings calls running at the same time.
+    """
+
+    def __init__(self, client, model: str, max_batch_size: int = 16, max_wait_ms: float = 5.0, max_in_flight: int = 4):
+        self.client = client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests: "queue.Queue[tuple]" = queue.Queue()
+        self._senders = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding-batch")
+        self.batches = 0
+        self.inputs = 0
+        self._stats_lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, name="embedding-batcher", daemon=True)
+        self._collector.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._requests.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self) -> Dict[str, float]:
+        return {"batches": self.batches, "inputs": self.inputs,
+                "avg_batch_size": self.inputs / self.batches if self.batches else 0.0}
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch: List[tuple]) -> None:
+        #Batches are sent from several threads at once
+        with self._stats_lock:
+            self.batches += 1
+            self.inputs += len(batch)
+        try:
+            response = get_llm_scheduler().request(self.client.embeddings.create, input=[text for text, _ in batch], model=self.model)
+            for item in response.data:
+                batch[item.index][1].set_result(item.embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        #A short or partial response must not leave the callers it skipped waiting forever
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_exception(RuntimeError(f"embeddings response of {len(batch)} inputs has no vector for input {index}"))
+
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(client, model: str) -> EmbeddingBatcher:
+    """
+    Process-wide batcher for an embedding deployment, or None unless EMBEDDING_BATCHING is set.
+    Tuned with EMBEDDING_BATCH_MAX_SIZE and EMBEDDING_BATCH_MAX_WAIT_MS.
+    """
+    if os.getenv("EMBEDDING_BATCHING", "false").lower() not in ("1", "true", "yes"):
+        return None
+    batcher = _batchers.get(model)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(model)
+            if batcher is None:
+                batcher = EmbeddingBatcher(client, model,
+                                           max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "16")),
+                                           max_wait_ms=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")))
+                _batchers[model] = batcher
+    return batcher
@@ -0,0 +1,126 @@
+#Cache of query embeddings keyed by embedding deployment and normalized text.
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent_common.single_flight import get_single_flight
+
+
+def normalize_text(text: str) -> str:
+    """Case and whitespace insensitive key for a query, so "What's the baggage limit? " and "what's the  baggage limit?" share an entry."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings with a time-to-live and an optional SQLite tier that survives restarts.
+
+    Args:
+        max_entries (int): Maximum number of embeddings kept in memory; least recently used entries are evicted first.
+        ttl_seconds (float): Entries older than this are treated as misses, both in memory and on disk.
+        persist_path (str): Optional SQLite file used as a second tier behind the in-memory LRU.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400, persist_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (deployment TEXT, text TEXT, created REAL, vector BLOB, PRIMARY KEY (deployment, text))")
+            self._db.commit()
+
+    def get(self, deployment: str, text: str) -> Optional[List[float]]:
+        key = (deployment, normalize_text(text))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT created, vector FROM embeddings WHERE deployment = ? AND text = ?", key).fetchone()
+                if row is not None and now - row[0] <= self.ttl_seconds:
+                    embedding = array("d", row[1]).tolist()
+                    self._remember(key, row[0], embedding)
+                    self.disk_hits += 1
+                    return embedding
+            self.misses += 1
+            return None
+
+    def put(self, deployment: str, text: str, embedding: List[float]) -> None:
+        key = (deployment, normalize_text(text))
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, embedding)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", (*key, created, array("d", embedding).tobytes()))
+                self._db.commit()
+
+    def get_or_create(self, deployment: str, text: str, create: Callable[[str], List[float]]) -> List[float]:
+        """
+        Return the cached embedding of `text`, calling `create(text)` and caching its result on a miss. Concurrent
+        misses of the same text share one `create` call when single-flight is on.
+        """
+        embedding = self.get(deployment, text)
+        if embedding is None:
+            in_flight = get_single_flight("embeddings")
+            if in_flight is None:
+                return self._create(deployment, text, create)
+            embedding = in_flight.do((deployment, normalize_text(text)), lambda: self._create(deployment, text, create))
+        return embedding
+
+    def _create(self, deployment: str, text: str, create: Callable[[str], List[float]]) -> List[float]:
+        embedding = create(text)
+        self.put(deployment, text, embedding)
+        return embedding
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+    def _remember(self, key: Tuple[str, str], created: float, embedding: List[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (created, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache configured with EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL and EMBEDDING_CACHE_FILE."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+                    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "86400")),
+                    persist_path=os.getenv("EMBEDDING_CACHE_FILE") or None,
+                )
+    return _embedding_cache
@@ -0,0 +1,331 @@
+#Every Azure OpenAI request goes through one scheduler: per-deployment RPM/TPM token buckets, priority queues and retries on 429 honoring retry-after.
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import openai
+from tenacity import AsyncRetrying, Retrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from agent_common import metrics
+from agent_common.token_counter import get_token_counter
+
+#Lower is served first: the customer's turn, then routing (speculative ranking included) and rolling summaries it may wait on, then work nobody waits on (intent shift checks)
+PRIORITIES = {"interactive": 0, "routing": 1, "background": 2}
+#Errors the SDK would have retried itself; 429s additionally pause their deployment for the retry-after the service asks for
+RETRIED_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+llm_requests = metrics.counter("llm_requests", "Requests sent to Azure OpenAI through the scheduler")
+llm_throttled = metrics.counter("llm_throttled", "429 responses from Azure OpenAI")
+llm_retries = metrics.counter("llm_retries", "Azure OpenAI requests retried after a 429 or a transient error")
+llm_tokens_estimated = metrics.counter("llm_tokens_estimated", "Tokens reserved for requests before sending them")
+llm_tokens_used = metrics.counter("llm_tokens_used", "Tokens Azure OpenAI reported in response.usage")
+llm_prompt_tokens = metrics.counter("llm_prompt_tokens", "Prompt tokens Azure OpenAI reported in response.usage")
+llm_completion_tokens = metrics.counter("llm_completion_tokens", "Completion tokens Azure OpenAI reported in response.usage")
+llm_call = metrics.histogram("llm_call_seconds", "Azure OpenAI request time without the wait for capacity, to the first chunk for streams")
+llm_queue_wait = {priority: metrics.histogram("llm_queue_wait_seconds", "Time requests waited for rate limit capacity", labels={"priority": priority})
+                  for priority in PRIORITIES}
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units evenly over the minute, holding at most `burst_seconds` worth of them: Azure
+    OpenAI checks its quotas over intervals of 1 or 10 seconds, so a full minute's quota sent at once is throttled.
+    The level goes negative when a request turns out to use more than was reserved.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available; a request larger than the bucket waits for a full bucket."""
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _Deployment:
+    def __init__(self, rpm: Optional[float], tpm: Optional[float], burst_seconds: float):
+        self.requests = TokenBucket(rpm, burst_seconds) if rpm else None
+        self.tokens = TokenBucket(tpm, burst_seconds) if tpm else None
+        self.queue = []
+        self.paused_until = 0.0
+
+
+class _Waiter:
+    def __init__(self, priority: int, seq: int, tokens: int, loop=None):
+        self.key = (priority, seq)
+        self.tokens = tokens
+        self.granted = False
+        self.cancelled = False
+        self.event = threading.Event() if loop is None else None
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """'gpt-4o=300/50000,text-embedding-ada-002=600/120000' -> {deployment: (rpm, tpm)}; 0 or an empty side means no limit."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        deployment, _, rates = entry.partition("=")
+        rpm, _, tpm = rates.partition("/")
+        limits[deployment.strip()] = (float(rpm or 0), float(tpm or 0))
+    return limits
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the service asked to wait, from the retry-after-ms or retry-after header of a 429."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(response.headers[header]) * scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+class LLMScheduler:
+    """
+    Sends Azure OpenAI requests once their deployment has request and token capacity. Requests waiting for
+    capacity are served by priority, then in arrival order. Tokens are reserved from an estimate (prompt
+    plus `max_tokens`, or `completion_estimate` without it) and corrected with `response.usage` when the
+    response reports it. A 429 pauses the whole deployment for the retry-after the service sent, and the
+    request is retried after that wait plus up to `jitter_seconds`; connection errors and 5xx are retried with
+    jittered exponential backoff. Deployments without limits are only paused by 429s.
+
+    Args:
+        limits (dict): {deployment: (requests per minute, tokens per minute)}, 0 for no limit.
+        burst_seconds (float): Capacity the buckets hold, in seconds of quota.
+        max_attempts (int): Attempts per request, the first one included.
+        jitter_seconds (float): Random delay added to the retry-after of a 429.
+        completion_estimate (int): Completion tokens reserved for requests without max_tokens.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = None, burst_seconds: float = 1.0, max_attempts: int = 6,
+                 jitter_seconds: float = 1.0, completion_estimate: int = 500):
+        self.limits = dict(limits or {})
+        self.burst_seconds = burst_seconds
+        self.max_attempts = max_attempts
+        self.jitter_seconds = jitter_seconds
+        self.completion_estimate = completion_estimate
+        self._deployments: Dict[str, _Deployment] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def estimate_tokens(self, kwargs: dict) -> int:
+        counter = get_token_counter()
+        if "input" in kwargs: #embeddings
+            inputs = kwargs["input"] if isinstance(kwargs["input"], list) else [kwargs["input"]]
+            return sum(counter.count_text(str(text)) for text in inputs)
+        tokens = counter.total(kwargs.get("messages", []))
+        if kwargs.get("tools"):
+            tokens += counter.count_text(json.dumps(kwargs["tools"]))
+        return tokens + (kwargs.get("max_tokens") or self.completion_estimate)
+
+    def request(self, create: Callable, priority: str = "interactive", **kwargs):
+        """`create(**kwargs)`, e.g. client.chat.completions.create, once kwargs["model"] has capacity, with retries."""
+        deployment, tokens, seq = kwargs.get("model"), self.estimate_tokens(kwargs), next(self._seq)
+        retrying = Retrying(stop=stop_after_attempt(self.max_attempts), wait=self._wait, retry=retry_if_exception_type(RETRIED_ERRORS),
+                            before_sleep=self._before_retry(deployment), reraise=True)
+        for attempt in retrying:
+            with attempt:
+                self._acquire(deployment, tokens, priority, seq)
+                response = self._send(deployment, tokens, lambda: create(**kwargs))
+        return response
+
+    async def arequest(self, create: Callable, priority: str = "interactive", **kwargs):
+        """Async request, for AsyncAzureOpenAI methods."""
+        deployment, tokens, seq = kwargs.get("model"), self.estimate_tokens(kwargs), next(self._seq)
+        retrying = AsyncRetrying(stop=stop_after_attempt(self.max_attempts), wait=self._wait, retry=retry_if_exception_type(RETRIED_ERRORS),
+                                 before_sleep=self._before_retry(deployment), reraise=True)
+        async for attempt in retrying:
+            with attempt:
+                await self._aacquire(deployment, tokens, priority, seq)
+                llm_requests.inc()
+                try:
+                    with llm_call.time():
+                        response = await create(**kwargs)
+                except openai.RateLimitError as e:
+                    self._throttled(deployment, e)
+                    raise
+                self._settle(deployment, tokens, response)
+        return response
+
+    def stats(self) -> Dict[str, dict]:
+        """Per deployment: requests queued, seconds left in a 429 pause and the request and token capacity available now."""
+        now = time.monotonic()
+        stats = {}
+        with self._lock:
+            for name, deployment in self._deployments.items():
+                for bucket in (deployment.requests, deployment.tokens):
+                    if bucket is not None:
+                        bucket.refill(now)
+                stats[name] = {"queued": sum(not waiter.cancelled for waiter in deployment.queue),
+                               "paused_seconds": max(0.0, deployment.paused_until - now),
+                               "requests_available": deployment.requests.level if deployment.requests else None,
+                               "tokens_available": deployment.tokens.level if deployment.tokens else None}
+        return stats
+
+    def _deployment(self, name: str) -> _Deployment:
+        deployment = self._deployments.get(name)
+        if deployment is None:
+            rpm, tpm = self.limits.get(name, self.limits.get("*", (0, 0)))
+            deployment = self._deployments[name] = _Deployment(rpm, tpm, self.burst_seconds)
+        return deployment
+
+    def _enqueue(self, name: str, tokens: int, priority: str, seq: int, loop=None) -> _Waiter:
+        waiter = _Waiter(PRIORITIES[priority], seq, tokens, loop)
+        with self._lock:
+            heapq.heappush(self._deployment(name).queue, waiter)
+        return waiter
+
+    def _dispatch(self, name: str) -> Optional[float]:
+        """Grants capacity to the waiters at the head of the queue while it lasts; returns the seconds until the next one can go."""
+        now = time.monotonic()
+        with self._lock:
+            deployment = self._deployment(name)
+            for bucket in (deployment.requests, deployment.tokens):
+                if bucket is not None:
+                    bucket.refill(now)
+            while deployment.queue:
+                waiter = deployment.queue[0]
+                if waiter.cancelled:
+                    heapq.heappop(deployment.queue)
+                    continue
+                wait = max(deployment.paused_until - now,
+                           deployment.requests.wait_time(1) if deployment.requests else 0.0,
+                           deployment.tokens.wait_time(waiter.tokens) if deployment.tokens else 0.0)
+                if wait > 0:
+                    return wait
+                heapq.heappop(deployment.queue)
+                if deployment.requests:
+                    deployment.requests.take(1)
+                if deployment.tokens:
+                    deployment.tokens.take(waiter.tokens)
+                waiter.grant()
+        return None
+
+    def _acquire(self, name: str, tokens: int, priority: str, seq: int) -> None:
+        start = time.perf_counter()
+        waiter = self._enqueue(name, tokens, priority, seq)
+        try:
+            while not waiter.granted:
+                timeout = self._dispatch(name)
+                if not waiter.granted:
+                    waiter.event.wait(timeout)
+        finally:
+            with self._lock:
+                waiter.cancelled = not waiter.granted
+        llm_queue_wait[priority].observe(time.perf_counter() - start)
+        llm_tokens_estimated.inc(tokens)
+
+    async def _aacquire(self, name: str, tokens: int, priority: str, seq: int) -> None:
+        start = time.perf_counter()
+        waiter = self._enqueue(name, tokens, priority, seq, asyncio.get_running_loop())
+        try:
+            while not waiter.granted:
+                timeout = self._dispatch(name)
+                if not waiter.granted:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            with self._lock:
+                waiter.cancelled = not waiter.granted
+        llm_queue_wait[priority].observe(time.perf_counter() - start)
+        llm_tokens_estimated.inc(tokens)
+
+    def _send(self, name: str, tokens: int, call: Callable):
+        llm_requests.inc()
+        try:
+            with llm_call.time():
+                response = call()
+        except openai.RateLimitError as e:
+            self._throttled(name, e)
+            raise
+        self._settle(name, tokens, response)
+        return response
+
+    def _settle(self, name: str, tokens: int, response) -> None:
+        """Corrects the reserved tokens with what the response used; streamed responses keep the estimate."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        llm_tokens_used.inc(usage.total_tokens)
+        llm_prompt_tokens.inc(usage.prompt_tokens)
+        llm_completion_tokens.inc(getattr(usage, "completion_tokens", 0) or 0)
+        with self._lock:
+            bucket = self._deployment(name).tokens
+            if bucket is not None:
+                bucket.take(usage.total_tokens - tokens)
+        if usage.total_tokens < tokens:
+            self._dispatch(name) #the refund may let queued requests go now
+
+    def _throttled(self, name: str, error: openai.RateLimitError) -> None:
+        llm_throttled.inc()
+        seconds = retry_after(error)
+        if seconds is None:
+            return
+        with self._lock:
+            deployment = self._deployment(name)
+            deployment.paused_until = max(deployment.paused_until, time.monotonic() + seconds)
+
+    def _wait(self, retry_state) -> float:
+        seconds = retry_after(retry_state.outcome.exception())
+        if seconds is None:
+            return wait_random_exponential(multiplier=0.5, max=20)(retry_state)
+        return seconds + random.uniform(0, self.jitter_seconds)
+
+    def _before_retry(self, name: str) -> Callable:
+        def before_retry(retry_state):
+            llm_retries.inc()
+            error = retry_state.outcome.exception()
+            print(f"azure openai {name}: {type(error).__name__}, retry {retry_state.attempt_number} in {retry_state.next_action.sleep:.2f}s")
+        return before_retry
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Process-wide scheduler configured with LLM_RATE_LIMITS (deployment=rpm/tpm pairs, "*" for every other
+    deployment), LLM_BURST_SECONDS, LLM_MAX_ATTEMPTS, LLM_RETRY_JITTER_SECONDS and LLM_COMPLETION_ESTIMATE.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(parse_rate_limits(os.getenv("LLM_RATE_LIMITS", "")),
+                                          burst_seconds=float(os.getenv("LLM_BURST_SECONDS", "1")),
+                                          max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "6")),
+                                          jitter_seconds=float(os.getenv("LLM_RETRY_JITTER_SECONDS", "1")),
+                                          completion_estimate=int(os.getenv("LLM_COMPLETION_ESTIMATE", "500")))
+    return _scheduler
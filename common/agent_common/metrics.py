@@ -0,0 +1,236 @@
+#In-process latency histograms and counters for the API, kept in a process-wide registry.
+import contextvars
+import functools
+import inspect
+import itertools
+import math
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+#Upper bounds in seconds, from a fast cache hit to a long multi-agent turn
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 20.0, 30.0)
+#For operations that usually take milliseconds: session I/O, DB tools, local routing
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, count and sum of every observation, plus the last `window` observations for
+    percentiles.
+
+    Args:
+        name (str): Metric name, e.g. chat_ttft_seconds.
+        description (str): One line shown next to the metric.
+        buckets (iterable): Increasing bucket upper bounds; an implicit +Inf bucket follows.
+        window (int): Observations kept for percentiles.
+        labels (dict): Labels of this series of the metric, e.g. {"tool": "check_flight_status"}.
+    """
+
+    def __init__(self, name: str, description: str, buckets: Iterable[float] = DEFAULT_BUCKETS, window: int = 10000,
+                 labels: Dict[str, str] = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.series = name + _label_text(self.labels)
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+
+    @contextmanager
+    def time(self):
+        """Times the block as a span: observed here and added to the breakdown of the current turn, if any."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(seconds)
+            spans = _turn_spans.get()
+            if spans is not None:
+                spans.add(self.series, seconds)
+
+    def summary(self) -> dict:
+        with self._lock:
+            recent = np.array(self._recent)
+            count, total = self.count, self.sum
+        if count == 0:
+            return {"count": 0}
+        return {"count": count, "mean": total / count, "p50": float(np.percentile(recent, 50)),
+                "p95": float(np.percentile(recent, 95)), "p99": float(np.percentile(recent, 99))}
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Dict[str, str] = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.series = name + _label_text(self.labels)
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+        spans = _turn_spans.get()
+        if spans is not None:
+            spans.count(self.series, amount)
+
+
+class TurnSpans:
+    """
+    Time per span and counter increments of one turn. The spans of parallel work (concurrent tools, speculative
+    routing) overlap, so their total can exceed the turn time.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name: str, amount: float) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def describe(self) -> str:
+        with self._lock:
+            spans = [f"{name} {self.calls[name]}x {seconds:.3f}s" for name, seconds in sorted(self.seconds.items(), key=lambda item: -item[1])]
+            counts = [f"{name} {amount:g}" for name, amount in sorted(self.counts.items())]
+        return ", ".join(spans + counts)
+
+
+_turn_spans: contextvars.ContextVar = contextvars.ContextVar("turn_spans", default=None)
+
+
+@contextmanager
+def turn_spans():
+    """
+    Collects the spans and counter increments of the block into a TurnSpans, yielded. Work handed to other threads
+    is included when it runs in a copy of this context (see tool_executor.call_tool).
+    """
+    spans = TurnSpans()
+    token = _turn_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _turn_spans.reset(token)
+
+
+#(name, sorted label items) -> metric: one entry per series
+_registry: Dict[Tuple[str, tuple], object] = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name, description, labels=None, **kwargs):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with _registry_lock:
+        metric = _registry.get(key)
+        if metric is None:
+            metric = _registry[key] = cls(name, description, labels=labels, **kwargs)
+        return metric
+
+
+def histogram(name: str, description: str = "", labels: Dict[str, str] = None, **kwargs) -> Histogram:
+    """The registered histogram `name` with `labels`, created on first use; the series of one name share its description and buckets."""
+    return _get_or_create(Histogram, name, description, labels, **kwargs)
+
+
+def counter(name: str, description: str = "", labels: Dict[str, str] = None) -> Counter:
+    """The registered counter `name` with `labels`, created on first use."""
+    return _get_or_create(Counter, name, description, labels)
+
+
+def snapshot() -> dict:
+    """Summary of every registered series, keyed by name and labels (e.g. tool_call_seconds{tool="check_flight_status"}), as served by the /metrics/summary route."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.series: metric.summary() if isinstance(metric, Histogram) else metric.value for metric in metrics}
+
+
+def timed(histogram: Histogram):
+    """Decorator timing every call of a function, or of a coroutine function, as a span of `histogram`."""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed_coroutine(*args, **kwargs):
+                with histogram.time():
+                    return await function(*args, **kwargs)
+            return timed_coroutine
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with histogram.time():
+                return function(*args, **kwargs)
+        return timed_function
+    return decorator
+
+
+def _prometheus_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def _label_text(labels: Dict[str, str], extra: Iterable[Tuple[str, str]] = ()) -> str:
+    """{name="value",...} of `labels` followed by `extra`, values escaped as the Prometheus text format requires; empty without labels."""
+    items = sorted(labels.items()) + list(extra)
+    if not items:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{_prometheus_name(name)}="{escape(value)}"' for name, value in items) + "}"
+
+
+def _prometheus_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def prometheus_text() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format, as served by the /metrics route: one HELP and
+    TYPE per name followed by its labeled series; counters get the _total suffix.
+    """
+    with _registry_lock:
+        metrics = sorted(_registry.items())
+    lines = []
+    for name, series in itertools.groupby((metric for _, metric in metrics), key=lambda metric: metric.name):
+        series = list(series)
+        name = _prometheus_name(name)
+        description = series[0].description.replace("\\", "\\\\").replace("\n", "\\n")
+        if isinstance(series[0], Histogram):
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+            for metric in series:
+                with metric._lock:
+                    bucket_counts, count, total = list(metric.bucket_counts), metric.count, metric.sum
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets + (math.inf,), bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_label_text(metric.labels, [("le", _prometheus_value(bound))])} {cumulative}')
+                labels = _label_text(metric.labels)
+                lines += [f"{name}_sum{labels} {_prometheus_value(total)}", f"{name}_count{labels} {count}"]
+        else:
+            name = name if name.endswith("_total") else name + "_total"
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_label_text(metric.labels)} {_prometheus_value(metric.value)}" for metric in series]
+    return "\n".join(lines) + "\n"
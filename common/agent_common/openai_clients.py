@@ -0,0 +1,122 @@
+#Process-wide Azure OpenAI clients drawing from shared HTTP connection pools, with counters of requests, new connections and TLS handshakes.
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncAzureOpenAI, AzureOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from agent_common import metrics
+
+openai_http_requests = metrics.counter("openai_http_requests", "HTTP requests sent to Azure OpenAI")
+openai_connections_opened = metrics.counter("openai_connections_opened", "TCP connections opened to Azure OpenAI")
+openai_tls_handshakes = metrics.counter("openai_tls_handshakes", "TLS handshakes with Azure OpenAI")
+
+
+def pool_settings() -> Tuple[httpx.Limits, httpx.Timeout]:
+    """
+    Connection pool limits and timeouts from OPENAI_POOL_SIZE (connections open at once), OPENAI_KEEPALIVE_CONNECTIONS
+    (idle connections kept), OPENAI_KEEPALIVE_SECONDS (how long they are kept), OPENAI_TIMEOUT_SECONDS and
+    OPENAI_CONNECT_TIMEOUT_SECONDS.
+    """
+    limits = httpx.Limits(max_connections=int(os.getenv("OPENAI_POOL_SIZE", "100")),
+                          max_keepalive_connections=int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS", "100")),
+                          keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60")))
+    timeout = httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120")), connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5")))
+    return limits, timeout
+
+
+def max_retries() -> int:
+    """Retries left to the SDK, OPENAI_MAX_RETRIES: none by default, agent_common/llm_scheduler.py retries every request it sends."""
+    return int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+
+def connection_stats() -> Dict[str, float]:
+    """Requests sent, connections opened and TLS handshakes so far; a request that did not open a connection reused one."""
+    requests = openai_http_requests.value
+    opened = openai_connections_opened.value
+    return {"requests": requests, "connections_opened": opened, "tls_handshakes": openai_tls_handshakes.value,
+            "reuse_rate": 1 - opened / requests if requests else 0.0}
+
+
+def _count(event_name):
+    #httpcore trace events, see https://www.encode.io/httpcore/extensions/#trace
+    if event_name == "connection.connect_tcp.complete":
+        openai_connections_opened.inc()
+    elif event_name == "connection.start_tls.complete":
+        openai_tls_handshakes.inc()
+    elif event_name.endswith(".send_request_headers.started"):
+        openai_http_requests.inc()
+
+
+def _trace(event_name, info):
+    _count(event_name)
+
+
+async def _atrace(event_name, info):
+    _count(event_name)
+
+
+def count_connections(request):
+    """httpx request hook counting the request, and the connection and TLS handshake it opens if any, in the openai_* counters."""
+    request.extensions["trace"] = _trace
+
+
+async def acount_connections(request):
+    request.extensions["trace"] = _atrace
+
+
+_http_client = None
+_clients: Dict[tuple, AzureOpenAI] = {}
+#Async connections belong to the event loop that opened them: one pool, and clients on it, per loop
+_async_pools: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_loopless_pool: dict = {}
+_lock = threading.Lock()
+
+
+def _client_settings(api_version: Optional[str]) -> tuple:
+    return os.environ.get("AZURE_OPENAI_ENDPOINT"), os.environ.get("AZURE_OPENAI_API_KEY"), api_version or os.getenv("AZURE_OPENAI_API_VERSION")
+
+
+def get_openai_client(api_version: str = None) -> AzureOpenAI:
+    """
+    The AzureOpenAI client for AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY, created on first use. `api_version`
+    overrides AZURE_OPENAI_API_VERSION. Clients of every API version share one connection pool.
+    """
+    global _http_client
+    settings = _client_settings(api_version)
+    with _lock:
+        client = _clients.get(settings)
+        if client is None:
+            limits, timeout = pool_settings()
+            if _http_client is None:
+                _http_client = DefaultHttpxClient(limits=limits, timeout=timeout, event_hooks={"request": [count_connections]})
+            client = _clients[settings] = AzureOpenAI(azure_endpoint=settings[0], api_key=settings[1], api_version=settings[2],
+                                                      timeout=timeout, max_retries=max_retries(), http_client=_http_client)
+    return client
+
+
+def get_async_openai_client(api_version: str = None) -> AsyncAzureOpenAI:
+    """
+    The AsyncAzureOpenAI client of the running event loop for AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY, created
+    on first use; `api_version` overrides AZURE_OPENAI_API_VERSION. Call it from the coroutine making the request:
+    every event loop gets its own connection pool, shared by the clients of every API version. Called outside an
+    event loop it returns a client that belongs to whichever loop uses it first.
+    """
+    settings = _client_settings(api_version)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _lock:
+        pool = _loopless_pool if loop is None else _async_pools.setdefault(loop, {})
+        client = pool.get(settings)
+        if client is None:
+            limits, timeout = pool_settings()
+            if "http_client" not in pool:
+                pool["http_client"] = DefaultAsyncHttpxClient(limits=limits, timeout=timeout, event_hooks={"request": [acount_connections]})
+            client = pool[settings] = AsyncAzureOpenAI(azure_endpoint=settings[0], api_key=settings[1], api_version=settings[2],
+                                                       timeout=timeout, max_retries=max_retries(), http_client=pool["http_client"])
+    return client
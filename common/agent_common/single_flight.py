@@ -0,0 +1,110 @@
+#Single-flight coalescing: concurrent callers of the same idempotent operation (tool read, embedding, routing call) share one execution.
+import asyncio
+import os
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Awaitable, Callable, Dict, Hashable
+
+from agent_common import metrics
+
+
+class SingleFlight:
+    """
+    The first caller of a key runs the operation; callers arriving with the same key while it runs wait for its
+    result (or its exception) instead of running it again. Nothing is kept once the call is over, so this only
+    collapses simultaneous requests: caching is left to the tool, embedding and semantic caches.
+
+    `do` is for threads and `ado` for coroutines, and both share the same in-flight calls. A follower whose
+    leader was cancelled runs the operation itself. `forget` makes later callers start a new call, e.g. once a
+    write made the running reads stale.
+
+    Args:
+        name (str): Group name, the group label of the single_flight_calls and single_flight_collapsed counters.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = metrics.counter("single_flight_calls", "Requests made through single-flight", labels={"group": name})
+        self.collapsed = metrics.counter("single_flight_collapsed", "Requests that shared another request's in-flight call", labels={"group": name})
+
+    def do(self, key: Hashable, fn: Callable[[], object]):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    future.set_result(fn())
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    self._done(key, future)
+                return future.result()
+            try:
+                return future.result()
+            except CancelledError:
+                if not future.cancelled():
+                    raise
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable]):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    future.set_result(await fn())
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    self._done(key, future)
+                return future.result()
+            try:
+                #shield: a follower being cancelled must not cancel the call the others wait for
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+    def forget(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Detach the in-flight calls whose key matches; they finish for their callers but no new caller joins them."""
+        with self._lock:
+            keys = [key for key in self._calls if predicate(key)]
+            for key in keys:
+                del self._calls[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, float]:
+        calls, collapsed = self.calls.value, self.collapsed.value
+        return {"calls": calls, "collapsed": collapsed, "collapse_rate": collapsed / calls if calls else 0.0, "in_flight": len(self._calls)}
+
+    def _join(self, key):
+        self.calls.inc()
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.collapsed.inc()
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """The process-wide single-flight group `name`, or None when SINGLE_FLIGHT_ENABLED is false."""
+    if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
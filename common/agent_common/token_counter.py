@@ -0,0 +1,85 @@
+#Token counts of chat messages, cached per message: tiktoken when it is installed, 4 characters per token otherwise.
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional, token counts fall back to an estimate of 4 characters per token
+    tiktoken = None
+
+#Role and separators the chat format adds to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Token counts of messages, computed once per distinct message and kept in an LRU cache, so resending a
+    long conversation every turn only tokenizes the messages that are new.
+    Uses tiktoken when it is installed, otherwise estimates 4 characters per token.
+    """
+
+    def __init__(self, encoding: str = "o200k_base", max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        self._counts: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+    def count(self, message) -> int:
+        role, content, tool_calls = message_fields(message)
+        # str caches its hash, so the key of a message seen before is cheap to look up
+        key = (role, content, tool_calls)
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return count
+        count = MESSAGE_OVERHEAD_TOKENS + self.count_text(content) + sum(self.count_text(name) + self.count_text(arguments) for name, arguments in tool_calls)
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = count
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def total(self, conversation) -> int:
+        return sum(self.count(message) for message in conversation)
+
+
+def message_fields(message) -> Tuple[str, str, tuple]:
+    """(role, content, ((tool name, arguments), ...)) of a message dict or a ChatCompletionMessage."""
+    if isinstance(message, dict):
+        role, content, tool_calls = message.get("role"), message.get("content"), message.get("tool_calls")
+        tool_calls = tuple((call["function"]["name"], call["function"]["arguments"]) for call in tool_calls or [])
+    else:
+        role, content = message.role, message.content
+        tool_calls = tuple((call.function.name, call.function.arguments) for call in message.tool_calls or [])
+    return role, content or "", tool_calls
+
+
+_token_counter = None
+_token_counter_lock = threading.Lock()
+
+
+def get_token_counter() -> TokenCounter:
+    global _token_counter
+    if _token_counter is None:
+        with _token_counter_lock:
+            if _token_counter is None:
+                _token_counter = TokenCounter()
+    return _token_counter
@@ -0,0 +1,61 @@
+#Recall@k versus latency of the faiss HNSW and IVF backends against exact search.
+#Run from the text_agent folder: python -m benchmarks.ann_index_bench --chunks 200000
+import argparse
+import time
+
+import numpy as np
+
+from src.utils.ann_index import AnnPolicyIndex, build_faiss_index
+from src.utils.policy_index import PolicyIndex, normalize_rows
+
+
+def clustered_corpus(rng, n_chunks, dim, n_topics):
+    """Policy chunks are not uniform noise: they cluster by airline/brand and policy type, which is what ANN indexes exploit."""
+    centers = rng.standard_normal((n_topics, dim), dtype=np.float32)
+    topics = rng.integers(0, n_topics, n_chunks)
+    matrix = centers[topics] + 0.6 * rng.standard_normal((n_chunks, dim), dtype=np.float32)
+    queries = centers[rng.integers(0, n_topics, 200)] + 0.6 * rng.standard_normal((200, dim), dtype=np.float32)
+    return normalize_rows(matrix), queries
+
+
+def measure(index, queries, topk):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([row[0] for row in index.search(query, topk)])
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall(results, truth):
+    return np.mean([len(set(result) & set(expected)) / len(expected) for result, expected in zip(results, truth)])
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Recall and latency of approximate versus exact knowledge base search.")
+    arg_parser.add_argument("--chunks", type=int, default=200000)
+    arg_parser.add_argument("--dim", type=int, default=1536)
+    arg_parser.add_argument("--topics", type=int, default=500)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--topk", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    matrix, queries = clustered_corpus(rng, args.chunks, args.dim, args.topics)
+    queries = queries[:args.queries]
+    ids = [str(row) for row in range(args.chunks)]
+    texts = [""] * args.chunks
+
+    exact = PolicyIndex(ids, texts, matrix, normalized=True)
+    truth, exact_ms = measure(exact, queries, args.topk)
+    print(f"{'backend':<22} {'build s':>8} {'ms/query':>9} {f'recall@{args.topk}':>9}")
+    print(f"{'exact':<22} {0:>8.1f} {exact_ms:>9.3f} {1:>9.3f}")
+
+    for kind, knob, values in (("hnsw", "ef_search", (16, 32, 64, 128, 256)), ("ivf", "nprobe", (1, 4, 8, 16, 32))):
+        start = time.perf_counter()
+        faiss_index = build_faiss_index(matrix, kind)
+        build_seconds = time.perf_counter() - start
+        for value in values:
+            ann = AnnPolicyIndex(ids, texts, faiss_index, **{knob: value})
+            results, ann_ms = measure(ann, queries, args.topk)
+            print(f"{f'{kind} {knob}={value}':<22} {build_seconds:>8.1f} {ann_ms:>9.3f} {recall(results, truth):>9.3f}")
@@ -0,0 +1,216 @@
+#Turn throughput of the blocking Agent_Runner.run versus Agent_Runner.arun under concurrent sessions, against a local fake chat server.
+#Run from the text_agent folder: python -m benchmarks.async_agent_bench --concurrency 1 4 16 64
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from benchmarks.retrieval.corpus import generate_corpus, write_corpus
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /openai/deployments/<model>/chat/completions after a simulated model latency. When the flight
+    tools are offered and the last message is the user's, it asks for the `tool_calls` (by default
+    load_user_flight_info, a blocking DB tool) in one response; after the tool results it answers with `answer`,
+    generated at `token_latency` per word. `"stream": true` requests get the same response as chunked
+    server-sent events, the first one after `latency` (plus up to `jitter`). An agent offered get_help but not the flight tools asks
+    for help; intent classification requests (the Agent_Runner routing prompt) get `route_answer`.
+    POST .../embeddings returns a deterministic `embedding_dim` vector after `embedding_latency`.
+    """
+    latency = 0.2
+    jitter = 0.0
+    token_latency = 0.0
+    answer = "Your flight is on time."
+    route_answer = "flight_agent, hotel_agent, generic_agent, human_agent"
+    tool_calls = [("load_user_flight_info", {"user_id": "12345"})]
+    embedding_latency = 0.05
+    embedding_dim = 64
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if path.endswith("/embeddings"):
+            time.sleep(self.embedding_latency)
+            self.send_json(self.embeddings(body))
+            return
+        if not path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        tools = [tool["function"]["name"] for tool in body.get("tools", [])]
+        message = {"role": "assistant", "content": self.answer}
+        if "match requests with agents" in str(body["messages"][0].get("content")):
+            message = {"role": "assistant", "content": self.route_answer}
+        elif body["messages"][-1]["role"] == "user" and "get_help" in tools and "load_user_flight_info" not in tools:
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                "function": {"name": "get_help", "arguments": json.dumps({"user_request": body["messages"][-1]["content"]})}}]}
+        elif body["messages"][-1]["role"] == "user" and "load_user_flight_info" in tools:
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)}} for name, arguments in self.tool_calls]}
+        if body.get("stream"):
+            self.stream(body, message)
+            return
+        if message["content"]:
+            time.sleep(self.token_latency * len(message["content"].split()))
+        self.send_json({"id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": body.get("model", "fake"),
+                        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if "tool_calls" in message else "stop"}],
+                        "usage": self.usage(body, message)})
+
+    def usage(self, body, message):
+        """Token usage at 4 characters per token of the message texts and tool calls, plus 4 tokens per message, and of the tools."""
+        def tokens(message):
+            return 4 + len(message.get("content") or "") // 4 + len(json.dumps(message.get("tool_calls") or "")) // 4
+        prompt_tokens = sum(tokens(prompt_message) for prompt_message in body["messages"]) + len(json.dumps(body.get("tools", []))) // 4
+        completion_tokens = tokens(message)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def stream(self, body, message):
+        chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "fake")}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if "tool_calls" in message:
+            deltas = [{"role": "assistant", "tool_calls": [dict(tool_call, index=index) for index, tool_call in enumerate(message["tool_calls"])]}]
+        else:
+            words = message["content"].split(" ")
+            deltas = [{"role": "assistant", "content": ""}] + [{"content": word if i == 0 else " " + word} for i, word in enumerate(words)]
+        for i, delta in enumerate(deltas):
+            if i > 1:
+                time.sleep(self.token_latency)
+            self.send_chunk(dict(chunk, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+        self.send_chunk(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "tool_calls" if "tool_calls" in message else "stop"}]))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def send_chunk(self, chunk):
+        self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def embeddings(self, body):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for index, text in enumerate(inputs):
+            vector = np.random.default_rng(zlib.crc32(str(text).encode())).standard_normal(self.embedding_dim).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            embedding = base64.b64encode(vector.tobytes()).decode() if body.get("encoding_format") == "base64" else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        return {"object": "list", "data": data, "model": body.get("model", "fake"), "usage": {"prompt_tokens": 10, "total_tokens": 10}}
+
+    def send_json(self, response):
+        payload = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_server():
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fake_environment(port):
+    """Point the agents at the fake server, a generated policy corpus and copies of the sample DBs; returns the temp folder."""
+    workdir = tempfile.mkdtemp()
+    policy_file = os.path.join(workdir, "policy.json")
+    write_corpus(generate_corpus(50, FakeChatHandler.embedding_dim), policy_file)
+    for db in ("flight_db.db", "hotel.db"):
+        shutil.copy(os.path.join(DATA_DIR, db), workdir)
+    os.environ.pop("AZURE_REDIS_KEY", None)
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{port}", "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": "2024-04-01-preview", "AZURE_OPENAI_CHAT_DEPLOYMENT": "gpt-4o",
+        "AZURE_OPENAI_EVALUATOR_DEPLOYMENT": "gpt-4o-mini", "AZURE_OPENAI_EMB_DEPLOYMENT": "text-embedding-ada-002",
+        "USER_PROFILE_FILE": os.path.join(DATA_DIR, "user_profile.json"),
+        "FLIGHT_POLICY_FILE": policy_file, "HOTEL_POLICY_FILE": policy_file,
+        "FLIGHT_DB_FILE": os.path.join(workdir, "flight_db.db"), "HOTEL_DB_FILE": os.path.join(workdir, "hotel.db"),
+    })
+    return workdir
+
+
+async def run_sessions(runner, session_state, concurrency, turns, use_async):
+    """`concurrency` flight_agent sessions each taking `turns` turns back to back, the way the /chat/ endpoint would call the runner."""
+    async def chat(session_id):
+        # The endpoint before the async path: an async handler calling the blocking run.
+        if use_async:
+            return await runner.arun("what flights do I have?", session_id)
+        return runner.run("what flights do I have?", session_id)
+
+    async def session(session_id):
+        session_state.set(session_id, {"active_agent": "flight_agent", "conversation": list(runner.get_agent("flight_agent").init_history)})
+        latencies = []
+        for _ in range(turns):
+            start = time.perf_counter()
+            await chat(session_id)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(session(str(uuid.uuid4())) for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies = np.concatenate(results) * 1000
+    return concurrency * turns / wall, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark blocking versus async agent turns under concurrent sessions.")
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    arg_parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    arg_parser.add_argument("--latency-ms", type=float, default=200.0, help="fake model latency per chat completion")
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+
+    from src.agents.agent_manager import Agent_Runner
+    from src.utils.session_state import SessionState
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state = SessionState()
+        runner = Agent_Runner(session_state)
+    print(f"fake model latency {args.latency_ms:.0f} ms, 2 chat completions + 1 DB tool call per turn, {args.turns} turns per session")
+    print(f"{'sessions':>8} {'mode':<9} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+
+    async def main():
+        # One event loop for every run: the async clients keep their connection pools on it.
+        for concurrency in args.concurrency:
+            for mode, use_async in (("blocking", False), ("async", True)):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    throughput, p50, p95 = await run_sessions(runner, session_state, concurrency, args.turns, use_async)
+                print(f"{concurrency:>8} {mode:<9} {throughput:>8.1f} {p50:>8.0f} {p95:>8.0f}")
+
+    asyncio.run(main())
+    server.shutdown()
+    shutil.rmtree(workdir)
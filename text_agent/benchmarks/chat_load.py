@@ -0,0 +1,253 @@
+#Load generator for the /chat/ API: simulated customers replaying multi-turn conversations, closed or open loop, to find the saturation point.
+#Run from the text_agent folder: python -m benchmarks.chat_load --customers 8 16 32 64 --duration 30
+#or open loop: python -m benchmarks.chat_load --rate 1 2 4 8 --duration 30
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+
+import httpx
+import numpy as np
+
+from benchmarks.async_agent_bench import fake_environment
+
+CONVERSATIONS = os.path.join(os.path.dirname(__file__), "..", "..", "voice_agent", "intent_detection_model", "*.jsonl")
+
+
+def load_scripts(pattern=CONVERSATIONS):
+    """The customer side of every labeled conversation, as lists of user messages; duplicates are dropped."""
+    scripts = set()
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                conversation = json.loads(line)["conversation"]
+                turns = tuple(text.split(":", 1)[1].strip() for text in conversation.splitlines() if text.startswith("user:"))
+                if turns:
+                    scripts.add(turns)
+    return sorted(scripts)
+
+
+class Stage:
+    """Turn outcomes of one load level."""
+
+    def __init__(self, label):
+        self.label = label
+        self.latencies = []
+        self.errors = Counter()
+        self.customers = 0
+        self.start = time.perf_counter()
+        self.end = None
+
+    def report(self):
+        wall = (self.end or time.perf_counter()) - self.start
+        turns = len(self.latencies) + sum(self.errors.values())
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.array([np.nan])
+        return {"load": self.label, "customers": self.customers, "turns": turns, "turns_per_second": len(self.latencies) / wall,
+                "p50_ms": float(np.percentile(latencies, 50)), "p95_ms": float(np.percentile(latencies, 95)), "p99_ms": float(np.percentile(latencies, 99)),
+                "error_rate": sum(self.errors.values()) / turns if turns else 0.0, "errors": dict(self.errors), "seconds": wall}
+
+
+class LoadGenerator:
+    """
+    Customers that each keep their own session_id and send the user messages of one conversation script to
+    /chat/ in order, pausing an exponentially distributed think time (mean `think`) between turns.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, scripts, think, rng):
+        self.client = client
+        self.scripts = scripts
+        self.think = think
+        self.rng = rng
+
+    async def customer(self, stage: Stage, deadline=None):
+        stage.customers += 1
+        session_id = str(uuid.uuid4())
+        for i, message in enumerate(self.rng.choice(self.scripts)):
+            if i:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think) if self.think else 0)
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            start = time.perf_counter()
+            try:
+                response = await self.client.post("/chat/", json={"message": message, "session_id": session_id})
+                if response.status_code != 200:
+                    stage.errors[f"http {response.status_code}"] += 1
+                    continue
+                if "response" not in response.json():
+                    stage.errors["no response"] += 1
+                    continue
+            except Exception as e:
+                stage.errors[type(e).__name__] += 1
+                continue
+            stage.latencies.append(time.perf_counter() - start)
+
+    async def closed_loop(self, customers, duration):
+        """`customers` customers at all times: each starts a new conversation as soon as its previous one ends."""
+        stage = Stage(f"{customers} customers")
+        deadline = time.perf_counter() + duration
+
+        async def seat():
+            while time.perf_counter() < deadline:
+                await self.customer(stage, deadline)
+
+        await asyncio.gather(*(seat() for _ in range(customers)))
+        stage.end = time.perf_counter()
+        return stage
+
+    async def open_loop(self, rate, duration, max_customers):
+        """New customers arrive as a Poisson process of `rate` per second regardless of how the service keeps up; their conversations run to the end."""
+        stage = Stage(f"{rate:g} customers/s")
+        deadline = time.perf_counter() + duration
+        running = set()
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(rate))
+            if len(running) >= max_customers:
+                stage.errors["dropped arrival"] += 1
+                continue
+            task = asyncio.create_task(self.customer(stage))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        await asyncio.gather(*running)
+        stage.end = time.perf_counter()
+        return stage
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, process, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+
+@contextlib.contextmanager
+def local_service(args):
+    """Starts the fake Azure OpenAI server and, unless in process, the agent service under uvicorn; yields the /chat/ base URL (None in process)."""
+    fake_port = free_port()
+    redis = {name: os.environ[name] for name in ("AZURE_REDIS_ENDPOINT", "AZURE_REDIS_KEY") if name in os.environ}
+    with contextlib.redirect_stdout(io.StringIO()):
+        workdir = fake_environment(fake_port)
+    if args.session_state == "redis":
+        if "AZURE_REDIS_KEY" not in redis:
+            raise SystemExit("--session-state redis needs AZURE_REDIS_ENDPOINT and AZURE_REDIS_KEY")
+        os.environ.update(redis)
+    processes = []
+    try:
+        with open(os.path.join(workdir, "fake_openai.log"), "w") as log:
+            processes.append(subprocess.Popen([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(fake_port), "--embedding-dim", "64",
+                                               "--latency", args.llm_latency, "--token-latency", args.llm_token_latency, "--errors", args.llm_errors],
+                                              stdout=log, stderr=subprocess.STDOUT))
+        wait_for(f"http://127.0.0.1:{fake_port}/fake/stats", processes[-1])
+        if args.in_process:
+            yield None
+            return
+        api_port = free_port()
+        with open(os.path.join(workdir, "agent_service.log"), "w") as log:
+            processes.append(subprocess.Popen([sys.executable, "-m", "uvicorn", "src.api.agent_service:app", "--host", "127.0.0.1", "--port", str(api_port),
+                                               "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+                                              stdout=subprocess.DEVNULL, stderr=log))
+        wait_for(f"http://127.0.0.1:{api_port}/metrics/summary", processes[-1])
+        yield f"http://127.0.0.1:{api_port}"
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(workdir)
+
+
+async def run(base_url, args):
+    scripts = load_scripts()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if base_url is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            from src.api import agent_service
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=agent_service.app), base_url="http://agent-service", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits)
+    generator = LoadGenerator(client, scripts, args.think_ms / 1000, random.Random(args.seed))
+    loads = args.rate or args.customers
+    print(f"{len(scripts)} conversation scripts, {np.mean([len(script) for script in scripts]):.1f} turns on average, think time {args.think_ms:.0f} ms, "
+          f"{args.duration:.0f}s per stage, {'open' if args.rate else 'closed'} loop against {base_url or 'the app in process'}")
+    print(f"{'load':<18} {'customers':>9} {'turns':>6} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    reports = []
+    async with client:
+        for load in loads:
+            #Agent prints are per turn; only the table is shown
+            with contextlib.redirect_stdout(io.StringIO()):
+                if args.rate:
+                    stage = await generator.open_loop(load, args.duration, args.max_customers)
+                else:
+                    stage = await generator.closed_loop(int(load), args.duration)
+            report = stage.report()
+            reports.append(report)
+            print(f"{report['load']:<18} {report['customers']:>9} {report['turns']:>6} {report['turns_per_second']:>8.1f} {report['p50_ms']:>8.0f} "
+                  f"{report['p95_ms']:>8.0f} {report['p99_ms']:>8.0f} {report['error_rate']:>7.1%}" + (f"  {report['errors']}" if report["errors"] else ""))
+    return reports
+
+
+def saturation(reports, slo_ms, max_error_rate):
+    """The highest load that kept p95 under the SLO and errors under the limit, and the peak throughput."""
+    within = [report for report in reports if report["p95_ms"] <= slo_ms and report["error_rate"] <= max_error_rate]
+    peak = max(reports, key=lambda report: report["turns_per_second"])
+    return (within[-1]["load"] if within else None), peak
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Drive the /chat/ endpoint with simulated customers and report throughput, latency percentiles and errors per load level.")
+    loop = arg_parser.add_mutually_exclusive_group()
+    loop.add_argument("--customers", type=float, nargs="+", default=[8, 16, 32, 64], help="closed loop: concurrent customers per stage")
+    loop.add_argument("--rate", type=float, nargs="+", help="open loop: new customers per second per stage")
+    arg_parser.add_argument("--duration", type=float, default=30.0, help="seconds per stage")
+    arg_parser.add_argument("--think-ms", type=float, default=500.0, help="mean customer think time between turns")
+    arg_parser.add_argument("--max-customers", type=int, default=5000, help="open loop: customers in flight before arrivals are dropped")
+    arg_parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a turn counts as failed")
+    arg_parser.add_argument("--url", help="agent service to load, e.g. http://localhost:8000; by default a local one is started against a fake Azure OpenAI server")
+    arg_parser.add_argument("--in-process", action="store_true", help="call the FastAPI app in this process instead of over HTTP (no uvicorn)")
+    arg_parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the local agent service (more than 1 needs --session-state redis)")
+    arg_parser.add_argument("--session-state", choices=["memory", "redis"], default="memory", help="local agent service: in-memory sessions, or Redis from AZURE_REDIS_*")
+    arg_parser.add_argument("--llm-latency", default="lognormal:800:0.4", help="fake model latency in ms, see benchmarks.fake_openai")
+    arg_parser.add_argument("--llm-token-latency", default="0", help="fake generation time per word in ms")
+    arg_parser.add_argument("--llm-errors", default="", help="fake model error rates, e.g. 429=0.01")
+    arg_parser.add_argument("--slo-ms", type=float, default=5000.0, help="p95 turn latency a stage must stay under")
+    arg_parser.add_argument("--max-error-rate", type=float, default=0.01, help="error rate a stage must stay under")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--out", help="write the stage reports to this JSON file")
+    args = arg_parser.parse_args()
+    if args.workers > 1 and args.session_state == "memory" and not args.url:
+        arg_parser.error("sessions kept in memory are not shared between workers: use --session-state redis with --workers")
+
+    if args.url:
+        reports = asyncio.run(run(args.url.rstrip("/"), args))
+    else:
+        with local_service(args) as base_url:
+            reports = asyncio.run(run(base_url, args))
+    within, peak = saturation(reports, args.slo_ms, args.max_error_rate)
+    print(f"peak throughput {peak['turns_per_second']:.1f} turns/s at {peak['load']}; highest load within p95 {args.slo_ms:.0f} ms and "
+          f"{args.max_error_rate:.0%} errors: {within or 'none'}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "stages": reports}, f, indent=2)
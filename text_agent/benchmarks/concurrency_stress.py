@@ -0,0 +1,137 @@
+#Stress test: many sessions driven concurrently through one Agent_Runner, on the async path and on threads, against a fake chat server.
+#Checks that no session sees another's messages or agent and that the agents' templates stay untouched; exits with status 1 otherwise.
+#Run from the text_agent folder: python -m benchmarks.concurrency_stress --sessions 64 --turns 4
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import random
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+
+#flight: a session already with flight_agent; handoff: a new session on generic_agent that gets handed over to flight_agent
+SCENARIOS = ("flight", "handoff")
+
+
+def plan_sessions(runner, session_state, n, seed):
+    sessions = []
+    rng = random.Random(seed)
+    for _ in range(n):
+        session_id = str(uuid.uuid4())
+        scenario = rng.choice(SCENARIOS)
+        if scenario == "flight":
+            with contextlib.redirect_stdout(io.StringIO()):
+                session_state.set(session_id, {"active_agent": "flight_agent",
+                                               "conversation": runner.get_agent("flight_agent").new_conversation()})
+        sessions.append((session_id, scenario))
+    return sessions
+
+
+def question(session_id, turn):
+    return f"[{session_id}] what flights do I have? ({turn})"
+
+
+def check_session(session_state, session_id, scenario, turns):
+    from agent_common.token_counter import message_fields
+
+    problems = []
+    state = session_state.get(session_id)
+    if state is None:
+        return [f"{session_id}: no session saved"]
+    if state["active_agent"] != "flight_agent":
+        problems.append(f"{session_id} ({scenario}): active agent {state['active_agent']}")
+    asked = set()
+    for message in state["conversation"]:
+        role, content, _ = message_fields(message)
+        if role == "user":
+            if not content.startswith(f"[{session_id}]"):
+                problems.append(f"{session_id}: foreign message {content[:60]!r}")
+            asked.add(content)
+    if asked != {question(session_id, turn) for turn in range(turns)}:
+        problems.append(f"{session_id}: asked {len(asked)} distinct questions, expected {turns}")
+    return problems
+
+
+def drive_sync(runner, sessions, turns, threads):
+    def session(item):
+        session_id, scenario = item
+        if scenario == "handoff":
+            runner.run(None, session_id)
+        for turn in range(turns):
+            runner.run(question(session_id, turn), session_id)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return [error for error in pool.map(lambda item: _capture(session, item), sessions) if error is not None]
+
+
+async def drive_async(runner, sessions, turns):
+    async def session(item):
+        session_id, scenario = item
+        if scenario == "handoff":
+            await runner.arun(None, session_id)
+        for turn in range(turns):
+            await runner.arun(question(session_id, turn), session_id)
+
+    results = await asyncio.gather(*(session(item) for item in sessions), return_exceptions=True)
+    return [repr(result) for result in results if isinstance(result, BaseException)]
+
+
+def _capture(function, *args):
+    try:
+        function(*args)
+    except Exception as e:
+        return repr(e)
+    return None
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Drive many sessions concurrently through one Agent_Runner and check they stay isolated.")
+    arg_parser.add_argument("--sessions", type=int, default=64, help="sessions per mode")
+    arg_parser.add_argument("--turns", type=int, default=4, help="questions per session")
+    arg_parser.add_argument("--threads", type=int, default=32, help="threads driving the blocking Agent_Runner.run")
+    arg_parser.add_argument("--latency-ms", type=float, default=20.0, help="fake model latency per chat completion")
+    arg_parser.add_argument("--jitter-ms", type=float, default=40.0, help="random extra latency, so turns of different sessions interleave")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    FakeChatHandler.jitter = args.jitter_ms / 1000
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+
+    from src.agents.agent_manager import Agent_Runner
+    from src.utils.session_state import SessionState
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state = SessionState()
+        runner = Agent_Runner(session_state)
+    templates = {agent.name: copy.deepcopy(agent.init_history) for agent in runner.agents}
+
+    failed = False
+    for mode in ("async", "threads"):
+        sessions = plan_sessions(runner, session_state, args.sessions, args.seed)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if mode == "async":
+                errors = asyncio.run(drive_async(runner, sessions, args.turns))
+            else:
+                errors = drive_sync(runner, sessions, args.turns, args.threads)
+        elapsed = time.perf_counter() - start
+        with contextlib.redirect_stdout(io.StringIO()):
+            problems = errors + [problem for session_id, scenario in sessions for problem in check_session(session_state, session_id, scenario, args.turns)]
+        problems += [f"{agent.name}: init_history modified" for agent in runner.agents if agent.init_history != templates[agent.name]]
+        print(f"{mode:<8} {len(sessions)} sessions x {args.turns} turns in {elapsed:.1f}s: "
+              f"{'ok' if not problems else f'{len(problems)} problems'}")
+        for problem in problems[:10]:
+            print("   ", problem)
+        failed = failed or bool(problems)
+
+    server.shutdown()
+    shutil.rmtree(workdir)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,83 @@
+#Prompt tokens per turn of a long simulated chat, resending the whole conversation versus the token-budgeted context window.
+#Run from the text_agent folder: python -m benchmarks.context_window_bench --turns 50 --budget 4000
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+import yaml
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from benchmarks.retrieval.corpus import generate_corpus
+from agent_common.token_counter import TokenCounter, tiktoken
+from src.utils.context_window import ContextWindow, extractive_summary
+
+QUESTIONS = ["what is the checked baggage allowance?", "can I change my flight to tomorrow?", "is my flight on time?",
+             "how much does a seat upgrade cost?", "what happens if I miss my connection?", "can I bring my dog on board?"]
+
+
+def simulated_turn(turn, rng, policies):
+    """One turn the way Smart_Agent stores it: question, tool call, tool result (three policy excerpts), answer."""
+    tool_call = ChatCompletionMessageToolCall(id=f"call_{turn}", type="function", function=Function(
+        name="search_airline_knowledgebase", arguments=json.dumps({"search_query": QUESTIONS[turn % len(QUESTIONS)]})))
+    excerpts = "\n".join(rng.choice(policies) for _ in range(3))
+    answer = " ".join(rng.choice(policies).split()[:60])
+    return [{"role": "user", "content": QUESTIONS[turn % len(QUESTIONS)]},
+            ChatCompletionMessage(role="assistant", content="", tool_calls=[tool_call]),
+            {"tool_call_id": f"call_{turn}", "role": "tool", "name": "search_airline_knowledgebase", "content": excerpts},
+            ChatCompletionMessage(role="assistant", content=answer)]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark prompt tokens per turn with and without the context window.")
+    arg_parser.add_argument("--turns", type=int, default=50)
+    arg_parser.add_argument("--budget", type=int, default=4000, help="CONTEXT_TOKEN_BUDGET")
+    arg_parser.add_argument("--keep-turns", type=int, default=2, help="CONTEXT_KEEP_TURNS")
+    arg_parser.add_argument("--summary-tokens", type=int, default=400, help="CONTEXT_SUMMARY_TOKENS")
+    arg_parser.add_argument("--fold-tokens", type=int, help="CONTEXT_FOLD_TOKENS, a quarter of the budget by default")
+    args = arg_parser.parse_args()
+
+    with open("src/agents/agent_profiles/flight_agent_profile.yaml") as file:
+        profile = yaml.safe_load(file)
+    init_history = [{"role": "system", "content": profile["persona"]}, {"role": "assistant", "content": profile["initial_message"]}]
+    policies = [chunk["policy_text"] for chunk in generate_corpus(200, 8)]
+    rng = random.Random(0)
+    counter = TokenCounter()
+    summaries = []
+
+    def summarize(previous_summary, messages, max_tokens):
+        #Stands in for the LLM summarizer, which costs one model call each time
+        summaries.append(len(messages))
+        return extractive_summary(previous_summary, messages, max_tokens, counter)
+
+    window = ContextWindow(budget_tokens=args.budget, keep_turns=args.keep_turns, summary_tokens=args.summary_tokens,
+                           fold_tokens=args.fold_tokens, summarize_fn=summarize, counter=counter)
+
+    full = list(init_history)
+    compacted = list(init_history)
+    rows = []
+    compact_ms = []
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        compacted, report = window.compact(compacted)
+        compact_ms.append((time.perf_counter() - start) * 1000)
+        rows.append((turn + 1, counter.total(full), report["tokens_after"]))
+        messages = simulated_turn(turn, rng, policies)
+        full += messages
+        compacted += messages
+
+    print(f"token counts from {'tiktoken' if tiktoken is not None else 'the 4 characters per token estimate'}, "
+          f"budget {args.budget}, {args.keep_turns} turns kept verbatim, summary up to {args.summary_tokens} tokens (extractive), "
+          f"refreshed once {window.fold_tokens} tokens are left to fold")
+    print(f"{'turn':>5} {'full':>8} {'window':>8}")
+    for turn, full_tokens, window_tokens in rows:
+        if turn in (1, 2, 5, 10, 20) or turn % 25 == 0 or turn == args.turns:
+            print(f"{turn:>5} {full_tokens:>8} {window_tokens:>8}")
+    total_full = sum(row[1] for row in rows)
+    total_window = sum(row[2] for row in rows)
+    print(f"prompt tokens over {args.turns} turns: {total_full} full, {total_window} with the window ({1 - total_window / total_full:.0%} fewer)")
+    print(f"compaction p50 {np.percentile(compact_ms, 50):.2f} ms, p95 {np.percentile(compact_ms, 95):.2f} ms; "
+          f"token count cache hit rate {counter.hits / (counter.hits + counter.misses):.1%}")
+    print(f"summarizer calls: {len(summaries)} in {args.turns} turns, {np.mean(summaries) if summaries else 0:.1f} messages folded per call")
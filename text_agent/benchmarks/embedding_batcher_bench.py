@@ -0,0 +1,90 @@
+#Throughput of one-request-per-text embeddings versus the micro-batching EmbeddingBatcher, against a local fake embeddings server.
+#Run from the text_agent folder: python -m benchmarks.embedding_batcher_bench --callers 64 --requests 512
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from openai import AzureOpenAI
+
+from agent_common.embedding_batcher import EmbeddingBatcher
+
+
+class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    """Answers POST /openai/deployments/<model>/embeddings with deterministic vectors after a simulated network+model latency."""
+    base_latency = 0.05
+    per_input_latency = 0.0005
+    dim = 1536
+    calls = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if not re.match(r"^/openai/deployments/[^/]+/embeddings", self.path):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        with FakeEmbeddingsHandler.lock:
+            FakeEmbeddingsHandler.calls += 1
+        time.sleep(self.base_latency + self.per_input_latency * len(inputs))
+        data = []
+        for index, text in enumerate(inputs):
+            seed = int(hashlib.sha1(text.encode()).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dim).round(6).tolist()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        payload = json.dumps({"object": "list", "data": data, "model": "fake",
+                              "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_load(embed, callers, n_requests):
+    latencies = []
+    def one(i):
+        start = time.perf_counter()
+        embed(f"what is the baggage limit for booking {i}")
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    return n_requests / elapsed, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark embedding micro-batching against a local fake embeddings server.")
+    arg_parser.add_argument("--callers", type=int, default=64, help="concurrent sessions asking for embeddings")
+    arg_parser.add_argument("--requests", type=int, default=512)
+    arg_parser.add_argument("--max-batch-size", type=int, default=16)
+    arg_parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    arg_parser.add_argument("--latency-ms", type=float, default=50.0, help="fake server latency per call")
+    args = arg_parser.parse_args()
+
+    FakeEmbeddingsHandler.base_latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEmbeddingsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = AzureOpenAI(api_key="fake", api_version="2024-04-01-preview", azure_endpoint=f"http://127.0.0.1:{server.server_port}")
+    model = "text-embedding-ada-002"
+
+    def direct(text):
+        return client.embeddings.create(input=[text], model=model).data[0].embedding
+
+    batcher = EmbeddingBatcher(client, model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    print(f"{'mode':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'HTTP calls':>11}")
+    for name, embed in (("direct", direct), ("batched", batcher.embed)):
+        FakeEmbeddingsHandler.calls = 0
+        throughput, p50, p95 = run_load(embed, args.callers, args.requests)
+        print(f"{name:<10} {throughput:>8.1f} {p50:>8.1f} {p95:>8.1f} {FakeEmbeddingsHandler.calls:>11}")
+    print("batcher:", batcher.stats())
+    server.shutdown()
@@ -0,0 +1,549 @@
+#Local stand-in for Azure OpenAI: chat completions (tool calls, streaming), embeddings and the realtime websocket, with scripted
+#or recorded responses, latency distributions and error injection, to measure our own overhead without live endpoints.
+#Run from the text_agent folder: python -m benchmarks.fake_openai --port 8090 --latency lognormal:800:0.4 --errors 429=0.01
+import argparse
+import asyncio
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+DEFAULT_SCRIPT = __file__.replace("fake_openai.py", "fake_openai_script.json")
+#Realtime audio is 24 kHz 16-bit mono PCM
+AUDIO_RATE = 24000
+
+
+class Latency:
+    """
+    A latency distribution in milliseconds, parsed from "<ms>", "uniform:<low>:<high>", "normal:<mean>:<sd>" or
+    "lognormal:<median>:<sigma>"; `sample` returns seconds, never negative.
+    """
+
+    def __init__(self, spec):
+        self.spec = str(spec)
+        kind, *params = self.spec.split(":") if ":" in self.spec else ("constant", self.spec)
+        if kind not in ("constant", "uniform", "normal", "lognormal") or len(params) != (1 if kind == "constant" else 2):
+            raise ValueError(f"latency should be <ms>, uniform:<low>:<high>, normal:<mean>:<sd> or lognormal:<median>:<sigma>, got {self.spec!r}")
+        self.kind, self.params = kind, [float(param) for param in params]
+
+    def sample(self) -> float:
+        if self.kind == "constant":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = random.gauss(*self.params)
+        else:
+            ms = self.params[0] * random.lognormvariate(0, self.params[1])
+        return max(ms, 0.0) / 1000
+
+    def __repr__(self):
+        return self.spec
+
+
+def parse_errors(spec) -> Dict[str, float]:
+    """"429=0.02,500=0.01,timeout=0.001,disconnect=0.001" -> {"429": 0.02, ...}; a dict is taken as is."""
+    if isinstance(spec, dict):
+        return {str(kind): float(rate) for kind, rate in spec.items()}
+    errors = {}
+    for entry in filter(None, (spec or "").split(",")):
+        kind, rate = entry.split("=")
+        errors[kind.strip()] = float(rate)
+    return errors
+
+
+class Rule:
+    """
+    One scripted response. `when` holds the conditions, all optional: `api` (chat or realtime), `deployment`,
+    `system` and `user` (regexes searched in the system prompt and the last user message), `tool` (a tool that
+    must be offered), `last_role` (user or tool) and `round` (tool results since the last user message).
+    `respond` is {"content": text}, {"tool_calls": [{"name", "arguments"}]} or {"error": status}; "{user}" in it
+    is replaced by the last user message. `latency` overrides the server's latency for this rule.
+    """
+
+    def __init__(self, spec):
+        self.when = spec.get("when", {})
+        self.respond = spec["respond"]
+        self.latency = Latency(spec["latency"]) if "latency" in spec else None
+        self.patterns = {key: re.compile(self.when[key], re.I | re.S) for key in ("deployment", "system", "user") if key in self.when}
+
+    def matches(self, request) -> bool:
+        for key, pattern in self.patterns.items():
+            if not pattern.search(request[key] or ""):
+                return False
+        if "tool" in self.when and self.when["tool"] not in request["tools"]:
+            return False
+        return all(self.when[key] == request[key] for key in ("api", "last_role", "round") if key in self.when)
+
+    def message(self, request):
+        """The assistant message of this rule for `request`, as chat completions returns it."""
+        user = request["user"] or ""
+        if "tool_calls" in self.respond:
+            return {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {})).replace("{user}", json.dumps(user)[1:-1])}}
+                for call in self.respond["tool_calls"]]}
+        return {"role": "assistant", "content": self.respond.get("content", "").replace("{user}", user)}
+
+
+def chat_request(deployment, messages, tools, api="chat"):
+    """The fields rules match on, from a chat completions request or a realtime conversation."""
+    system = next((message.get("content") or "" for message in messages if message.get("role") == "system"), "")
+    user, last_role, rounds = None, messages[-1].get("role") if messages else None, 0
+    for message in reversed(messages):
+        if message.get("role") == "tool":
+            rounds += 1
+        if message.get("role") == "user":
+            user = message.get("content") if isinstance(message.get("content"), str) else json.dumps(message.get("content"))
+            break
+    return {"api": api, "deployment": deployment, "system": system, "user": user, "last_role": last_role, "round": rounds, "tools": tools}
+
+
+def usage(messages, tools, message):
+    """Token usage at 4 characters per token of the message texts and tool calls, plus 4 tokens per message, and of the tools."""
+    def tokens(message):
+        return 4 + len(message.get("content") or "") // 4 + len(json.dumps(message.get("tool_calls") or "")) // 4
+    prompt_tokens = sum(tokens(prompt_message) for prompt_message in messages) + len(json.dumps(tools)) // 4
+    completion_tokens = tokens(message)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+class FakeOpenAI:
+    """
+    Azure OpenAI stand-in served by aiohttp. Chat completions are answered by the first matching script rule
+    after `latency` (the time to the first token when streaming), then `token_latency` per word. Embeddings are
+    deterministic unit vectors of `embedding_dim` after `embedding_latency`. The realtime websocket plays the
+    same rules as realtime events, with server VAD on the PCM16 audio it receives and `transcripts` as what the
+    caller said.
+
+    `errors` injects failures into every request at the given rates: an HTTP status (429 carries retry-after
+    `retry_after` seconds), `timeout` (no answer for `hang_seconds`) or `disconnect` (connection dropped). With
+    `proxy` set, chat completions and embeddings go to that real endpoint instead, and with `record` the chat
+    exchanges are appended to a script file as rules, with their measured latency, for later offline replays.
+    """
+
+    def __init__(self, script=DEFAULT_SCRIPT, latency="200", token_latency="0", embedding_latency="50", errors=None, embedding_dim=1536,
+                 retry_after=1.0, hang_seconds=600.0, transcripts=None, audio_ms_per_word=300, proxy=None, api_key=None, record=None):
+        self.rules = [Rule(spec) for spec in load_script(script)] if script else []
+        self.latency, self.token_latency, self.embedding_latency = Latency(latency), Latency(token_latency), Latency(embedding_latency)
+        self.errors = parse_errors(errors)
+        self.embedding_dim = embedding_dim
+        self.retry_after = retry_after
+        self.hang_seconds = hang_seconds
+        self.transcripts = transcripts or ["I would like to check the status of my reservation"]
+        self.audio_ms_per_word = audio_ms_per_word
+        self.proxy, self.api_key, self.record = proxy, api_key, record
+        self.stats = Counter()
+        self.port = None
+        self._loop = None
+        self._runner = None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/openai/deployments/{deployment}/chat/completions", self.chat)
+        app.router.add_post("/openai/deployments/{deployment}/embeddings", self.embeddings)
+        app.router.add_get("/openai/realtime", self.realtime)
+        app.router.add_get("/fake/stats", lambda _: web.json_response(dict(self.stats)))
+        return app
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serves on a background thread with its own event loop; returns once it listens, with the port in `self.port`."""
+        started = threading.Event()
+
+        async def serve():
+            self._runner = web.AppRunner(self.app(), access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, host, port, backlog=1024)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(serve(), self._loop).result()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def environment(self) -> Dict[str, str]:
+        """Settings pointing the text agent and the voice backend at this server."""
+        return {"AZURE_OPENAI_ENDPOINT": self.endpoint, "AZURE_OPENAI_API_KEY": "fake", "AZURE_OPENAI_API_VERSION": "2024-04-01-preview",
+                "AZURE_OPENAI_CHAT_DEPLOYMENT": "gpt-4o", "AZURE_OPENAI_EVALUATOR_DEPLOYMENT": "gpt-4o-mini", "AZURE_OPENAI_EMB_DEPLOYMENT": "text-embedding-ada-002",
+                "AZURE_OPENAI_RT_ENDPOINT": self.endpoint, "AZURE_OPENAI_RT_API_KEY": "fake", "AZURE_OPENAI_RT_DEPLOYMENT": "gpt-4o-realtime-preview"}
+
+    def rule_for(self, request) -> Optional[Rule]:
+        for index, rule in enumerate(self.rules):
+            if rule.matches(request):
+                self.stats[f"rule_{index}"] += 1
+                return rule
+        return None
+
+    def injected_error(self) -> Optional[str]:
+        draw = random.random()
+        for kind, rate in self.errors.items():
+            if draw < rate:
+                return kind
+            draw -= rate
+        return None
+
+    async def fail(self, request, kind):
+        """The injected failure `kind` as a response; for timeout and disconnect the connection is closed without one."""
+        self.stats[f"error_{kind}"] += 1
+        if kind == "timeout":
+            await asyncio.sleep(self.hang_seconds)
+            kind = "disconnect"
+        if kind == "disconnect":
+            if request.transport is not None:
+                request.transport.close()
+            return web.Response(status=499)
+        status = int(kind)
+        headers = {"retry-after": str(max(1, round(self.retry_after))), "retry-after-ms": str(int(self.retry_after * 1000))} if status == 429 else {}
+        message = "Requests to the ChatCompletions_Create Operation have exceeded the rate limit." if status == 429 else "The server had an error while processing your request."
+        return web.json_response({"error": {"code": str(status), "message": message}}, status=status, headers=headers)
+
+    async def chat(self, request):
+        body = await request.json()
+        deployment = request.match_info["deployment"]
+        self.stats["chat_stream" if body.get("stream") else "chat"] += 1
+        error = self.injected_error()
+        if error:
+            return await self.fail(request, error)
+        if self.proxy:
+            return await self.proxy_chat(request, deployment, body)
+        tools = [tool["function"]["name"] for tool in body.get("tools", [])]
+        fields = chat_request(deployment, body["messages"], tools)
+        rule = self.rule_for(fields)
+        if rule is not None and "error" in rule.respond:
+            return await self.fail(request, str(rule.respond["error"]))
+        message = rule.message(fields) if rule else {"role": "assistant", "content": "I can help you with that."}
+        await asyncio.sleep((rule.latency if rule and rule.latency else self.latency).sample())
+        return await self.answer(request, body, message)
+
+    async def answer(self, request, body, message):
+        """`message` as a chat completion, or as server-sent events when the request streams."""
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+        words = (message.get("content") or "").split(" ") if not message.get("tool_calls") else []
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "fake")}
+        if not body.get("stream"):
+            await asyncio.sleep(sum(self.token_latency.sample() for _ in words))
+            return web.json_response(dict(base, object="chat.completion", usage=usage(body["messages"], body.get("tools", []), message),
+                                          choices=[{"index": 0, "message": message, "finish_reason": finish_reason}]))
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        chunk = dict(base, object="chat.completion.chunk")
+        if message.get("tool_calls"):
+            deltas = [{"role": "assistant", "tool_calls": [dict(tool_call, index=index) for index, tool_call in enumerate(message["tool_calls"])]}]
+        else:
+            deltas = [{"role": "assistant", "content": ""}] + [{"content": word if i == 0 else " " + word} for i, word in enumerate(words)]
+        for i, delta in enumerate(deltas):
+            if i > 1:
+                await asyncio.sleep(self.token_latency.sample())
+            await response.write(f"data: {json.dumps(dict(chunk, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}]))}\n\n".encode())
+        await response.write(f"data: {json.dumps(dict(chunk, choices=[{'index': 0, 'delta': {}, 'finish_reason': finish_reason}]))}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def proxy_chat(self, request, deployment, body):
+        """Sends the request to the real endpoint without streaming, records it, then answers the caller the way it asked."""
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{self.proxy.rstrip('/')}/openai/deployments/{deployment}/chat/completions", params=request.query,
+                                    headers={"api-key": self.api_key}, json=dict(body, stream=False)) as upstream:
+                result = await upstream.json()
+                if upstream.status != 200:
+                    return web.json_response(result, status=upstream.status)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        message = result["choices"][0]["message"]
+        if self.record:
+            fields = chat_request(deployment, body["messages"], [tool["function"]["name"] for tool in body.get("tools", [])])
+            respond = ({"tool_calls": [{"name": call["function"]["name"], "arguments": json.loads(call["function"]["arguments"])} for call in message["tool_calls"]]}
+                       if message.get("tool_calls") else {"content": message.get("content") or ""})
+            when = {"api": "chat", "deployment": f"^{re.escape(deployment)}$", "user": f"^{re.escape(fields['user'] or '')}$",
+                    "last_role": fields["last_role"], "round": fields["round"]}
+            with open(self.record, "a") as f:
+                f.write(json.dumps({"when": when, "respond": respond, "latency": f"{elapsed_ms:.0f}"}) + "\n")
+        if not body.get("stream"):
+            return web.json_response(result)
+        message = {key: message[key] for key in ("role", "content", "tool_calls") if message.get(key) is not None}
+        return await self.answer(request, body, message)
+
+    async def embeddings(self, request):
+        body = await request.json()
+        self.stats["embeddings"] += 1
+        error = self.injected_error()
+        if error:
+            return await self.fail(request, error)
+        if self.proxy:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(f"{self.proxy.rstrip('/')}{request.path}", params=request.query, headers={"api-key": self.api_key}, json=body) as upstream:
+                    return web.json_response(await upstream.json(), status=upstream.status)
+        await asyncio.sleep(self.embedding_latency.sample())
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for index, text in enumerate(inputs):
+            vector = np.random.default_rng(zlib.crc32(str(text).encode())).standard_normal(self.embedding_dim).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            embedding = base64.b64encode(vector.tobytes()).decode() if body.get("encoding_format") == "base64" else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+        return web.json_response({"object": "list", "data": data, "model": body.get("model", "fake"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    async def realtime(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self.stats["realtime_sessions"] += 1
+        await RealtimeSession(self, ws, request.query.get("deployment", "fake")).run()
+        return ws
+
+
+class RealtimeSession:
+    """
+    One realtime websocket: keeps the session settings and conversation items, detects speech in the appended
+    audio when turn detection is server_vad, and answers response.create with the events of the matching rule.
+    """
+
+    def __init__(self, server: FakeOpenAI, ws, deployment):
+        self.server, self.ws, self.deployment = server, ws, deployment
+        self.session = {"id": f"sess_{uuid.uuid4().hex[:12]}", "object": "realtime.session", "model": deployment, "modalities": ["text", "audio"],
+                        "instructions": "", "voice": "alloy", "input_audio_format": "pcm16", "output_audio_format": "pcm16", "input_audio_transcription": None,
+                        "turn_detection": {"type": "server_vad", "threshold": 0.5, "prefix_padding_ms": 300, "silence_duration_ms": 200},
+                        "tools": [], "tool_choice": "auto", "temperature": 0.8, "max_response_output_tokens": "inf"}
+        self.items: List[dict] = []
+        self.audio = bytearray()
+        self.speaking = False
+        self.silent_samples = 0
+        self.turns = 0
+        self.response_task: Optional[asyncio.Task] = None
+
+    async def send(self, event):
+        if not self.ws.closed:
+            await self.ws.send_json(dict(event, event_id=f"event_{uuid.uuid4().hex[:12]}"))
+
+    async def run(self):
+        await self.send({"type": "session.created", "session": self.session})
+        async for msg in self.ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            event = json.loads(msg.data)
+            kind = event.get("type")
+            if kind == "session.update":
+                self.session.update(event.get("session", {}))
+                await self.send({"type": "session.updated", "session": self.session})
+            elif kind == "input_audio_buffer.append":
+                await self.append_audio(base64.b64decode(event["audio"]))
+            elif kind == "input_audio_buffer.commit":
+                await self.commit()
+            elif kind == "input_audio_buffer.clear":
+                self.audio.clear()
+                self.speaking = False
+                await self.send({"type": "input_audio_buffer.cleared"})
+            elif kind == "conversation.item.create":
+                await self.add_item(dict(event["item"], id=event["item"].get("id") or f"item_{uuid.uuid4().hex[:12]}"))
+            elif kind == "response.create":
+                await self.start_response()
+            elif kind == "response.cancel":
+                if self.response_task and not self.response_task.done():
+                    self.response_task.cancel()
+            else:
+                await self.send({"type": "error", "error": {"type": "invalid_request_error", "code": "unknown_event", "message": f"unknown event type {kind}"}})
+        if self.response_task:
+            self.response_task.cancel()
+
+    async def add_item(self, item):
+        previous = self.items[-1]["id"] if self.items else None
+        self.items.append(item)
+        await self.send({"type": "conversation.item.created", "previous_item_id": previous, "item": item})
+
+    async def append_audio(self, pcm):
+        """Server VAD on loudness: speech starts above an amplitude of 500 and stops after silence_duration_ms below it."""
+        self.audio += pcm
+        turn_detection = self.session.get("turn_detection") or {}
+        if turn_detection.get("type") != "server_vad" or not pcm:
+            return
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16)
+        loud = samples.size and np.sqrt(np.mean(samples.astype(np.float32) ** 2)) > 500
+        if loud:
+            self.silent_samples = 0
+            if not self.speaking:
+                self.speaking = True
+                if self.response_task and not self.response_task.done():
+                    self.response_task.cancel()
+                await self.send({"type": "input_audio_buffer.speech_started", "audio_start_ms": len(self.audio) // 2 * 1000 // AUDIO_RATE})
+        elif self.speaking:
+            self.silent_samples += samples.size
+            if self.silent_samples * 1000 >= turn_detection.get("silence_duration_ms", 200) * AUDIO_RATE:
+                self.speaking = False
+                await self.send({"type": "input_audio_buffer.speech_stopped", "audio_end_ms": len(self.audio) // 2 * 1000 // AUDIO_RATE})
+                await self.commit()
+                await self.start_response()
+
+    async def commit(self):
+        item_id = f"item_{uuid.uuid4().hex[:12]}"
+        previous = self.items[-1]["id"] if self.items else None
+        transcript = self.server.transcripts[self.turns % len(self.server.transcripts)]
+        self.turns += 1
+        self.audio.clear()
+        await self.send({"type": "input_audio_buffer.committed", "previous_item_id": previous, "item_id": item_id})
+        await self.add_item({"id": item_id, "type": "message", "status": "completed", "role": "user", "content": [{"type": "input_audio", "transcript": None}]})
+        self.items[-1]["content"][0]["transcript"] = transcript
+        if self.session.get("input_audio_transcription"):
+            await self.send({"type": "conversation.item.input_audio_transcription.completed", "item_id": item_id, "content_index": 0, "transcript": transcript})
+
+    async def start_response(self):
+        if self.response_task and not self.response_task.done():
+            await self.send({"type": "error", "error": {"type": "invalid_request_error", "code": "conversation_already_has_active_response",
+                                                        "message": "Conversation already has an active response"}})
+            return
+        self.server.stats["realtime_responses"] += 1
+        self.response_task = asyncio.create_task(self.respond())
+
+    def messages(self):
+        """The conversation items as chat messages, for the rules."""
+        messages = [{"role": "system", "content": self.session.get("instructions") or ""}]
+        for item in self.items:
+            if item["type"] == "message":
+                text = " ".join(part.get("text") or part.get("transcript") or "" for part in item.get("content", []))
+                messages.append({"role": item.get("role", "user"), "content": text})
+            elif item["type"] == "function_call_output":
+                messages.append({"role": "tool", "content": item.get("output", "")})
+        return messages
+
+    async def respond(self):
+        response = {"id": f"resp_{uuid.uuid4().hex[:12]}", "object": "realtime.response", "status": "in_progress", "output": [], "usage": None}
+        await self.send({"type": "response.created", "response": response})
+        try:
+            messages = self.messages()
+            fields = chat_request(self.deployment, messages, [tool["name"] for tool in self.session.get("tools") or []], api="realtime")
+            rule = self.server.rule_for(fields)
+            error = self.server.injected_error() or (str(rule.respond["error"]) if rule and "error" in rule.respond else None)
+            if error:
+                await self.fail(response, error)
+                return
+            message = rule.message(fields) if rule else {"role": "assistant", "content": "I can help you with that."}
+            await asyncio.sleep((rule.latency if rule and rule.latency else self.server.latency).sample())
+            if message.get("tool_calls"):
+                for call in message["tool_calls"]:
+                    await self.function_call(response, call)
+            else:
+                await self.spoken_answer(response, message["content"])
+            response["status"] = "completed"
+            response["usage"] = {"total_tokens": usage(messages, self.session.get("tools") or [], message)["total_tokens"]}
+            await self.send({"type": "response.done", "response": response})
+        except asyncio.CancelledError:
+            await self.send({"type": "response.done", "response": dict(response, status="cancelled")})
+
+    async def fail(self, response, kind):
+        """Injected failure of a response: an error event and a failed response, or the websocket closed."""
+        self.server.stats[f"error_{kind}"] += 1
+        if kind == "timeout":
+            await asyncio.sleep(self.server.hang_seconds)
+        if kind in ("timeout", "disconnect"):
+            await self.ws.close()
+            return
+        error = {"type": "rate_limit_exceeded" if kind == "429" else "server_error", "code": kind, "message": "injected error"}
+        await self.send({"type": "error", "error": error})
+        await self.send({"type": "response.done", "response": dict(response, status="failed", status_details={"type": "failed", "error": error})})
+
+    async def function_call(self, response, call):
+        item = {"id": f"item_{uuid.uuid4().hex[:12]}", "object": "realtime.item", "type": "function_call", "status": "in_progress",
+                "name": call["function"]["name"], "call_id": call["id"], "arguments": ""}
+        output_index = len(response["output"])
+        await self.send({"type": "response.output_item.added", "response_id": response["id"], "output_index": output_index, "item": dict(item)})
+        await self.add_item(dict(item))
+        arguments = call["function"]["arguments"]
+        await self.send({"type": "response.function_call_arguments.delta", "response_id": response["id"], "item_id": item["id"], "output_index": output_index,
+                         "call_id": item["call_id"], "delta": arguments})
+        await self.send({"type": "response.function_call_arguments.done", "response_id": response["id"], "item_id": item["id"], "output_index": output_index,
+                         "call_id": item["call_id"], "arguments": arguments})
+        item.update(status="completed", arguments=arguments)
+        self.items[-1] = dict(item)
+        response["output"].append(item)
+        await self.send({"type": "response.output_item.done", "response_id": response["id"], "output_index": output_index, "item": item})
+
+    async def spoken_answer(self, response, text):
+        item = {"id": f"item_{uuid.uuid4().hex[:12]}", "object": "realtime.item", "type": "message", "status": "in_progress", "role": "assistant", "content": []}
+        ids = {"response_id": response["id"], "item_id": item["id"], "output_index": len(response["output"]), "content_index": 0}
+        audio = "audio" in self.session.get("modalities", []) and not self.session.get("disable_audio")
+        await self.send({"type": "response.output_item.added", "response_id": response["id"], "output_index": ids["output_index"], "item": dict(item)})
+        await self.add_item(dict(item))
+        part = {"type": "audio", "transcript": ""} if audio else {"type": "text", "text": ""}
+        await self.send(dict(ids, type="response.content_part.added", part=part))
+        #Silence standing for the spoken word, so the client receives as much audio as a real answer
+        word_audio = base64.b64encode(bytes(AUDIO_RATE * 2 * self.server.audio_ms_per_word // 1000)).decode()
+        for i, word in enumerate(text.split(" ")):
+            if i:
+                await asyncio.sleep(self.server.token_latency.sample())
+            delta = word if i == 0 else " " + word
+            if audio:
+                await self.send(dict(ids, type="response.audio_transcript.delta", delta=delta))
+                await self.send(dict(ids, type="response.audio.delta", delta=word_audio))
+            else:
+                await self.send(dict(ids, type="response.text.delta", delta=delta))
+        if audio:
+            await self.send(dict(ids, type="response.audio.done"))
+            await self.send(dict(ids, type="response.audio_transcript.done", transcript=text))
+            part = {"type": "audio", "transcript": text}
+        else:
+            await self.send(dict(ids, type="response.text.done", text=text))
+            part = {"type": "text", "text": text}
+        await self.send(dict(ids, type="response.content_part.done", part=part))
+        item.update(status="completed", content=[part])
+        self.items[-1] = dict(item)
+        response["output"].append(item)
+        await self.send({"type": "response.output_item.done", "response_id": response["id"], "output_index": ids["output_index"], "item": item})
+
+
+def load_script(path) -> List[dict]:
+    """Rules from a JSON list, or from JSON lines such as those written by --record."""
+    with open(path) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Serve a local fake Azure OpenAI endpoint: chat completions, embeddings and the realtime websocket.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8090)
+    arg_parser.add_argument("--script", default=DEFAULT_SCRIPT, help="JSON rules (or JSON lines) choosing the responses, empty answers every request the same way")
+    arg_parser.add_argument("--latency", default="200", help="ms before the response (first token when streaming): <ms>, uniform:<low>:<high>, normal:<mean>:<sd> or lognormal:<median>:<sigma>")
+    arg_parser.add_argument("--token-latency", default="0", help="ms per generated word, same forms as --latency")
+    arg_parser.add_argument("--embedding-latency", default="50", help="ms per embeddings request, same forms as --latency")
+    arg_parser.add_argument("--errors", default="", help="injected failure rates, e.g. 429=0.02,500=0.01,timeout=0.001,disconnect=0.001")
+    arg_parser.add_argument("--retry-after", type=float, default=1.0, help="seconds announced by injected 429s")
+    arg_parser.add_argument("--hang-seconds", type=float, default=600.0, help="how long an injected timeout leaves a request unanswered")
+    arg_parser.add_argument("--embedding-dim", type=int, default=1536, help="embedding size, the size of the policy embeddings in use")
+    arg_parser.add_argument("--transcript", action="append", help="what the caller says in each realtime turn, in order (repeat the option)")
+    arg_parser.add_argument("--proxy", help="real Azure OpenAI endpoint to forward chat completions and embeddings to")
+    arg_parser.add_argument("--api-key", help="key of the --proxy endpoint")
+    arg_parser.add_argument("--record", help="append the proxied chat exchanges to this file as replayable rules")
+    args = arg_parser.parse_args()
+
+    fake = FakeOpenAI(script=args.script, latency=args.latency, token_latency=args.token_latency, embedding_latency=args.embedding_latency,
+                      errors=args.errors, embedding_dim=args.embedding_dim, retry_after=args.retry_after, hang_seconds=args.hang_seconds,
+                      transcripts=args.transcript, proxy=args.proxy, api_key=args.api_key, record=args.record)
+    print(f"fake Azure OpenAI on http://{args.host}:{args.port}, {len(fake.rules)} rules, latency {fake.latency} ms, token latency {fake.token_latency} ms, "
+          f"errors {fake.errors or 'none'}; point the services at it with:")
+    fake.port = args.port
+    for name, value in fake.environment().items():
+        print(f"{name}={value.replace('127.0.0.1', args.host)}")
+    web.run_app(fake.app(), host=args.host, port=args.port, access_log=None, print=None)
@@ -0,0 +1,66 @@
+#End-to-end latency of turns where the active agent hands over with get_help, with and without speculative routing and the local intent router.
+#Run from the text_agent folder: python -m benchmarks.handoff_bench --turns 20
+import argparse
+import asyncio
+import contextlib
+import io
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+
+
+async def measure(runner, session_state, turns, question):
+    """Every turn starts a session on generic_agent, which asks for help; the flight agent then answers with one tool round."""
+    latencies = []
+    for _ in range(turns):
+        session_id = str(uuid.uuid4())
+        session_state.set(session_id, {"active_agent": "generic_agent", "conversation": runner.get_agent("generic_agent").new_conversation()})
+        start = time.perf_counter()
+        await runner.arun(question, session_id)
+        latencies.append(time.perf_counter() - start)
+        assert session_state.get(session_id)["active_agent"] == "flight_agent"
+    return np.array(latencies) * 1000
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark get_help handoff latency.")
+    arg_parser.add_argument("--turns", type=int, default=20)
+    arg_parser.add_argument("--latency-ms", type=float, default=300.0, help="fake model latency per chat completion, routing included")
+    arg_parser.add_argument("--question", default="what flights do I have booked?")
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+
+    from src.agents.agent_manager import Agent_Runner, handoff_routing
+    from src.utils.session_state import SessionState
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state = SessionState()
+        runner = Agent_Runner(session_state)
+    router = runner.intent_router
+    print(f"fake model latency {args.latency_ms:.0f} ms; generic_agent round, get_help, routing, then 2 flight_agent rounds around a DB tool")
+    print(f"{'routing':<8} {'speculative':<11} {'turn p50':>9} {'turn p95':>9} {'wait ms':>9}")
+
+    async def main():
+        for routing, intent_router in (("llm", None), ("router", router)):
+            for speculative in (False, True):
+                if routing == "router" and intent_router is None:
+                    continue
+                runner.intent_router = intent_router
+                runner.speculative_routing = speculative
+                count_before, sum_before = handoff_routing.count, handoff_routing.sum
+                with contextlib.redirect_stdout(io.StringIO()):
+                    latencies = await measure(runner, session_state, args.turns, args.question)
+                wait = (handoff_routing.sum - sum_before) / (handoff_routing.count - count_before) * 1000
+                print(f"{routing:<8} {str(speculative):<11} {np.percentile(latencies, 50):>9.0f} {np.percentile(latencies, 95):>9.0f} "
+                      f"{wait:>9.1f}")
+
+    asyncio.run(main())
+    server.shutdown()
+    shutil.rmtree(workdir)
@@ -0,0 +1,121 @@
+#Accuracy, embedding-call rate and end-to-end latency of vector, hybrid and hybrid + lexical fast path knowledge base search.
+#Run from the text_agent folder: python -m benchmarks.hybrid_search_bench --embed-latency-ms 50
+import argparse
+import hashlib
+import time
+
+import numpy as np
+
+from src.utils.hybrid_search import HybridSearch
+from src.utils.lexical_index import tokenize
+from src.utils.policy_index import PolicyIndex
+
+AIRLINES = ["Air France", "Alaska Airlines", "American Airlines", "Delta", "United", "Lufthansa", "Emirates", "Qantas",
+            "KLM", "Iberia", "Finnair", "Turkish Airlines", "JetBlue", "Southwest", "Ryanair", "Singapore Airlines"]
+POLICIES = {
+    "pet": "Small pets such as cats and dogs may travel in the cabin in an approved carrier under the seat. Larger pets travel in the hold.",
+    "infant": "Infants under two years may travel on the lap of an adult. An infant fare applies and a bassinet can be requested.",
+    "checked bag": "Each passenger may check one bag up to 23 kg. Additional checked bags are charged per bag and per direction.",
+    "carry-on": "One carry-on bag up to 8 kg and one personal item are allowed in the cabin. Carry-on dimensions are 55 x 40 x 20 cm.",
+    "cancellation": "Tickets can be cancelled up to 24 hours before departure. Refundable fares are refunded to the original form of payment.",
+    "flight change": "Flight changes are allowed up to 3 hours before departure. A change fee and any fare difference apply.",
+    "seating": "Seats can be selected at booking. Extra legroom and exit row seats are offered for a fee.",
+    "special meal": "Vegetarian, kosher, halal and gluten free special meals can be ordered up to 48 hours before departure.",
+    "oversized baggage": "Oversized baggage such as sports equipment, bicycles and musical instruments must be declared in advance.",
+    "unaccompanied minor": "Children aged 5 to 14 travelling alone use the unaccompanied minor service with a dedicated escort.",
+}
+#Paraphrases an embedding model understands but BM25 does not; the fake embedder maps them onto the same concept
+SYNONYMS = {"dog": "pet", "cat": "pet", "puppy": "pet", "baby": "infant", "toddler": "infant", "suitcase": "bag",
+            "luggage": "bag", "refund": "cancellation", "rebook": "change", "reschedule": "change", "chair": "seat",
+            "food": "meal", "vegan": "vegetarian", "kid": "minor", "child": "minor", "alone": "unaccompanied",
+            "surfboard": "oversized", "golf": "oversized"}
+KEYWORD_QUERIES = ["{airline} {policy} policy", "{policy} {airline}", "{airline} {policy} rules"]
+NATURAL_QUERIES = ["can I bring my dog on a {airline} flight", "is there a fee for my baby flying with {airline}",
+                   "how many suitcases can I check on {airline}", "can I get a refund from {airline}",
+                   "how do I reschedule my {airline} trip", "can I order vegan food on {airline}",
+                   "can my kid fly alone on {airline}", "can I take my surfboard on {airline}"]
+#Embedding models separate topics well but barely tell one airline name from another; exact names are where BM25 helps
+ENTITY_TERMS = {term for airline in AIRLINES for term in tokenize(airline)}
+ENTITY_WEIGHT = 0.3
+NATURAL_TARGETS = ["pet", "infant", "checked bag", "cancellation", "flight change", "special meal", "unaccompanied minor", "oversized baggage"]
+
+
+def build_corpus():
+    chunks = []
+    for airline in AIRLINES:
+        for policy, text in POLICIES.items():
+            chunks.append((f"{airline}|{policy}", f"{airline} {policy} policy: {text} Contact {airline} customer service for details."))
+    return chunks
+
+
+def build_queries(rng, n_queries):
+    queries = []
+    for _ in range(n_queries):
+        airline = AIRLINES[rng.integers(len(AIRLINES))]
+        if rng.random() < 0.5:
+            policy = list(POLICIES)[rng.integers(len(POLICIES))]
+            template = KEYWORD_QUERIES[rng.integers(len(KEYWORD_QUERIES))]
+            queries.append((template.format(airline=airline, policy=policy), f"{airline}|{policy}"))
+        else:
+            choice = rng.integers(len(NATURAL_QUERIES))
+            queries.append((NATURAL_QUERIES[choice].format(airline=airline), f"{airline}|{NATURAL_TARGETS[choice]}"))
+    return queries
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-concepts embedding (paraphrases map to shared concepts, airline names are down-weighted) with a simulated API latency; counts its calls."""
+
+    def __init__(self, dim, latency):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def term_vector(self, term):
+        seed = int(hashlib.sha1(term.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def vector(self, text):
+        terms = [SYNONYMS.get(term, term) for term in tokenize(text)]
+        if not terms:
+            return np.zeros(self.dim, np.float32)
+        return np.sum([self.term_vector(term) * (ENTITY_WEIGHT if term in ENTITY_TERMS else 1.0) for term in terms], axis=0)
+
+    def __call__(self, text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.vector(text)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark hybrid BM25 + vector knowledge base search and its lexical fast path.")
+    arg_parser.add_argument("--queries", type=int, default=400)
+    arg_parser.add_argument("--embed-latency-ms", type=float, default=50.0, help="simulated embedding API latency")
+    arg_parser.add_argument("--dim", type=int, default=256)
+    arg_parser.add_argument("--weight", type=float, default=0.5, help="BM25 weight in the fusion")
+    arg_parser.add_argument("--coverage", type=float, default=1.0, help="term coverage needed for the fast path")
+    arg_parser.add_argument("--margin", type=float, default=1.3, help="top/second BM25 score ratio needed for the fast path")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    chunks = build_corpus()
+    embedder = FakeEmbedder(args.dim, args.embed_latency_ms / 1000)
+    matrix = np.array([embedder.vector(text) for _, text in chunks])
+    index = PolicyIndex([chunk_id for chunk_id, _ in chunks], [text for _, text in chunks], matrix)
+    queries = build_queries(np.random.default_rng(args.seed), args.queries)
+
+    modes = (("vector", {}),
+             ("hybrid", {"lexical_weight": args.weight}),
+             ("hybrid + fast path", {"lexical_weight": args.weight, "fast_path_coverage": args.coverage, "fast_path_margin": args.margin}))
+    print(f"{len(chunks)} chunks, {len(queries)} queries (half keyword, half paraphrased), embedding latency {args.embed_latency_ms:.0f} ms")
+    print(f"{'mode':<20} {'top1':>6} {'top3':>6} {'emb calls':>10} {'fast path':>10} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, options in modes:
+        search = HybridSearch(index, **options)
+        embedder.calls = 0
+        top1 = top3 = 0
+        for question, expected in queries:
+            results = [row[0] for row in search.search(question, embedder, topk=3)]
+            top1 += results[:1] == [expected]
+            top3 += expected in results
+        stats = search.stats()
+        print(f"{name:<20} {top1 / len(queries):>6.3f} {top3 / len(queries):>6.3f} {embedder.calls:>10} "
+              f"{stats['fast_path_rate']:>10.1%} {stats['mean_ms']:>8.2f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f}")
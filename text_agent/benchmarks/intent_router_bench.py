@@ -0,0 +1,71 @@
+#Latency of Agent_Runner.rank_agents with the local intent router versus the LLM alone, on the validation requests.
+#Run from the text_agent folder: python -m benchmarks.intent_router_bench --requests 200
+import argparse
+import contextlib
+import io
+import random
+import shutil
+import time
+
+import numpy as np
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+from src.utils.intent_router import DEFAULT_VALIDATION_FILE, LABEL_TO_AGENT, last_user_line, read_examples
+
+
+def measure(runner, requests):
+    latencies, routed = [], []
+    for request, _ in requests:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            routed.append(runner.rank_agents(request))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000, routed
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark agent ranking with and without the local router.")
+    arg_parser.add_argument("--requests", type=int, default=200, help="validation requests replayed")
+    arg_parser.add_argument("--latency-ms", type=float, default=300.0, help="fake LLM latency per ranking")
+    arg_parser.add_argument("--threshold", type=float, nargs="+", default=[0.5, 0.7, 0.9], help="INTENT_ROUTER_THRESHOLD values")
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    FakeChatHandler.route_answer = "generic_agent"
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+
+    from src.agents.agent_manager import Agent_Runner
+    from src.utils.session_state import SessionState
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        runner = Agent_Runner(SessionState())
+    if runner.intent_router is None:
+        raise SystemExit("no intent router model, train it with: python -m src.utils.intent_router train")
+    texts, labels = read_examples(DEFAULT_VALIDATION_FILE)
+    # rank_agents gets a single request: the customer's question or the get_help message of an agent
+    requests = [(last_user_line(text)[len("user: "):], LABEL_TO_AGENT.get(label, label)) for text, label in zip(texts, labels)]
+    requests = random.Random(0).sample(requests, min(args.requests, len(requests)))
+
+    print(f"fake LLM latency {args.latency_ms:.0f} ms, {len(requests)} validation requests")
+    print(f"{'classifier':<16} {'local share':>11} {'local acc':>9} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    router = runner.intent_router
+    runner.intent_router = None
+    latencies, _ = measure(runner, requests)
+    print(f"{'llm':<16} {0:>11.1%} {'-':>9} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f} {latencies.mean():>8.2f}")
+    runner.intent_router = router
+    for threshold in args.threshold:
+        runner.intent_router_threshold = threshold
+        with contextlib.redirect_stdout(io.StringIO()):
+            routed = [(runner.rank_locally(request), agent) for request, agent in requests]
+        local = [(ranked[0], agent) for ranked, agent in routed if ranked is not None]
+        correct = [agent_name == agent for agent_name, agent in local]
+        latencies, _ = measure(runner, requests)
+        print(f"{f'router >= {threshold}':<16} {len(local) / len(requests):>11.1%} {np.mean(correct) if correct else 0:>9.1%} "
+              f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f} {latencies.mean():>8.2f}")
+    start = time.perf_counter()
+    for request, _ in requests:
+        router.route(request)
+    print(f"router alone: {(time.perf_counter() - start) / len(requests) * 1000:.3f} ms per request")
+    server.shutdown()
+    shutil.rmtree(workdir)
@@ -0,0 +1,132 @@
+#Connections, TLS handshakes and request latency when every component has its own Azure OpenAI client versus the shared client registry.
+#Run from the text_agent folder: python -m benchmarks.openai_clients_bench --components 12 --rounds 20 --tls
+import argparse
+import asyncio
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+from openai import AsyncAzureOpenAI, AzureOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from benchmarks.async_agent_bench import FakeChatHandler
+from agent_common import openai_clients
+from agent_common.openai_clients import acount_connections, count_connections, get_async_openai_client, get_openai_client
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def start_server(workdir, tls):
+    """The fake chat server, behind a self-signed certificate trusted through SSL_CERT_FILE when `tls` is set."""
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatHandler)
+    server.daemon_threads = True
+    scheme = "http"
+    if tls:
+        cert, key = os.path.join(workdir, "cert.pem"), os.path.join(workdir, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                        "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key, "-out", cert], check=True, capture_output=True)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        os.environ["SSL_CERT_FILE"] = cert
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_port}"
+
+
+def own_clients(components):
+    """One client, with its own connection pool, per component: what every Smart_Agent, Tool and the runner did before."""
+    settings = dict(api_key=os.environ["AZURE_OPENAI_API_KEY"], api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+                    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"])
+    return [AzureOpenAI(**settings, http_client=DefaultHttpxClient(event_hooks={"request": [count_connections]})) for _ in range(components)]
+
+
+def own_async_clients(components):
+    settings = dict(api_key=os.environ["AZURE_OPENAI_API_KEY"], api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+                    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"])
+    return [AsyncAzureOpenAI(**settings, http_client=DefaultAsyncHttpxClient(event_hooks={"request": [acount_connections]}))
+            for _ in range(components)]
+
+
+def run_sync(clients, rounds, concurrency, gap):
+    """Every round, each component sends one chat completion, `concurrency` at a time; rounds are `gap` seconds apart."""
+    def call(client):
+        start = time.perf_counter()
+        client.chat.completions.create(model="gpt-4o", messages=MESSAGES)
+        return time.perf_counter() - start
+
+    latencies = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(rounds):
+            latencies += pool.map(call, [client() for client in clients])
+            time.sleep(gap)
+    return latencies
+
+
+async def run_async(clients, rounds, concurrency, gap):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def call(client):
+        async with limit:
+            start = time.perf_counter()
+            await client().chat.completions.create(model="gpt-4o", messages=MESSAGES)
+            return time.perf_counter() - start
+
+    latencies = []
+    for _ in range(rounds):
+        latencies += await asyncio.gather(*(call(client) for client in clients))
+        await asyncio.sleep(gap)
+    return latencies
+
+
+def report(label, latencies, before):
+    after = openai_clients.connection_stats()
+    requests = after["requests"] - before["requests"]
+    opened = after["connections_opened"] - before["connections_opened"]
+    latencies = np.array(latencies) * 1000
+    print(f"{label:<22} {requests:>8} {opened:>11} {after['tls_handshakes'] - before['tls_handshakes']:>6} "
+          f"{1 - opened / requests:>8.1%} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark per-component Azure OpenAI clients against the shared client registry.")
+    arg_parser.add_argument("--components", type=int, default=12, help="agents, tools and the runner, each with its own client before the registry")
+    arg_parser.add_argument("--rounds", type=int, default=20, help="rounds in which every component sends one request")
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    arg_parser.add_argument("--gap-ms", type=float, default=0.0, help="idle time between rounds, above 5000 the default pools drop their connections")
+    arg_parser.add_argument("--latency-ms", type=float, default=5.0, help="fake model latency")
+    arg_parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate, needs the openssl command")
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    workdir = tempfile.mkdtemp()
+    server, endpoint = start_server(workdir, args.tls)
+    os.environ.update({"AZURE_OPENAI_ENDPOINT": endpoint, "AZURE_OPENAI_API_KEY": "fake", "AZURE_OPENAI_API_VERSION": "2024-04-01-preview"})
+    gap = args.gap_ms / 1000
+
+    print(f"{args.components} components x {args.rounds} rounds, {args.concurrency} requests in flight, {args.gap_ms:.0f} ms between rounds, "
+          f"{'https' if args.tls else 'http'}")
+    print(f"{'clients':<22} {'requests':>8} {'connections':>11} {'tls':>6} {'reused':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    before = openai_clients.connection_stats()
+    clients = own_clients(args.components)
+    report("sync, own per comp.", run_sync([lambda client=client: client for client in clients], args.rounds, args.concurrency, gap), before)
+    before = openai_clients.connection_stats()
+    report("sync, registry", run_sync([get_openai_client] * args.components, args.rounds, args.concurrency, gap), before)
+
+    async def main():
+        before = openai_clients.connection_stats()
+        clients = own_async_clients(args.components)
+        report("async, own per comp.", await run_async([lambda client=client: client for client in clients], args.rounds, args.concurrency, gap), before)
+        before = openai_clients.connection_stats()
+        report("async, registry", await run_async([get_async_openai_client] * args.components, args.rounds, args.concurrency, gap), before)
+
+    asyncio.run(main())
+    server.shutdown()
+    shutil.rmtree(workdir)
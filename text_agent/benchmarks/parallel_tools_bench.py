@@ -0,0 +1,90 @@
+#Turn latency when the model asks for several read-only tools in one response: concurrent versus one after the other.
+#Run from the text_agent folder: python -m benchmarks.parallel_tools_bench --turns 20
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import shutil
+import time
+
+import numpy as np
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+
+#Independent lookups a "what is going on with my trip?" question typically triggers
+TOOL_CALLS = [
+    ("load_user_flight_info", {"user_id": "12345"}),
+    ("check_flight_status", {"flight_num": "AB123", "from_": "Airport A"}),
+    ("search_airline_knowledgebase", {"search_query": "checked baggage allowance"}),
+]
+DB_TOOLS = ("load_user_flight_info", "check_flight_status")
+
+
+def with_latency(function, seconds):
+    """Stand-in for a remote database: the local SQLite queries take well under a millisecond."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        time.sleep(seconds)
+        return function(*args, **kwargs)
+    return wrapper
+
+
+async def measure(agent, turns, use_async):
+    latencies = []
+    for turn in range(turns):
+        conversation = list(agent.init_history)
+        question = f"what is going on with my trip? ({turn})"
+        start = time.perf_counter()
+        if use_async:
+            await agent.arun(question, conversation)
+        else:
+            agent.run(question, conversation)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark concurrent versus sequential read-only tool calls within one model turn.")
+    arg_parser.add_argument("--turns", type=int, default=20)
+    arg_parser.add_argument("--latency-ms", type=float, default=200.0, help="fake model latency per chat completion")
+    arg_parser.add_argument("--embedding-latency-ms", type=float, default=80.0, help="fake embedding latency, paid by the knowledge base search")
+    arg_parser.add_argument("--db-latency-ms", type=float, default=50.0, help="latency added to the DB tools")
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    FakeChatHandler.embedding_latency = args.embedding_latency_ms / 1000
+    FakeChatHandler.tool_calls = TOOL_CALLS
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+    #Every turn asks the same policy question and makes the same lookups, keep them real embedding and DB calls
+    os.environ.update({"EMBEDDING_CACHE_SIZE": "0", "EMBEDDING_CACHE_FILE": "", "SEMANTIC_CACHE_ENABLED": "false", "TOOL_CACHE_ENABLED": "false"})
+
+    from src.agents.smart_agent import Smart_Agent, parallel_tool_seconds_saved, parallel_tool_steps
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = Smart_Agent("flight_agent", "src/agents/agent_profiles")
+    for name in DB_TOOLS:
+        agent.functions_list[name] = with_latency(agent.functions_list[name], args.db_latency_ms / 1000)
+    read_only_tools = agent.read_only_tools
+    print(f"fake model latency {args.latency_ms:.0f} ms, embedding {args.embedding_latency_ms:.0f} ms, DB tools {args.db_latency_ms:.0f} ms; "
+          f"{len(TOOL_CALLS)} read-only tool calls in the first response of every turn")
+    print(f"{'path':<6} {'tools':<11} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+
+    async def main():
+        for path, use_async in (("run", False), ("arun", True)):
+            means = {}
+            for mode, tools in (("sequential", set()), ("concurrent", read_only_tools)):
+                agent.read_only_tools = tools
+                with contextlib.redirect_stdout(io.StringIO()):
+                    await measure(agent, 2, use_async)
+                    latencies = await measure(agent, args.turns, use_async)
+                means[mode] = latencies.mean()
+                print(f"{path:<6} {mode:<11} {np.percentile(latencies, 50):>8.0f} {np.percentile(latencies, 95):>8.0f} {means[mode]:>8.0f}")
+            print(f"{path:<6} saved {means['sequential'] - means['concurrent']:.0f} ms per turn")
+
+    asyncio.run(main())
+    print(f"concurrent steps: {parallel_tool_steps.value}, tool time saved: {parallel_tool_seconds_saved.value:.2f}s")
+    server.shutdown()
+    shutil.rmtree(workdir)
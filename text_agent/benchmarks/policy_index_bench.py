@@ -0,0 +1,79 @@
+#Benchmark of the vectorized PolicyIndex against the original per-chunk cosine loop.
+#Run from the text_agent folder: python -m benchmarks.policy_index_bench --sizes 1000 100000 1000000
+import argparse
+import time
+import uuid
+
+import numpy as np
+from scipy import spatial
+
+from src.utils.policy_index import PolicyIndex
+
+
+def legacy_search(chunks_emb, input_vector, topk=3):
+    """The original Tool.search_knowledge_base ranking loop."""
+    cosine_list = []
+    for item in chunks_emb:
+        cosine_sim = 1 - spatial.distance.cosine(input_vector, item['policy_text_embedding'])
+        cosine_list.append((item['id'], item['policy_text'], cosine_sim))
+    cosine_list.sort(key=lambda x: x[2], reverse=True)
+    return cosine_list[:topk]
+
+
+def random_matrix(rng, n_chunks, dim, block_size=65536):
+    matrix = np.empty((n_chunks, dim), dtype=np.float32)
+    for start in range(0, n_chunks, block_size):
+        stop = min(start + block_size, n_chunks)
+        matrix[start:stop] = rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return matrix
+
+
+def time_queries(search, queries):
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def run(sizes, dim, n_queries, topk, max_loop_chunks, seed):
+    rng = np.random.default_rng(seed)
+    queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+    print(f"{'chunks':>10} {'loop ms/query':>15} {'index ms/query':>15} {'speedup':>10}  top-{topk} match")
+    for n_chunks in sizes:
+        matrix = random_matrix(rng, n_chunks, dim)
+        ids = [str(uuid.UUID(int=i)) for i in range(n_chunks)]
+        texts = [f"policy chunk {i}" for i in range(n_chunks)]
+
+        # The legacy loop keeps every embedding as a list of Python floats, which does not fit in memory
+        # at 1M chunks; above max_loop_chunks its cost is measured on a prefix and scaled linearly.
+        loop_chunks = min(n_chunks, max_loop_chunks)
+        chunks_emb = [{'id': ids[i], 'policy_text': texts[i], 'policy_text_embedding': matrix[i].tolist()} for i in range(loop_chunks)]
+        query_lists = [query.tolist() for query in queries]
+        loop_seconds = time_queries(lambda q: legacy_search(chunks_emb, q, topk), query_lists)
+        loop_seconds *= n_chunks / loop_chunks
+        extrapolated = "*" if loop_chunks < n_chunks else " "
+
+        index = PolicyIndex(ids, texts, matrix)
+        index_seconds = time_queries(lambda q: index.search(q, topk), queries)
+
+        if loop_chunks == n_chunks:
+            matches = all([r[0] for r in legacy_search(chunks_emb, q.tolist(), topk)] == [r[0] for r in index.search(q, topk)] for q in queries)
+            match = "yes" if matches else "NO"
+        else:
+            match = "n/a"
+        print(f"{n_chunks:>10} {loop_seconds * 1000:>14.2f}{extrapolated} {index_seconds * 1000:>15.3f} {loop_seconds / index_seconds:>9.0f}x  {match}")
+        del chunks_emb, index, matrix
+    if any(n_chunks > max_loop_chunks for n_chunks in sizes):
+        print(f"* loop time extrapolated from the first {max_loop_chunks} chunks")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compare the vectorized policy index with the legacy cosine loop.")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    arg_parser.add_argument("--dim", type=int, default=1536, help="embedding dimension (text-embedding-ada-002 is 1536)")
+    arg_parser.add_argument("--queries", type=int, default=20)
+    arg_parser.add_argument("--topk", type=int, default=3)
+    arg_parser.add_argument("--max-loop-chunks", type=int, default=20000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    run(args.sizes, args.dim, args.queries, args.topk, args.max_loop_chunks, args.seed)
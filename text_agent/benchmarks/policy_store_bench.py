@@ -0,0 +1,113 @@
+#Startup time and memory of per-instance JSON loading versus the shared memory-mapped policy store.
+#Run from the text_agent folder: python -m benchmarks.policy_store_bench --chunks 2000 --instances 3 --workers 4
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from src.utils import policy_store
+
+
+def write_policy_json(path, n_chunks, dim, seed):
+    rng = np.random.default_rng(seed)
+    chunks = [{
+        "id": str(uuid.UUID(int=i)),
+        "policy_text": f"Policy chunk {i}: " + "lorem ipsum " * 40,
+        "policy_text_embedding": rng.standard_normal(dim).astype(np.float32).tolist(),
+    } for i in range(n_chunks)]
+    with open(path, "w") as file:
+        json.dump(chunks, file)
+
+
+def memory_kb():
+    """Resident set size of this process and the part of it that is private, i.e. not shared with other processes."""
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as file:
+            for line in file:
+                key, value = line.split(":", 1)
+                if key == "Rss":
+                    usage["Rss"] = int(value.split()[0])
+                elif key.startswith("Private_"):
+                    usage["Private"] = usage.get("Private", 0) + int(value.split()[0])
+    except OSError:
+        import resource
+        usage["Rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def worker(mode, json_path, instances, loaded, done, results):
+    before = memory_kb()
+    start = time.perf_counter()
+    if mode == "json":
+        # What every FlightAgentTool/HotelAgentTool/Tool instance used to do on construction.
+        indexes = []
+        for _ in range(instances):
+            with open(json_path) as file:
+                indexes.append(json.load(file))
+    else:
+        indexes = [policy_store.load_policy_index(json_path) for _ in range(instances)]
+    load_seconds = time.perf_counter() - start
+    # Run one search so the mapped pages are actually faulted in before measuring.
+    first = indexes[0]
+    if mode != "json":
+        first.search(np.ones(first.matrix.shape[1], dtype=np.float32))
+    loaded.wait()
+    after = memory_kb()
+    results.put({"load_seconds": load_seconds, **{key: after[key] - before[key] for key in after}})
+    done.wait()
+
+
+def run_mode(mode, json_path, instances, workers):
+    context = multiprocessing.get_context("fork")
+    loaded, done = context.Barrier(workers + 1), context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, json_path, instances, loaded, done, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    loaded.wait()
+    reports = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+    return reports
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compare JSON loading with the memory-mapped policy store.")
+    arg_parser.add_argument("--json", help="existing policy JSON file; a synthetic one is generated when omitted")
+    arg_parser.add_argument("--chunks", type=int, default=2000)
+    arg_parser.add_argument("--dim", type=int, default=1536)
+    arg_parser.add_argument("--instances", type=int, default=3, help="tool instances loading the same file per process")
+    arg_parser.add_argument("--workers", type=int, default=4, help="concurrent worker processes, like uvicorn --workers")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = args.json
+        if json_path is None:
+            json_path = os.path.join(tmp_dir, "policy.json")
+            write_policy_json(json_path, args.chunks, args.dim, args.seed)
+        store_dir = tmp_dir if args.json is None else os.path.dirname(os.path.abspath(json_path))
+        start = time.perf_counter()
+        prefix = policy_store.convert(json_path, os.path.join(store_dir, "bench_policy_store"))
+        print(f"policy file {os.path.getsize(json_path) / 2**20:.1f} MB, converted in {time.perf_counter() - start:.2f}s")
+
+        for mode, path in (("json", json_path), ("mmap", prefix + policy_store.MATRIX_SUFFIX)):
+            reports = run_mode(mode, path, args.instances, args.workers)
+            load_ms = sorted(report["load_seconds"] * 1000 for report in reports)
+            rss_mb = sum(report["Rss"] for report in reports) / len(reports) / 1024
+            line = f"{mode:>5}: startup {load_ms[len(load_ms) // 2]:8.1f} ms/worker (median), RSS +{rss_mb:7.1f} MB/worker"
+            if "Private" in reports[0]:
+                private_mb = sum(report["Private"] for report in reports) / len(reports) / 1024
+                line += f", of which private +{private_mb:7.1f} MB/worker"
+            print(line)
+
+        if args.json is not None:
+            for suffix in (policy_store.MATRIX_SUFFIX, policy_store.SIDECAR_SUFFIX):
+                os.remove(prefix + suffix)
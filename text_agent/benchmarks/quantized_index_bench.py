@@ -0,0 +1,48 @@
+#Memory, latency and top-k agreement of the float16 / int8 quantized scans against float32 exact search.
+#Run from the text_agent folder: python -m benchmarks.quantized_index_bench --chunks 200000
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.ann_index_bench import clustered_corpus, measure, recall
+from src.utils.policy_index import PRECISIONS, PolicyIndex
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Quantized versus float32 exact knowledge base search.")
+    arg_parser.add_argument("--chunks", type=int, default=200000)
+    arg_parser.add_argument("--dim", type=int, default=1536)
+    arg_parser.add_argument("--topics", type=int, default=500)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--topk", type=int, default=3)
+    arg_parser.add_argument("--shortlist", type=int, default=32)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    matrix, queries = clustered_corpus(rng, args.chunks, args.dim, args.topics)
+    queries = queries[:args.queries]
+    ids = [str(row) for row in range(args.chunks)]
+    texts = [""] * args.chunks
+
+    # Re-ranking reads the float32 rows from a memory-mapped matrix, the way open_store serves them.
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "policy.npy")
+        np.save(path, matrix)
+        del matrix
+        mapped = np.load(path, mmap_mode="r")
+
+        truth = None
+        print(f"{'precision':<10} {'build s':>8} {'scan MB':>8} {'MB per 1M':>10} {'ms/query':>9} {f'agree@{args.topk}':>9}")
+        for precision in PRECISIONS:
+            start = time.perf_counter()
+            index = PolicyIndex(ids, texts, mapped, normalized=True, precision=precision, shortlist=args.shortlist)
+            build_seconds = time.perf_counter() - start
+            results, ms = measure(index, queries, args.topk)
+            truth = truth or results
+            scan_mb = index.nbytes() / 2**20
+            print(f"{precision:<10} {build_seconds:>8.1f} {scan_mb:>8.1f} {scan_mb * 1e6 / args.chunks:>10.0f} {ms:>9.3f} {recall(results, truth):>9.3f}")
+            del index
@@ -0,0 +1,204 @@
+#Peak load against a fake Azure OpenAI deployment that enforces RPM/TPM quotas with 429s: the SDK's own retries versus the LLM scheduler.
+#Run from the text_agent folder: python -m benchmarks.rate_limit_sim --sessions 8 --background 24 --background-every-ms 200
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment
+
+#(label, environment of the agent process)
+#(label, environment of the agent process); RATE_LIMIT_SIM_DIRECT sends requests straight to the client, as before the scheduler
+MODES = [("sdk retries", {"RATE_LIMIT_SIM_DIRECT": "1", "OPENAI_MAX_RETRIES": "2"}), ("scheduler", {})]
+
+
+class QuotaChatHandler(FakeChatHandler):
+    """
+    FakeChatHandler whose `deployment` admits at most rpm/tpm per minute, checked like Azure OpenAI over a sliding
+    window of `window` seconds. A request over quota gets a 429 with retry-after and retry-after-ms headers saying
+    when the window will have room for it. Each server gets its own subclass from `quota_handler`.
+    """
+    deployment = "gpt-4o"
+    rpm = 1200
+    tpm = 400000
+    window = 1.0
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.loads(raw)
+        if self.path.split("?")[0].endswith("/chat/completions") and f"/deployments/{self.deployment}/" in self.path:
+            wait = self.admit(self.usage(body, {"role": "assistant", "content": self.answer})["total_tokens"])
+            if wait > 0:
+                self.throttle(wait)
+                return
+        rfile = self.rfile
+        self.rfile = io.BytesIO(raw)
+        try:
+            super().do_POST()
+        finally:
+            self.rfile = rfile
+
+    def admit(self, tokens):
+        """Records the request and returns 0 when the window has room for it, otherwise the seconds until it will."""
+        max_requests, max_tokens = self.rpm * self.window / 60, self.tpm * self.window / 60
+        with self.lock:
+            now = time.monotonic()
+            while self.admitted and self.admitted[0][0] <= now - self.window:
+                self.admitted.popleft()
+            used = sum(admitted_tokens for _, admitted_tokens in self.admitted)
+            if len(self.admitted) + 1 <= max_requests and used + tokens <= max_tokens:
+                self.admitted.append((now, tokens))
+                self.stats["admitted"] += 1
+                return 0.0
+            self.stats["throttled"] += 1
+            requests_left, tokens_left = len(self.admitted) + 1 - max_requests, used + tokens - max_tokens
+            for admitted_at, admitted_tokens in self.admitted:
+                requests_left -= 1
+                tokens_left -= admitted_tokens
+                if requests_left <= 0 and tokens_left <= 0:
+                    return admitted_at + self.window - now
+            return self.window
+
+    def throttle(self, wait):
+        payload = json.dumps({"error": {"code": "429", "message": "Requests to the ChatCompletions_Create Operation have exceeded the rate limit."}}).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("retry-after", str(math.ceil(wait)))
+        self.send_header("retry-after-ms", str(int(wait * 1000)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def quota_handler(**quota):
+    return type("QuotaChatHandler", (QuotaChatHandler,), dict(quota, admitted=deque(), lock=threading.Lock(), stats={"admitted": 0, "throttled": 0}))
+
+
+def start_quota_server(handler):
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def child(port, sessions, turns, background, background_every):
+    """
+    Measured in the agent process: `sessions` flight_agent sessions taking `turns` turns (2 chat completions each)
+    back to back, and `background` agent rankings sent with background priority every `background_every` seconds
+    meanwhile, all on the same deployment. Prints JSON.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        workdir = fake_environment(port)
+    #Routing by the LLM on the chat deployment, so background rankings compete with the customers' turns
+    os.environ.update({"INTENT_ROUTER_MODEL": "", "AZURE_OPENAI_EVALUATOR_DEPLOYMENT": "gpt-4o"})
+    from src.agents.agent_manager import Agent_Runner
+    from agent_common import metrics
+    from agent_common.llm_scheduler import LLMScheduler
+    from src.utils.session_state import SessionState
+
+    if os.getenv("RATE_LIMIT_SIM_DIRECT"):
+        async def direct(self, create, priority="interactive", **kwargs):
+            return await create(**kwargs)
+        LLMScheduler.arequest = direct
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state = SessionState()
+        runner = Agent_Runner(session_state)
+    results = {"interactive": [], "background": [], "interactive_failed": 0, "background_failed": 0}
+
+    async def timed(kind, call):
+        start = time.perf_counter()
+        try:
+            await call()
+            results[kind].append(time.perf_counter() - start)
+        except Exception:
+            results[f"{kind}_failed"] += 1
+
+    async def session(session_id):
+        session_state.set(session_id, {"active_agent": "flight_agent", "conversation": runner.get_agent("flight_agent").new_conversation()})
+        for _ in range(turns):
+            await timed("interactive", lambda: runner.arun("what flights do I have?", session_id))
+
+    async def ranking(i):
+        await asyncio.sleep(i * background_every)
+        await timed("background", lambda: runner.arank_agents(f"question {i}", exclude="flight_agent", priority="background"))
+
+    async def main():
+        await asyncio.gather(*(session(str(uuid.uuid4())) for _ in range(sessions)), *(ranking(i) for i in range(background)))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(main())
+    results["wall"] = time.perf_counter() - start
+    results["metrics"] = {name: value for name, value in metrics.snapshot().items() if name.startswith("llm_")}
+    shutil.rmtree(workdir)
+    print(json.dumps(results))
+
+
+def percentiles(latencies):
+    return (np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000) if latencies else (float("nan"), float("nan"))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Simulate peak load against a fake deployment enforcing RPM/TPM quotas.")
+    arg_parser.add_argument("--sessions", type=int, default=8, help="customer sessions running at once")
+    arg_parser.add_argument("--turns", type=int, default=2, help="turns per session")
+    arg_parser.add_argument("--background", type=int, default=24, help="background rankings sent while the sessions run")
+    arg_parser.add_argument("--background-every-ms", type=float, default=200.0, help="time between background rankings")
+    arg_parser.add_argument("--rpm", type=float, default=1200, help="requests per minute of the fake deployment")
+    arg_parser.add_argument("--tpm", type=float, default=400000, help="tokens per minute of the fake deployment")
+    arg_parser.add_argument("--window", type=float, default=1.0, help="seconds over which the fake deployment checks its quota")
+    arg_parser.add_argument("--latency-ms", type=float, default=50.0, help="fake model latency")
+    arg_parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child:
+        child(args.child, args.sessions, args.turns, args.background, args.background_every_ms / 1000)
+        sys.exit(0)
+
+    print(f"{args.sessions} sessions x {args.turns} turns + {args.background} background rankings every {args.background_every_ms:.0f} ms, quota {args.rpm:.0f} RPM / "
+          f"{args.tpm:.0f} TPM checked over {args.window:.1f}s, fake model latency {args.latency_ms:.0f} ms")
+    print(f"{'mode':<12} {'429s':>5} {'turns ok':>9} {'bg ok':>6} {'turn p50':>9} {'turn p95':>9} {'bg p50':>8} {'bg p95':>8} {'turn wait':>10} {'bg wait':>8} "
+          f"{'wall s':>7} {'est/used tok':>13}")
+    failures = []
+    for label, mode_env in MODES:
+        handler = quota_handler(rpm=args.rpm, tpm=args.tpm, window=args.window, latency=args.latency_ms / 1000)
+        server = start_quota_server(handler)
+        env = dict(os.environ, LLM_RATE_LIMITS=f"gpt-4o={args.rpm:g}/{args.tpm:g}", LLM_BURST_SECONDS=str(args.window),
+                   LLM_RETRY_JITTER_SECONDS=str(args.window / 4), **mode_env)
+        if label == "sdk retries":
+            env.pop("LLM_RATE_LIMITS")
+        output = subprocess.run([sys.executable, "-m", "benchmarks.rate_limit_sim", "--child", str(server.server_port), "--sessions", str(args.sessions),
+                                 "--turns", str(args.turns), "--background", str(args.background), "--background-every-ms", str(args.background_every_ms)], env=env, check=True, capture_output=True, text=True).stdout
+        server.shutdown()
+        results = json.loads(output.strip().splitlines()[-1])
+        turn_p50, turn_p95 = percentiles(results["interactive"])
+        bg_p50, bg_p95 = percentiles(results["background"])
+        failed = results["interactive_failed"] + results["background_failed"]
+        used = results["metrics"].get("llm_tokens_used", 0)
+        ratio = f"{results['metrics'].get('llm_tokens_estimated', 0) / used:.2f}" if used else "-"
+        #Mean time requests of each priority waited in the scheduler for capacity
+        turn_wait, bg_wait = (results["metrics"].get(f'llm_queue_wait_seconds{{priority="{priority}"}}', {}).get("mean", 0.0) * 1000 for priority in ("interactive", "background"))
+        print(f"{label:<12} {handler.stats['throttled']:>5} {len(results['interactive']):>4}/{args.sessions * args.turns:<4} "
+              f"{len(results['background']):>3}/{args.background:<2} {turn_p50:>9.0f} {turn_p95:>9.0f} {bg_p50:>8.0f} {bg_p95:>8.0f} "
+              f"{turn_wait:>10.0f} {bg_wait:>8.0f} {results['wall']:>7.1f} {ratio:>13}")
+        if label == "scheduler":
+            if failed:
+                failures.append(f"{failed} requests failed")
+            if not turn_wait < bg_wait:
+                failures.append(f"customer turns waited longer for capacity ({turn_wait:.0f} ms) than background work ({bg_wait:.0f} ms)")
+    print("scheduler: " + ("; ".join(failures) if failures else "ok"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,62 @@
+#Synthetic policy corpus in the knowledge base JSON format (`id`, `policy_text`, `policy_text_embedding`).
+import json
+import uuid
+from typing import List
+
+import numpy as np
+
+from benchmarks.retrieval.embedder import FakeEmbedder
+
+AIRLINES = ["Air France", "Alaska Airlines", "American Airlines", "Delta", "United", "Lufthansa", "Emirates", "Qantas",
+            "KLM", "Iberia", "Finnair", "Turkish Airlines", "JetBlue", "Southwest", "Ryanair", "Singapore Airlines"]
+POLICY_TERMS = {
+    "pet": "pet cat dog carrier kennel cabin hold animal service emotional support crate",
+    "infant": "infant baby lap bassinet stroller car seat child fare age birth certificate",
+    "checked baggage": "checked bag suitcase weight kg allowance fee piece excess counter tag",
+    "carry-on": "carry-on cabin bag overhead bin personal item dimension laptop handbag",
+    "cancellation": "cancel refund credit voucher refundable penalty hours departure waiver",
+    "flight change": "change rebook reschedule fee fare difference same-day standby date",
+    "seating": "seat selection legroom exit row window aisle upgrade assignment",
+    "special meal": "meal vegetarian vegan kosher halal gluten allergy order menu",
+    "oversized baggage": "oversized sport equipment bicycle golf ski surfboard instrument declare",
+    "unaccompanied minor": "unaccompanied minor escort guardian age form pickup service",
+    "travel insurance": "insurance coverage claim medical trip interruption delay premium",
+    "boarding": "boarding gate group priority pass document identification close time",
+}
+FILLER = "passenger ticket booking airport flight customer service contact policy rule apply allowed".split()
+
+
+def topic_of(chunk: dict) -> str:
+    """The airline and policy type a chunk was generated for; used to judge whether a search hit is relevant."""
+    return topic_of_text(chunk["policy_text"])
+
+
+def topic_of_text(text: str) -> str:
+    return text.split(" policy:", 1)[0]
+
+
+def generate_corpus(n_chunks: int, dim: int = 1536, seed: int = 0, embedder: FakeEmbedder = None) -> List[dict]:
+    """
+    `n_chunks` policy chunks spread over airline x policy type topics. Each chunk text mixes the topic's
+    vocabulary with generic filler, and its embedding comes from the fake embedder so queries built from the
+    same vocabulary land near it.
+    """
+    rng = np.random.default_rng(seed)
+    embedder = embedder or FakeEmbedder(dim)
+    policies = list(POLICY_TERMS)
+    chunks = []
+    for i in range(n_chunks):
+        airline = AIRLINES[i % len(AIRLINES)]
+        policy = policies[(i // len(AIRLINES)) % len(policies)]
+        topic_terms = POLICY_TERMS[policy].split()
+        words = list(rng.choice(topic_terms, 12)) + list(rng.choice(FILLER, 8))
+        rng.shuffle(words)
+        text = f"{airline} {policy} policy: {' '.join(words)}. Section {i}."
+        chunks.append({"id": str(uuid.UUID(int=i)), "policy_text": text,
+                       "policy_text_embedding": embedder.embed(text).round(6).tolist()})
+    return chunks
+
+
+def write_corpus(chunks: List[dict], path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(chunks, file)
@@ -0,0 +1,59 @@
+#Deterministic stand-in for the Azure OpenAI embedding deployment.
+import hashlib
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.utils.lexical_index import tokenize
+
+
+class FakeEmbedder:
+    """
+    Bag-of-words embedding: every term maps to a fixed pseudo-random unit vector (seeded by its hash) and a
+    text embeds to the normalized sum of its terms. Similar texts get similar vectors, the same text always
+    gets the same vector, and no network is involved.
+
+    Args:
+        dim (int): Embedding dimension.
+        latency_ms (float): Simulated API latency added to every `create` call.
+    """
+
+    def __init__(self, dim: int = 1536, latency_ms: float = 0.0):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.calls = 0
+        self._terms: Dict[str, np.ndarray] = {}
+        self._primed: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def term_vector(self, term: str) -> np.ndarray:
+        vector = self._terms.get(term)
+        if vector is None:
+            seed = int(hashlib.sha1(term.encode()).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            self._terms[term] = vector
+        return vector
+
+    def embed(self, text: str) -> np.ndarray:
+        terms = tokenize(text)
+        if not terms:
+            return np.zeros(self.dim, dtype=np.float32)
+        vector = np.sum([self.term_vector(term) for term in terms], axis=0)
+        return vector / np.linalg.norm(vector)
+
+    def prime(self, texts: List[str]) -> None:
+        """Compute the embeddings of a workload up front so `create` only costs the simulated latency."""
+        for text in texts:
+            self._primed[text] = self.embed(text).tolist()
+
+    def create(self, text: str, model: str = None) -> List[float]:
+        """Drop-in for `embeddings.create(...).data[0].embedding`: counted, delayed and returned as a list."""
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        embedding = self._primed.get(text)
+        return embedding if embedding is not None else self.embed(text).tolist()
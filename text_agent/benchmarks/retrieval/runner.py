@@ -0,0 +1,241 @@
+#Retrieval benchmark runner: load time, latency percentiles, throughput, peak memory and relevance per knowledge base backend.
+#Run from the text_agent folder: python -m benchmarks.retrieval.runner --chunks 1000 10000 --out retrieval.json
+#Compare against a previous run with: python -m benchmarks.retrieval.runner --baseline retrieval.json
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.retrieval.corpus import generate_corpus, topic_of_text, write_corpus
+from benchmarks.retrieval.embedder import FakeEmbedder
+from benchmarks.retrieval.workload import build_workload
+
+VOICE_BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "voice_agent", "app", "backend"))
+
+#Every backend runs in a fresh process with this environment plus its own settings
+BASE_ENV = {
+    "AZURE_OPENAI_API_KEY": "benchmark",
+    "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:9",
+    "AZURE_OPENAI_API_VERSION": "2024-04-01-preview",
+    "AZURE_OPENAI_EMB_DEPLOYMENT": "benchmark-embedding",
+    "EMBEDDING_CACHE_SIZE": "0",
+    "EMBEDDING_CACHE_FILE": "",
+    "EMBEDDING_BATCHING": "false",
+    "POLICY_INDEX_BACKEND": "exact",
+    "POLICY_INDEX_PRECISION": "float32",
+    "POLICY_HYBRID_WEIGHT": "0",
+    "POLICY_LEXICAL_FAST_PATH": "0",
+}
+#store: read the converted memory-mapped store instead of parsing the JSON; ann: faiss index built before the run
+BACKENDS = {
+    "json": {"store": False, "env": {}},
+    "exact": {"store": True, "env": {}},
+    "float16": {"store": True, "env": {"POLICY_INDEX_PRECISION": "float16"}},
+    "int8": {"store": True, "env": {"POLICY_INDEX_PRECISION": "int8"}},
+    "hybrid": {"store": True, "env": {"POLICY_HYBRID_WEIGHT": "0.5", "POLICY_LEXICAL_FAST_PATH": "1.0"}},
+    "hnsw": {"store": True, "ann": "hnsw", "env": {"POLICY_INDEX_BACKEND": "hnsw"}},
+    "ivf": {"store": True, "ann": "ivf", "env": {"POLICY_INDEX_BACKEND": "ivf"}},
+    "voice": {"store": False, "voice": True, "env": {}},
+}
+#Metrics compared against --baseline, and whether larger is worse
+REGRESSION_METRICS = {"p50_ms": True, "p95_ms": True, "p99_ms": True, "load_seconds": True, "peak_rss_mb": True,
+                      "throughput_qps": False, "hit_rate": False}
+
+
+def peak_rss_mb():
+    """High-water resident memory of this process. VmHWM starts over at exec, ru_maxrss would include the parent's peak."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def open_text_search(corpus_path, embedder, topk):
+    """Tool.search_knowledge_base of the text agent, with the embedding call answered by the fake embedder."""
+    from src.agents.tools.tools import Tool
+    from src.utils.hybrid_search import get_hybrid_search
+    os.environ["EMB_MAP_FILE_PATH"] = corpus_path
+    tool = Tool()
+    tool._create_embedding = embedder.create
+    get_hybrid_search(tool.policy_index)
+    return lambda question: tool.search_knowledge_base(question, topk=topk)
+
+
+def open_voice_search(corpus_path, embedder, topk, workdir):
+    """Search_Client.find_article of the voice agent, with its embedding call answered by the fake embedder."""
+    os.environ["SQLITE_DB_PATH"] = os.path.join(workdir, "voice_flight.db")
+    sys.path.insert(0, VOICE_BACKEND_DIR)
+    import flight_tools
+    flight_tools.create_embedding = lambda text, model=None: embedder.create(text)
+    client = flight_tools.Search_Client(corpus_path)
+    return lambda question: client.find_article(question, topk=topk)
+
+
+def run_backend(name, corpus_path, queries, args, connection):
+    """Child process body: open one backend, replay the workload and send the measurements back."""
+    try:
+        os.environ.update(BASE_ENV)
+        os.environ.update(BACKENDS[name]["env"])
+        embedder = FakeEmbedder(args.dim, args.embed_latency_ms)
+        embedder.prime([question for question, _ in queries])
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if BACKENDS[name].get("voice"):
+                search = open_voice_search(corpus_path, embedder, args.topk, os.path.dirname(corpus_path))
+            else:
+                search = open_text_search(corpus_path, embedder, args.topk)
+        load_seconds = time.perf_counter() - start
+
+        def one(query):
+            question, topic = query
+            query_start = time.perf_counter()
+            result = search(question)
+            elapsed = time.perf_counter() - query_start
+            lines = result.split("\n")
+            return elapsed, len(lines) > 1 and topic_of_text(lines[1]) == topic
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for query in queries[:args.warmup]:
+                one(query)
+            embedder.calls = 0
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                measured = list(pool.map(one, queries[args.warmup:]))
+            wall = time.perf_counter() - start
+        latencies = np.array([elapsed for elapsed, _ in measured]) * 1000
+        connection.send({
+            "load_seconds": round(load_seconds, 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+            "throughput_qps": round(len(measured) / wall, 2),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "startup_rss_mb": round(rss_before, 1),
+            "embedding_calls": embedder.calls,
+            "hit_rate": round(float(np.mean([hit for _, hit in measured])), 4),
+        })
+    except Exception as e:
+        connection.send({"skipped": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def prepare_backend(name, workdir, chunks_json):
+    """Lay out the corpus the way the backend expects it and return (policy path, offline build seconds)."""
+    spec = BACKENDS[name]
+    folder = os.path.join(workdir, "store" if spec["store"] else "json")
+    path = os.path.join(folder, "policy.json")
+    if not os.path.exists(path):
+        os.makedirs(folder, exist_ok=True)
+        os.link(chunks_json, path)
+    start = time.perf_counter()
+    if spec["store"]:
+        from src.utils import policy_store
+        prefix = policy_store.store_prefix(path)
+        if not policy_store.has_store(prefix):
+            policy_store.convert(path)
+    if spec.get("ann"):
+        from src.utils import ann_index
+        ann_index.build(path, spec["ann"])
+    return path, time.perf_counter() - start
+
+
+def run(args):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for n_chunks in args.chunks:
+        embedder = FakeEmbedder(args.dim)
+        chunks = generate_corpus(n_chunks, args.dim, seed=args.seed, embedder=embedder)
+        queries = build_workload(chunks, args.queries + args.warmup, seed=args.seed + 1)
+        with tempfile.TemporaryDirectory() as workdir:
+            chunks_json = os.path.join(workdir, "corpus.json")
+            write_corpus(chunks, chunks_json)
+            del chunks
+            for name in args.backends:
+                entry = {"backend": name, "chunks": n_chunks, "dim": args.dim}
+                try:
+                    path, build_seconds = prepare_backend(name, workdir, chunks_json)
+                    entry["build_seconds"] = round(build_seconds, 4)
+                except Exception as e:
+                    entry["skipped"] = f"{type(e).__name__}: {e}"
+                    results.append(entry)
+                    print(json.dumps(entry), file=sys.stderr)
+                    continue
+                receiver, sender = context.Pipe(duplex=False)
+                child = context.Process(target=run_backend, args=(name, path, queries, args, sender))
+                child.start()
+                sender.close()
+                entry.update(receiver.recv())
+                child.join()
+                results.append(entry)
+                print(json.dumps(entry), file=sys.stderr)
+    return results
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def regressions(report, baseline, tolerance):
+    """Metrics that got worse than the baseline run by more than `tolerance` (relative), for matching backend and size."""
+    previous = {(entry["backend"], entry["chunks"], entry["dim"]): entry for entry in baseline["results"]}
+    found = []
+    for entry in report["results"]:
+        before = previous.get((entry["backend"], entry["chunks"], entry["dim"]))
+        if before is None or "skipped" in entry or "skipped" in before:
+            continue
+        for metric, larger_is_worse in REGRESSION_METRICS.items():
+            old, new = before.get(metric), entry.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old if larger_is_worse else (old - new) / old
+            if change > tolerance:
+                found.append({"backend": entry["backend"], "chunks": entry["chunks"], "metric": metric,
+                              "baseline": old, "current": new, "change": round(change, 3)})
+    return found
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the knowledge base search backends and report JSON.")
+    arg_parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000])
+    arg_parser.add_argument("--dim", type=int, default=1536)
+    arg_parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    arg_parser.add_argument("--queries", type=int, default=500)
+    arg_parser.add_argument("--warmup", type=int, default=20)
+    arg_parser.add_argument("--threads", type=int, default=1, help="concurrent callers for the throughput run")
+    arg_parser.add_argument("--topk", type=int, default=3)
+    arg_parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="simulated embedding API latency, 0 measures retrieval alone")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--out", help="write the JSON report to this file instead of stdout")
+    arg_parser.add_argument("--baseline", help="previous JSON report to compare against; exits with status 1 on regressions")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="relative change tolerated before a metric counts as a regression")
+    args = arg_parser.parse_args()
+
+    report = {"config": vars(args), "environment": environment(), "results": run(args)}
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["regressions"] = regressions(report, json.load(file), args.tolerance)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+    if report.get("regressions"):
+        sys.exit(1)
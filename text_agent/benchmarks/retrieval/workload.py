@@ -0,0 +1,26 @@
+#Query workload for the retrieval benchmark: short keyword questions and longer natural questions about corpus topics.
+from typing import List, Tuple
+
+import numpy as np
+
+from benchmarks.retrieval.corpus import POLICY_TERMS, topic_of
+
+TEMPLATES = ["{airline} {policy} policy",
+             "what is the {policy} policy of {airline} for {term}",
+             "can I get {term} and {other} on {airline}",
+             "{term} {other} {airline}"]
+
+
+def build_workload(chunks: List[dict], n_queries: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """(question, topic) pairs over the topics present in `chunks`; a result is relevant when its chunk has that topic."""
+    rng = np.random.default_rng(seed)
+    topics = sorted({topic_of(chunk) for chunk in chunks})
+    queries = []
+    for _ in range(n_queries):
+        topic = topics[rng.integers(len(topics))]
+        policy = next(name for name in POLICY_TERMS if topic.endswith(" " + name))
+        airline = topic[:-len(policy) - 1]
+        term, other = rng.choice(POLICY_TERMS[policy].split(), 2, replace=False)
+        template = TEMPLATES[rng.integers(len(TEMPLATES))]
+        queries.append((template.format(airline=airline, policy=policy, term=term, other=other), topic))
+    return queries
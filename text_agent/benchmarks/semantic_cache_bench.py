@@ -0,0 +1,69 @@
+#Which flight_agent turns the semantic cache embeds, serves and admits: opening questions, repeats from other sessions and follow-ups,
+#and that the customer's name in an answer is not stored.
+#Sessions go through Agent_Runner.run and arun, so every one starts on generic_agent and reaches flight_agent with get_help.
+#Run from the text_agent folder: python -m benchmarks.semantic_cache_bench
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+
+QUESTION = "What is the checked baggage allowance on international flights?"
+FOLLOW_UP = "Is it the same for infants travelling on my booking?"
+
+
+if __name__ == "__main__":
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+    os.environ.update({"SEMANTIC_CACHE_ENABLED": "true", "TOOL_CACHE_ENABLED": "false"})
+
+    from src.agents.agent_manager import Agent_Runner
+    from src.utils.session_state import SessionState
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state = SessionState()
+        runner = Agent_Runner(session_state)
+    agent = runner.get_agent("flight_agent")
+    cache = agent.semantic_cache
+    embedded = []
+    embed = cache.embed
+    cache.embed = lambda question: embedded.append(question) or embed(question)
+    #The model looks the policy up in the knowledge base, so every answer passes the tool admission rule
+    FakeChatHandler.tool_calls = [("search_airline_knowledgebase", {"search_query": "checked baggage allowance"})]
+
+    loop = asyncio.new_event_loop()
+
+    def turn(session, question, answer, use_async=False):
+        FakeChatHandler.answer = answer
+        before = dict(cache.stats(), embedded=len(embedded))
+        with contextlib.redirect_stdout(io.StringIO()):
+            if use_async:
+                response = loop.run_until_complete(runner.arun(question, session))
+            else:
+                response = runner.run(question, session)
+            agent_name = session_state.get(session)["active_agent"]
+        after = dict(cache.stats(), embedded=len(embedded))
+        change = {key: after[key] - before[key] for key in after}
+        outcome = "hit" if change["hits"] else "miss" if change["misses"] else "not used"
+        print(f"{session:<10} {'arun' if use_async else 'run':<5} {agent_name:<13} {question[:52]:<52} {outcome:>9} {change['embedded']:>9} {change['admitted']:>9}  {response}")
+        return outcome, change
+
+    print(f"{'session':<10} {'call':<5} {'agent':<13} {'question':<52} {'cache':>9} {'embedded':>9} {'admitted':>9}  answer")
+    name = runner.user_profile["name"].split()[0]
+    checks = {
+        "opening question handed to flight_agent admitted": turn("A", QUESTION, f"{name}, you can check two bags of 23 kg.")[1]["admitted"] == 1,
+        "customer's name not stored": not any(name in entry["answer"] for entry in cache._namespaces["flight_agent"].values()),
+        "same question in another session served": turn("B", QUESTION, "(model not called)", use_async=True)[0] == "hit",
+        "same question served through run": turn("D", QUESTION, "(model not called)")[0] == "hit",
+        "follow-up not embedded, looked up or admitted": turn("A", FOLLOW_UP, "Infants on your booking get one bag.")[1] == dict.fromkeys(("hits", "misses", "admitted", "rejected", "entries", "embedded"), 0),
+        "follow-up asked first elsewhere not embedded, looked up or admitted": turn("C", FOLLOW_UP, "Infants get one checked bag.", use_async=True)[1] == dict.fromkeys(("hits", "misses", "admitted", "rejected", "entries", "embedded"), 0),
+    }
+    for check, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {check}")
+    loop.close()
+    server.shutdown()
+    shutil.rmtree(workdir)
+    sys.exit(0 if all(checks.values()) else 1)
@@ -0,0 +1,100 @@
+#A mass flight delay: many sessions ask about the same flight and policy at once, with and without single-flight coalescing.
+#Run from the text_agent folder: python -m benchmarks.single_flight_bench --sessions 32 --rounds 3
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+
+
+def count_calls(agent, name, counts):
+    """Wrap the agent's `name` tool so every execution is counted; the signature is kept for the argument check."""
+    function = agent.functions_list[name]
+
+    @functools.wraps(function)
+    def counted(**kwargs):
+        counts[name] += 1
+        return function(**kwargs)
+
+    agent.functions_list[name] = counted
+
+
+async def spike(runner, session_state, sessions, question):
+    """`sessions` flight_agent sessions asking `question` at the same moment; returns the turn latencies in ms."""
+    async def turn(session_id):
+        session_state.set(session_id, {"active_agent": "flight_agent", "conversation": runner.get_agent("flight_agent").new_conversation()})
+        start = time.perf_counter()
+        await runner.arun(question, session_id)
+        return (time.perf_counter() - start) * 1000
+
+    return await asyncio.gather(*(turn(str(uuid.uuid4())) for _ in range(sessions)))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark single-flight coalescing of identical tool, embedding and routing requests.")
+    arg_parser.add_argument("--sessions", type=int, default=32, help="sessions asking at the same moment")
+    arg_parser.add_argument("--rounds", type=int, default=3, help="spikes per mode, each about a different question")
+    arg_parser.add_argument("--latency-ms", type=float, default=200.0, help="fake model latency")
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+    #Every session is a different customer in production, so the per-customer tool cache does not help across sessions;
+    #speculative routing by the LLM adds one ranking call per turn
+    os.environ.update({"TOOL_CACHE_ENABLED": "false", "SPECULATIVE_ROUTING": "true", "INTENT_ROUTER_MODEL": ""})
+    with sqlite3.connect(os.environ["FLIGHT_DB_FILE"]) as db:
+        flight_num, from_ = db.execute("SELECT flight_num, departure_airport FROM flights WHERE status = 'open'").fetchone()
+
+    from src.agents.agent_manager import Agent_Runner
+    from agent_common import embedding_cache, openai_clients
+    from src.utils.session_state import SessionState
+    from agent_common.single_flight import get_single_flight
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state = SessionState()
+        runner = Agent_Runner(session_state)
+    agent = runner.get_agent("flight_agent")
+    counts = {"check_flight_status": 0, "search_airline_knowledgebase": 0}
+    for name in counts:
+        count_calls(agent, name, counts)
+
+    print(f"{args.sessions} sessions asking the same question at once, {args.rounds} rounds, fake model latency {args.latency_ms:.0f} ms; "
+          f"the model asks for check_flight_status and search_airline_knowledgebase")
+    print(f"{'single-flight':<14} {'status DB':>9} {'policy srch':>11} {'openai reqs':>11} {'collapsed':>9} {'p50 ms':>8} {'p95 ms':>8}")
+
+    async def main():
+        #One event loop for both modes: the async clients keep their connection pools on it.
+        for mode in ("off", "on"):
+            os.environ["SINGLE_FLIGHT_ENABLED"] = "true" if mode == "on" else "false"
+            agent.tool_reads = get_single_flight("tool_reads")
+            runner.routing_calls = get_single_flight("routing")
+            embedding_cache._embedding_cache = None #every round asks a new question anyway, this only keeps the modes apart
+            for name in counts:
+                counts[name] = 0
+            groups = [get_single_flight(name) for name in ("tool_reads", "embeddings", "routing")] if mode == "on" else []
+            collapsed_before = sum(group.collapsed.value for group in groups)
+            requests_before = openai_clients.connection_stats()["requests"]
+            latencies = []
+            for i in range(args.rounds):
+                FakeChatHandler.tool_calls = [("check_flight_status", {"flight_num": flight_num, "from_": from_}),
+                                              ("search_airline_knowledgebase", {"search_query": f"compensation for a delayed flight ({mode} {i})"})]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    latencies += await spike(runner, session_state, args.sessions, f"my flight {flight_num} is delayed, what are my options? ({mode} {i})")
+            collapsed = sum(group.collapsed.value for group in groups) - collapsed_before
+            print(f"{mode:<14} {counts['check_flight_status']:>9} {counts['search_airline_knowledgebase']:>11} "
+                  f"{openai_clients.connection_stats()['requests'] - requests_before:>11} {collapsed:>9} "
+                  f"{np.percentile(latencies, 50):>8.0f} {np.percentile(latencies, 95):>8.0f}")
+
+    asyncio.run(main())
+    server.shutdown()
+    shutil.rmtree(workdir)
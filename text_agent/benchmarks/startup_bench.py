@@ -0,0 +1,77 @@
+#Cold start of the agent service: Agent_Runner construction and first turn in fresh processes, for each startup mode.
+#Run from the text_agent folder: python -m benchmarks.startup_bench --runs 5
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+
+#(label, AGENT_PROFILE_BUNDLE, AGENT_STARTUP); None keeps the default bundle next to the profiles
+MODES = [("yaml, eager", "", "eager"), ("bundle, eager", None, "eager"), ("bundle, lazy", None, "lazy")]
+
+
+def child(port):
+    """Measured in the child process: imports, Agent_Runner construction and the first flight_agent turn; prints JSON."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        workdir = fake_environment(port)
+    from src.agents.agent_manager import Agent_Runner
+    from src.utils.session_state import SessionState
+    imported = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state = SessionState()
+        runner = Agent_Runner(session_state)
+    constructed = time.perf_counter()
+    session_id = str(uuid.uuid4())
+    with contextlib.redirect_stdout(io.StringIO()):
+        session_state.set(session_id, {"active_agent": "flight_agent", "conversation": []})
+        runner.run("what flights do I have?", session_id)
+    first_turn = time.perf_counter()
+    shutil.rmtree(workdir)
+    print(json.dumps({"import": imported - start, "runner": constructed - imported, "first_turn": first_turn - constructed,
+                      "phases": {phase: seconds["total"] if isinstance(seconds, dict) else seconds
+                                 for phase, seconds in runner.startup_report.items()}}))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the cold start of the agent service per startup mode.")
+    arg_parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    arg_parser.add_argument("--latency-ms", type=float, default=0.0, help="fake model latency of the first turn")
+    arg_parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child:
+        child(args.child)
+        sys.exit(0)
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    server = start_fake_server()
+    print(f"median of {args.runs} fresh processes per mode, fake model latency {args.latency_ms:.0f} ms")
+    print(f"{'mode':<15} {'import ms':>9} {'runner ms':>9} {'1st turn ms':>11} {'ready ms':>9}  runner phases (ms)")
+    for label, bundle, startup in MODES:
+        env = dict(os.environ, AGENT_STARTUP=startup)
+        if bundle is not None:
+            env["AGENT_PROFILE_BUNDLE"] = bundle
+        else:
+            env.pop("AGENT_PROFILE_BUNDLE", None)
+            #Compile the bundle once so the measured runs read it
+            subprocess.run([sys.executable, "-m", "src.utils.profile_bundle"], env=env, check=True, capture_output=True)
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-m", "benchmarks.startup_bench", "--child", str(server.server_port)],
+                                    env=env, check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        median = {key: np.median([run[key] for run in runs]) * 1000 for key in ("import", "runner", "first_turn")}
+        phases = {phase: np.median([run["phases"].get(phase, 0.0) for run in runs]) * 1000 for phase in runs[0]["phases"] if phase != "total"}
+        print(f"{label:<15} {median['import']:>9.0f} {median['runner']:>9.1f} {median['first_turn']:>11.1f} "
+              f"{median['import'] + median['runner'] + median['first_turn']:>9.0f}  "
+              + ", ".join(f"{phase} {seconds:.1f}" for phase, seconds in phases.items()))
+    server.shutdown()
@@ -0,0 +1,101 @@
+#Time to first token and full turn time of /chat/ versus /chat/stream, with the API served by uvicorn against a local fake chat server.
+#Run from the text_agent folder: python -m benchmarks.streaming_bench --turns 20 --concurrency 1 8
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+from benchmarks.async_agent_bench import FakeChatHandler, fake_environment, start_fake_server
+
+ANSWER = ("Your flight AB123 from Airport A to Airport B leaves on time at 15:30 from gate G5. Seat 12A in economy is "
+          "confirmed, boarding starts forty minutes before departure and you can check one bag at no extra cost.")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def one_turn(client, session_id, stream):
+    """(seconds to the first answer token, seconds to the full answer) of one turn."""
+    start = time.perf_counter()
+    payload = {"message": "what flights do I have?", "session_id": session_id}
+    if not stream:
+        response = await client.post("/chat/", json=payload)
+        response.raise_for_status()
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed
+    ttft = None
+    async with client.stream("POST", "/chat/stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event["type"] == "token" and ttft is None:
+                ttft = time.perf_counter() - start
+            if event["type"] == "error":
+                raise RuntimeError(event["message"])
+    return ttft, time.perf_counter() - start
+
+
+async def run(base_url, session_state, init_history, concurrency, turns, stream):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def session():
+            session_id = str(uuid.uuid4())
+            session_state.set(session_id, {"active_agent": "flight_agent", "conversation": list(init_history)})
+            return [await one_turn(client, session_id, stream) for _ in range(turns)]
+
+        results = await asyncio.gather(*(session() for _ in range(concurrency)))
+    timings = np.array([timing for result in results for timing in result]) * 1000
+    return timings[:, 0], timings[:, 1]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark time to first token of the streaming chat endpoint.")
+    arg_parser.add_argument("--turns", type=int, default=10, help="turns per session")
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    arg_parser.add_argument("--latency-ms", type=float, default=300.0, help="fake model latency to the first token of a completion")
+    arg_parser.add_argument("--token-latency-ms", type=float, default=30.0, help="fake generation time per answer word")
+    args = arg_parser.parse_args()
+
+    FakeChatHandler.latency = args.latency_ms / 1000
+    FakeChatHandler.token_latency = args.token_latency_ms / 1000
+    FakeChatHandler.answer = ANSWER
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+
+    import uvicorn
+    with contextlib.redirect_stdout(io.StringIO()):
+        from src.api import agent_service
+    port = free_port()
+    api = uvicorn.Server(uvicorn.Config(agent_service.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=api.run, daemon=True).start()
+    while not api.started:
+        time.sleep(0.05)
+
+    init_history = agent_service.agent_runner.get_agent("flight_agent").init_history
+    print(f"fake model latency {args.latency_ms:.0f} ms to the first token, {args.token_latency_ms:.0f} ms per word, "
+          f"{len(ANSWER.split())} word answer after one tool round, {args.turns} turns per session")
+    print(f"{'sessions':>8} {'endpoint':<13} {'ttft p50':>9} {'ttft p95':>9} {'turn p50':>9} {'turn p95':>9}")
+    for concurrency in args.concurrency:
+        for endpoint, stream in (("/chat/", False), ("/chat/stream", True)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                ttft, turn = asyncio.run(run(f"http://127.0.0.1:{port}", agent_service.session_state, init_history,
+                                             concurrency, args.turns, stream))
+            print(f"{concurrency:>8} {endpoint:<13} {np.percentile(ttft, 50):>9.0f} {np.percentile(ttft, 95):>9.0f} "
+                  f"{np.percentile(turn, 50):>9.0f} {np.percentile(turn, 95):>9.0f}")
+    print("server side:", json.dumps({name: {key: round(value, 3) for key, value in summary.items()}
+                                       for name, summary in agent_service.metrics.snapshot().items() if name.startswith("chat_")}))
+    api.should_exit = True
+    server.shutdown()
+    shutil.rmtree(workdir)
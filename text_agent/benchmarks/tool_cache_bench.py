@@ -0,0 +1,102 @@
+#Tool time and DB calls of scripted flight sessions with and without the tool result cache, checking that both give the same answers.
+#Run from the text_agent folder: python -m benchmarks.tool_cache_bench --sessions 50
+import argparse
+import ast
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from benchmarks.async_agent_bench import DATA_DIR, fake_environment, start_fake_server
+
+
+def tool_call(name, **arguments):
+    return ChatCompletionMessageToolCall(id=f"call_{name}", type="function", function=Function(name=name, arguments=json.dumps(arguments)))
+
+
+def session(agent, customer_id, new_flight):
+    """
+    One customer conversation, as the tool calls the model would make turn after turn: look up the booking,
+    ask about its status a few times, change the flight, then look at the new booking. Returns every tool response.
+    """
+    responses = []
+
+    def turn(*tool_calls):
+        step_responses = []
+        for step in agent._plan_tool_calls(list(tool_calls)):
+            step_responses += [response for response, _ in agent._execute_step(step)]
+        responses.extend(step_responses)
+        return step_responses
+
+    flight = ast.literal_eval(turn(tool_call("load_user_flight_info", user_id=customer_id))[0])[0]
+    turn(tool_call("check_flight_status", flight_num=flight["flight_num"], from_=flight["departure_airport"]),
+         tool_call("load_user_flight_info", user_id=customer_id))
+    turn(tool_call("check_flight_status", flight_num=flight["flight_num"], from_=flight["departure_airport"]))
+    turn(tool_call("load_user_flight_info", user_id=customer_id))
+    turn(tool_call("check_change_booking", current_ticket_number=flight["ticket_num"], current_flight_number=flight["flight_num"],
+                   new_flight_number=new_flight, from_=flight["departure_airport"]))
+    turn(tool_call("confirm_flight_change", current_ticket_number=flight["ticket_num"], new_flight_number=new_flight,
+                   new_departure_time=flight["departure_time"], new_arrival_time=flight["arrival_time"]))
+    turn(tool_call("load_user_flight_info", user_id=customer_id))
+    turn(tool_call("check_flight_status", flight_num=new_flight, from_=flight["departure_airport"]))
+    return responses
+
+
+def measure(agent, sessions, customer_id):
+    """Replays `sessions` sessions on a fresh copy of the sample flight DB; returns the responses and the seconds spent in tools."""
+    shutil.copy(os.path.join(DATA_DIR, "flight_db.db"), os.environ["FLIGHT_DB_FILE"])
+    random.seed(0) #confirm_flight_change draws the new ticket number
+    timed = []
+    original = agent._call_tool
+
+    def call_tool(call):
+        response, seconds = original(call)
+        timed.append(seconds)
+        return response, seconds
+
+    agent._call_tool = call_tool
+    responses = []
+    try:
+        for i in range(sessions):
+            with tool_cache_scope(f"session-{i}"):
+                responses += session(agent, customer_id, "AA479" if i % 2 == 0 else "AA490")
+    finally:
+        del agent._call_tool
+    return responses, sum(timed), len(timed)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the tool result cache on scripted flight sessions.")
+    arg_parser.add_argument("--sessions", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    server = start_fake_server()
+    workdir = fake_environment(server.server_port)
+
+    from src.agents.agent_manager import Agent_Runner
+    from src.utils.session_state import SessionState
+    from src.utils.tool_cache import ToolResultCache, tool_cache_scope
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        runner = Agent_Runner(SessionState())
+    agent = runner.get_agent("flight_agent")
+    print(f"{args.sessions} sessions of 8 tool turns, one flight change each, against the sample flight DB (SQLite)")
+    print(f"{'cache':<6} {'tool calls':>10} {'tool ms':>9} {'hit rate':>9} {'ms saved':>9} {'evicted':>8}")
+    results = {}
+    for mode in ("off", "on"):
+        agent.tool_cache = ToolResultCache() if mode == "on" else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            responses, tool_seconds, calls = measure(agent, args.sessions, runner.user_profile["customer_id"])
+        results[mode] = responses
+        stats = agent.tool_cache.stats() if agent.tool_cache is not None else {"hit_rate": 0.0, "seconds_saved": 0.0, "invalidations": 0}
+        print(f"{mode:<6} {calls:>10} {tool_seconds * 1000:>9.1f} {stats['hit_rate']:>9.1%} {stats['seconds_saved'] * 1000:>9.1f} "
+              f"{stats['invalidations']:>8}")
+    mismatches = sum(a != b for a, b in zip(results["off"], results["on"]))
+    print(f"responses identical with and without the cache: {mismatches == 0} ({mismatches} of {len(results['off'])} differ)")
+    server.shutdown()
+    shutil.rmtree(workdir)
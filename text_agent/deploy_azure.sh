@@ -18,10 +18,10 @@ az acr create --resource-group $RESOURCE_GROUP --name $CONTAINER_REGISTRY --sku
 az acr update -n $CONTAINER_REGISTRY --admin-enabled true
 
 # Build the Python service image
-az acr build --registry $CONTAINER_REGISTRY --image $AGENT_IMAGE --file ./Dockerfile.agent_service ./
+az acr build --registry $CONTAINER_REGISTRY --image $AGENT_IMAGE --file ./Dockerfile.agent_service ..
 
 # Build the Streamlit app image
-az acr build --registry $CONTAINER_REGISTRY --image $STREAMLIT_IMAGE --file ./Dockerfile.streamlit_app ./
+az acr build --registry $CONTAINER_REGISTRY --image $STREAMLIT_IMAGE --file ./Dockerfile.streamlit_app ..
 
 # Create a container environment
 az containerapp env create --name $CONTAINER_ENVIRONMENT --resource-group $RESOURCE_GROUP --location $LOCATION
@@ -1,82 +1,377 @@
+import asyncio
+import json
 import os  
-import random  
-from openai import AzureOpenAI  
+import re
+import threading
+import time
 from .smart_agent import Smart_Agent  
+from src.utils.tool_executor import call_tool, get_tool_executor
+from src.utils.intent_router import load_intent_router
+from src.utils.profile_bundle import load_profiles
+from agent_common.openai_clients import get_openai_client, get_async_openai_client
+from agent_common.llm_scheduler import get_llm_scheduler
+from agent_common.single_flight import get_single_flight
+from src.utils.tool_cache import tool_cache_scope
+from agent_common import metrics
+
+intents_routed_locally = metrics.counter("intents_routed_locally", "Intents classified by the local intent router")
+intents_routed_by_llm = metrics.counter("intents_routed_by_llm", "Intents classified by the LLM")
+handoff_turn = metrics.histogram("handoff_turn_seconds", "Turns in which the active agent asked for help, from the question to the final answer")
+handoff_routing = metrics.histogram("handoff_routing_seconds", "Time between get_help and the new agent starting its turn")
+intent_classification = metrics.histogram("intent_classification_seconds", "Time the local intent router takes to rank the agents for a request", buckets=metrics.FAST_BUCKETS)
+agent_ranking = metrics.histogram("agent_ranking_seconds", "Time to rank the agents that could take over a request, by the local router or the LLM", buckets=metrics.FAST_BUCKETS + (10.0,))
+speculations_cancelled = metrics.counter("speculations_cancelled", "Speculative rankings whose LLM call was skipped because the turn needed no help")
+speculations_discarded = metrics.counter("speculations_discarded", "Speculative rankings not used because the help request ranks another agent first")
+handoffs_per_turn = metrics.histogram("handoffs_per_turn", "Agent changes within one turn", buckets=(0, 1, 2))
+agent_turn = metrics.histogram("agent_turn_seconds", "Agent_Runner turns, from loading the session to saving it")
   
+class TurnContext:
+    """
+    State of one turn of one session: the agent answering, its conversation and the agents it was handed over to.
+    Created for each request and never shared, so one Agent_Runner can serve any number of sessions concurrently;
+    the runner itself only holds read-only agents and clients.
+    The conversation is a copy of the stored one (copy on write): the stored list is replaced, never modified,
+    when the turn saves the session.
+    """
+
+    def __init__(self, session_id, user_input, active_agent, conversation):
+        self.session_id = session_id
+        self.user_input = user_input
+        self.active_agent = active_agent
+        self.conversation = list(conversation)
+        self.handoffs = []
+        self.started = time.perf_counter()
+
+    def hand_over(self, agent):
+        """Give the conversation to `agent`, which continues it after its own persona and greeting."""
+        self.handoffs.append(agent.name)
+        self.active_agent = agent
+        self.conversation = self.conversation + agent.new_conversation()
+
+    def session_state(self):
+        return {"active_agent": self.active_agent.name, "conversation": self.conversation}
+
+
 class Agent_Runner:  
     def __init__(self, session_state): 
-        base_path = "src/agents/agent_profiles"  
-        self.agent_names = [f[:-13] for f in os.listdir(base_path) if f.endswith("_profile.yaml") and "common" not in f]  
+        start = time.perf_counter()
+        self.startup_report = {}
+        self.base_path = "src/agents/agent_profiles"  
+        self.profiles = load_profiles(self.base_path)
+        self.startup_report["profiles"] = time.perf_counter() - start
+        self.agent_names = list(self.profiles["agents"])
         print("agents:", self.agent_names)  
-        self.agents = [Smart_Agent(name, base_path) for name in self.agent_names]  
-        self.default_agent = next(agent for agent in self.agents if agent.default_agent)
+        phase = time.perf_counter()
+        with open(os.environ.get("USER_PROFILE_FILE")) as f:
+            self.user_profile = json.load(f)
+        self.startup_report["user_profile"] = time.perf_counter() - phase
+        #Agents are built on first use with AGENT_STARTUP=lazy, all of them now otherwise
+        self._agents = {}
+        self._agents_lock = threading.Lock()
+        self.lazy_agents = os.getenv("AGENT_STARTUP", "eager").lower() == "lazy"
+        self.default_agent_name = self.profiles["default_agent"]
         self.session_state = session_state  
         self.evaluator_engine = os.environ.get("AZURE_OPENAI_EVALUATOR_DEPLOYMENT")  
-        self.client = AzureOpenAI(  
-            api_key=os.environ.get("AZURE_OPENAI_API_KEY"),  
-            api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),  
-            azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT")  
-        )  
-        self.active_agent = None  
-        self.agent_descriptions = "\n".join([f"{agent.name}: {agent.domain_description}" for agent in self.agents])  
+        phase = time.perf_counter()
+        self.client = get_openai_client()
+        self.llm_scheduler = get_llm_scheduler()
+        #Sessions asking the same routing question at the same time share one LLM call
+        self.routing_calls = get_single_flight("routing")
+        self.startup_report["openai_client"] = time.perf_counter() - phase
+        self.agent_descriptions = "\n".join([f"{name}: {profile['domain_description']}" for name, profile in self.profiles["agents"].items()])  
+        phase = time.perf_counter()
+        self.intent_router = load_intent_router(self.agent_names)
+        self.startup_report["intent_router"] = time.perf_counter() - phase
+        if not self.lazy_agents:
+            for name in self.agent_names:
+                self.get_agent(name)
+        self.startup_report["total"] = time.perf_counter() - start
+        self.print_startup_report()
+        self.intent_router_threshold = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.7"))
+        #Rank the other agents while the active agent answers, so a get_help handoff does not wait for routing
+        self.speculative_routing = os.getenv("SPECULATIVE_ROUTING", "false").lower() in ("1", "true", "yes")
 
   
-    def classify_intent(self, user_input):  
-        prompt = f"Given the request [{user_input}], pick a name from [{', '.join(self.agent_names)}]. Just output the name of the agent, no need to add any other text."  
-        messages = [{"role": "system", "content": "You are a helpful AI assistant to match requests with agents. Here are agents with the description of their responsibilities:\n\n" + self.agent_descriptions}, {"role": "user", "content": prompt}]  
-          
-        response = self.client.chat.completions.create(  
-            model=self.evaluator_engine,  
-            messages=messages,  
-            max_tokens=20  
-        )  
-          
-        response_message = response.choices[0].message.content.strip()  
-        print("classified as:", response_message)  
-        return response_message  
-  
-    def revaluate_agent_assignment(self, function_description):  
-        count = 0  
-        while True:  
-            count += 1  
-            if count > 2:  
-                next_agent = self.default_agent
-                print("main agent keep refusing,assigned to designated default agent", next_agent.name)  
-                break  
-            next_agent = self.classify_intent(function_description)  
-            if next_agent == self.active_agent.name:  
-                continue  
-            if next_agent in self.agent_names:  
-                break  
-        for agent in self.agents:  
-            if next_agent == agent.name:  
-                self.active_agent = agent  
-                print("agent changed to", agent.name)  
-                break    
+    @property
+    def async_client(self):
+        return get_async_openai_client()
+
+    def get_agent(self, agent_name):
+        """The agent named `agent_name`, built on first use."""
+        agent = self._agents.get(agent_name)
+        if agent is not None:
+            return agent
+        if agent_name not in self.profiles["agents"]:
+            raise KeyError(f"no agent named {agent_name}")
+        with self._agents_lock:
+            agent = self._agents.get(agent_name)
+            if agent is None:
+                agent = Smart_Agent(agent_name, self.base_path, self.profiles, self.user_profile)
+                self.startup_report[f"agent {agent_name}"] = agent.build_seconds
+                if self.lazy_agents:
+                    print(f"built {agent_name} on first use in {agent.build_seconds['total']:.3f}s")
+                self._agents[agent_name] = agent
+        return agent
+
+    @property
+    def agents(self):
+        """Every agent, building those not used yet."""
+        return [self.get_agent(name) for name in self.agent_names]
+
+    @property
+    def default_agent(self):
+        return self.get_agent(self.default_agent_name)
+
+    def print_startup_report(self):
+        """Time spent per startup phase; agents are listed with the part spent creating their tools."""
+        lines = []
+        for phase, seconds in self.startup_report.items():
+            if isinstance(seconds, dict):
+                lines.append(f"  {phase:<24} {seconds['total'] * 1000:>8.1f} ms (tools {seconds['tools'] * 1000:.1f} ms)")
+            else:
+                lines.append(f"  {phase:<24} {seconds * 1000:>8.1f} ms")
+        print(f"startup ({'lazy' if self.lazy_agents else 'eager'} agents):\n" + "\n".join(lines))
+
+    def ranking_messages(self, request, exclude=None):
+        names = [name for name in self.agent_names if name != exclude]
+        prompt = f"Given the request [{request}], rank these agents from most to least suitable: [{', '.join(names)}]. Just output the agent names separated by commas, no need to add any other text."
+        return [{"role": "system", "content": "You are a helpful AI assistant to match requests with agents. Here are agents with the description of their responsibilities:\n\n" + self.agent_descriptions}, {"role": "user", "content": prompt}]
+
+    def parse_ranking(self, text, exclude=None):
+        ranked = []
+        for name in re.findall(r"[A-Za-z_]+", text or ""):
+            if name in self.agent_names and name != exclude and name not in ranked:
+                ranked.append(name)
+        return ranked
+
+    def rank_locally(self, user_input, exclude=None):
+        """
+        Agents ranked by the local intent router, or None when the LLM should rank them: there is no router, its
+        most likely label is `exclude` (the active agent asked for help with a request the router gives to it) or
+        not a text agent, or it is not confident enough in the first agent once `exclude` is ruled out. The router
+        has no human_agent label, so these are the requests that may belong to the human agent.
+        """
+        if self.intent_router is None:
+            return None
+        best, ranked = self._route(user_input, exclude)
+        if best == exclude or best not in self.agent_names:
+            print(f"intent router's best match is {best}, asking the LLM")
+            return None
+        if not ranked or ranked[0][1] < self.intent_router_threshold:
+            print(f"intent router not confident ({ranked[0] if ranked else None}), asking the LLM")
+            return None
+        print(f"routed locally to {ranked[0][0]} ({ranked[0][1]:.2f})")
+        intents_routed_locally.inc()
+        return [agent_name for agent_name, _ in ranked]
+
+    def _route(self, request, exclude=None):
+        """The intent router's most likely label for `request` and the text agents other than `exclude` it ranks, with their renormalized probabilities."""
+        with intent_classification.time():
+            probabilities = self.intent_router.predict_proba(f"user: {request}")
+            best = self.intent_router.agents[int(probabilities.argmax())]
+            ranked = self.intent_router.rank_probabilities(probabilities, candidates=self.agent_names, exclude=exclude)
+        return best, ranked
+
+    def confirm_speculation(self, speculated, request, exclude=None):
+        """
+        `speculated`, the agents ranked from the customer's question, if the local router ranking the help request
+        puts the same agent first; None otherwise, so the help request is ranked like it is without speculation.
+        The speculation ranks what the customer asked, the handoff what the active agent needs help with: a
+        speculation that disagrees with the help request must not pick the agent.
+        """
+        if not speculated or self.intent_router is None:
+            return None
+        best, ranked = self._route(request, exclude)
+        if best != exclude and best in self.agent_names and ranked and ranked[0][0] == speculated[0]:
+            return speculated
+        print(f"speculative routing to {speculated[0]} discarded, the help request is for {best}")
+        speculations_discarded.inc()
+        return None
+
+    @metrics.timed(agent_ranking)
+    def rank_agents(self, request, exclude=None, priority="routing", cancelled=None):
+        """
+        Agents other than `exclude` for `request`, best first, from the local router or else one LLM call sent
+        with `priority` (see agent_common/llm_scheduler.py). Returns None without the LLM call once the
+        threading.Event `cancelled` is set.
+        """
+        ranked = self.rank_locally(request, exclude)
+        if ranked is None:
+            if cancelled is not None and cancelled.is_set():
+                speculations_cancelled.inc()
+                return None
+            intents_routed_by_llm.inc()
+            response = self._coalesce(("rank", request, exclude, priority), lambda: self.llm_scheduler.request(
+                self.client.chat.completions.create, priority=priority,
+                model=self.evaluator_engine,
+                messages=self.ranking_messages(request, exclude),
+                max_tokens=50
+            ))
+            ranked = self.parse_ranking(response.choices[0].message.content, exclude)
+            print("ranked as:", ranked)
+        return ranked
+
+    @metrics.timed(agent_ranking)
+    async def arank_agents(self, request, exclude=None, priority="routing"):
+        ranked = self.rank_locally(request, exclude)
+        if ranked is None:
+            intents_routed_by_llm.inc()
+            response = await self._acoalesce(("rank", request, exclude, priority), lambda: self.llm_scheduler.arequest(
+                self.async_client.chat.completions.create, priority=priority,
+                model=self.evaluator_engine,
+                messages=self.ranking_messages(request, exclude),
+                max_tokens=50
+            ))
+            ranked = self.parse_ranking(response.choices[0].message.content, exclude)
+            print("ranked as:", ranked)
+        return ranked
+
+    def _coalesce(self, key, call):
+        """`call()`, or the response of an identical routing call already in flight (keyed by `key`) when single-flight is on."""
+        return call() if self.routing_calls is None else self.routing_calls.do(key, call)
+
+    async def _acoalesce(self, key, call):
+        return await (call() if self.routing_calls is None else self.routing_calls.ado(key, call))
+
+    def speculate(self, user_input, active_agent_name, cancelled):
+        """
+        Rank the agents that could take over from the active agent before anyone asks for help, and build the
+        first one (its tools included) if AGENT_STARTUP=lazy has not built it yet.
+        The ranking is sent at "routing" priority, not "background": when the active agent asks for help, the turn
+        waits on it. A running future cannot be cancelled, so a turn that needs no help sets `cancelled` instead,
+        and the LLM call is skipped if it has not been sent yet.
+        """
+        ranked = self.rank_agents(user_input, exclude=active_agent_name, cancelled=cancelled)
+        if ranked and not cancelled.is_set():
+            self.get_agent(ranked[0])
+        return ranked
+
+    async def aspeculate(self, user_input, active_agent_name):
+        ranked = await self.arank_agents(user_input, exclude=active_agent_name)
+        if ranked:
+            await call_tool(self.get_agent, ranked[0])
+        return ranked
+
+    def revaluate_agent_assignment(self, function_description, active_agent, ranked=None):  
+        """Best ranked agent other than `active_agent`, ranking them in one call unless `ranked` is given; the default agent when none fits."""
+        if ranked is None:
+            ranked = self.rank_agents(function_description, exclude=active_agent.name)
+        if not ranked:
+            print("no other agent fits, assigned to designated default agent", self.default_agent.name)
+            return self.default_agent
+        print("agent changed to", ranked[0])
+        return self.get_agent(ranked[0])
+
+    def start_turn(self, session_id, user_input, session):
+        """TurnContext of a request, from the stored session or a new conversation with generic_agent."""
+        if session:
+            active_agent = self.get_agent(session.get("active_agent"))
+            print("session found, active agent:", active_agent.name)
+            return TurnContext(session_id, user_input, active_agent, session.get("conversation"))
+        active_agent = self.get_agent('generic_agent')
+        return TurnContext(session_id, user_input, active_agent, active_agent.new_conversation())
+
     def run(self, user_input, session_id):  
-        session = self.session_state.get(session_id)  
-        if session:  
-            active_agent_name = session.get("active_agent")  
-            self.active_agent = next(agent for agent in self.agents if agent.name == active_agent_name)  
-            conversation = session.get("conversation")  
-            print("session found, active agent:", active_agent_name)
-            print("conversation:", conversation)
-        else:  
-            
-            self.active_agent = next(agent for agent in self.agents if agent.name == 'generic_agent') 
-            conversation = self.active_agent.init_history  
-  
-        get_help, conversation, assistant_response = self.active_agent.run(user_input=user_input, conversation=conversation)  
+        start = time.perf_counter()
+        with metrics.turn_spans() as spans, tool_cache_scope(session_id):
+            turn, assistant_response = self._run_turn(user_input, session_id)
+        self.report_turn(turn, spans, start)
+        return assistant_response
+
+    def report_turn(self, turn, spans, start):
+        """Turn time and handoffs to the metrics, and one line with where the turn time went."""
+        seconds = time.perf_counter() - start
+        agent_turn.observe(seconds)
+        handoffs_per_turn.observe(len(turn.handoffs))
+        print(f"turn {turn.session_id}: {seconds:.3f}s, {len(turn.handoffs)} handoffs, {spans.describe()}")
+
+    def _run_turn(self, user_input, session_id):
+        turn = self.start_turn(session_id, user_input, self.session_state.get(session_id))
+        speculation = None
+        if self.speculative_routing and user_input is not None:
+            cancelled = threading.Event()
+            speculation = get_tool_executor().submit(self.speculate, user_input, turn.active_agent.name, cancelled)
+        get_help, turn.conversation, assistant_response = turn.active_agent.run(user_input=user_input, conversation=turn.conversation)  
           
         if get_help:  
-            self.revaluate_agent_assignment(assistant_response)  
-            conversation += self.active_agent.init_history  
-            get_help, conversation, assistant_response = self.active_agent.run(user_input=user_input, conversation=conversation)
+            help_start = time.perf_counter()
+            ranked = None
+            if speculation is not None:
+                try:
+                    ranked = self.confirm_speculation(speculation.result(), assistant_response, turn.active_agent.name)
+                except Exception as e:
+                    print("speculative routing failed:", e)
+            turn.hand_over(self.revaluate_agent_assignment(assistant_response, turn.active_agent, ranked))
+            handoff_routing.observe(time.perf_counter() - help_start)
+            get_help, turn.conversation, assistant_response = turn.active_agent.run(user_input=user_input, conversation=turn.conversation)
             if get_help: # if the agent still needs help even after re-assignment, then it's time to assign to the default agent
-                self.active_agent = self.default_agent
-                conversation += self.active_agent.init_history
-                get_help, conversation, assistant_response = self.active_agent.run(user_input=user_input, conversation=conversation) 
+                turn.hand_over(self.default_agent)
+                get_help, turn.conversation, assistant_response = turn.active_agent.run(user_input=user_input, conversation=turn.conversation) 
+            handoff_turn.observe(time.perf_counter() - turn.started)
+        elif speculation is not None:
+            cancelled.set()
+            speculation.cancel()
+
+        self.session_state.set(session_id, turn.session_state())  
+        return turn, assistant_response
+
+    async def arevaluate_agent_assignment(self, function_description, active_agent, ranked=None):
+        """Async revaluate_agent_assignment."""
+        if ranked is None:
+            ranked = await self.arank_agents(function_description, exclude=active_agent.name)
+        if not ranked:
+            print("no other agent fits, assigned to designated default agent", self.default_agent.name)
+            return self.default_agent
+        print("agent changed to", ranked[0])
+        return self.get_agent(ranked[0])
+
+    async def arun(self, user_input, session_id, events=None):
+        """
+        Async version of run used by the API.
+        `events` is passed on to Smart_Agent.arun to stream the turn; a "handoff" event announces an agent change,
+        after which the new agent starts its answer over.
+        """
+        start = time.perf_counter()
+        with metrics.turn_spans() as spans, tool_cache_scope(session_id):
+            turn, assistant_response = await self._arun_turn(user_input, session_id, events)
+        self.report_turn(turn, spans, start)
+        return assistant_response
+
+    async def _arun_turn(self, user_input, session_id, events):
+        turn = self.start_turn(session_id, user_input, await call_tool(self.session_state.get, session_id))
+        speculation = None
+        if self.speculative_routing and user_input is not None:
+            speculation = asyncio.create_task(self.aspeculate(user_input, turn.active_agent.name))
+            speculation.add_done_callback(_ignore_result)
+        get_help, turn.conversation, assistant_response = await turn.active_agent.arun(user_input=user_input, conversation=turn.conversation, events=events)
+
+        if get_help:
+            help_start = time.perf_counter()
+            ranked = None
+            if speculation is not None:
+                try:
+                    ranked = self.confirm_speculation(await speculation, assistant_response, turn.active_agent.name)
+                except Exception as e:
+                    print("speculative routing failed:", e)
+            turn.hand_over(await self.arevaluate_agent_assignment(assistant_response, turn.active_agent, ranked))
+            handoff_routing.observe(time.perf_counter() - help_start)
+            if events is not None:
+                await events({"type": "handoff", "agent": turn.active_agent.name})
+            get_help, turn.conversation, assistant_response = await turn.active_agent.arun(user_input=user_input, conversation=turn.conversation, events=events)
+            if get_help: # if the agent still needs help even after re-assignment, then it's time to assign to the default agent
+                turn.hand_over(self.default_agent)
+                if events is not None:
+                    await events({"type": "handoff", "agent": turn.active_agent.name})
+                get_help, turn.conversation, assistant_response = await turn.active_agent.arun(user_input=user_input, conversation=turn.conversation, events=events)
+            handoff_turn.observe(time.perf_counter() - turn.started)
+        elif speculation is not None:
+            speculation.cancel()
+
+        await call_tool(self.session_state.set, session_id, turn.session_state())
+        return turn, assistant_response  
+
 
-        session_state = {"active_agent": self.active_agent.name, "conversation": conversation}  
-        self.session_state.set(session_id, session_state)  
-        return assistant_response  
\ No newline at end of file
+def _ignore_result(task):
+    #A speculation nobody waited for must not log "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
@@ -1,46 +1,36 @@
 #General module to load tool specifications and make it available for the agent to use.
 from pathlib import Path  
+import asyncio
+import contextvars
 import json  
 import os  
-from openai import AzureOpenAI  
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 import yaml  
-from tenacity import retry, wait_random_exponential, stop_after_attempt  
-import pandas as pd  
-from dotenv import load_dotenv  
 import inspect  
-import yaml
 import importlib  
+import threading
+import time
+from src.utils.semantic_cache import get_semantic_cache
+from src.utils.tool_executor import call_tool, get_tool_executor
+from src.utils.context_window import get_context_window
+from src.utils.tool_cache import current_scope, get_tool_cache, normalize_args
+from agent_common.single_flight import get_single_flight
+from agent_common.openai_clients import get_openai_client, get_async_openai_client
+from agent_common.llm_scheduler import get_llm_scheduler
+from agent_common import metrics
 
 MAX_ERROR_RUN = 3  
 MAX_RUN_PER_QUESTION = 10  
-MAX_QUESTION_TO_KEEP = 3  
-MAX_QUESTION_WITH_DETAIL_HIST = 1  
   
   
-max_conversation_len = 5  # Set the desired value of k  
-  
-def clean_up_history(history, max_q_with_detail_hist=1, max_q_to_keep=2):  
-    question_count = 0  
-    removal_indices = []  
-    for idx in range(len(history) - 1, 0, -1):  
-        message = dict(history[idx])  
-        if message.get("role") == "user":  
-            question_count += 1  
-            if question_count >= max_q_with_detail_hist and question_count < max_q_to_keep:  
-                if message.get("role") != "user" and message.get("role") != "assistant" and len(message.get("content")) == 0:  
-                    removal_indices.append(idx)  
-        if question_count >= max_q_to_keep:  
-            removal_indices.append(idx)  
-    for index in removal_indices:  
-        del history[index]  
-  
-def reset_history_to_last_question(history):  
-    for i in range(len(history) - 1, -1, -1):  
-        message = dict(history[i])  
-        if message.get("role") == "user":  
-            break  
-        history.pop()  
-  
+#Buckets in tokens
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+prompt_tokens_full = metrics.histogram("prompt_tokens_full", "Conversation tokens at the start of a turn before the context window", buckets=TOKEN_BUCKETS)
+prompt_tokens_sent = metrics.histogram("prompt_tokens_sent", "Conversation tokens at the start of a turn after the context window", buckets=TOKEN_BUCKETS)
+parallel_tool_steps = metrics.counter("parallel_tool_steps", "Steps of several read-only tool calls run concurrently")
+parallel_tool_seconds_saved = metrics.counter("parallel_tool_seconds_saved", "Tool time saved by running read-only tool calls concurrently instead of in sequence")
+
 class Smart_Agent():
     """
     Agent that can use other agents and tools to answer questions.
@@ -79,55 +69,64 @@ class Smart_Agent():
                 return False
 
 
-    def _create_functions_dict(self, agent_name):  
+    def _create_functions_dict(self, agent_name, module_names=None):  
         functions_dict = {}  
-        tools_path = Path(__file__).parent / 'tools'  
-
-        for file in os.listdir(tools_path):  
-            if (file.endswith('.py') and agent_name in file) or file=="tools.py":  
-                module_name = file[:-3]  
-                module = importlib.import_module(f'src.agents.tools.{module_name}')  
-                  
-                # Iterate over all classes in the module  
-                for name, obj in inspect.getmembers(module, inspect.isclass):  
-                    if name.endswith("Tool"):
-                        # Create an instance of the tool class  
-                        tool_instance = obj()  
-                        # Get all methods from the tool instance  
-                        methods = inspect.getmembers(tool_instance, predicate=inspect.ismethod)  
-                        # Add methods to the dictionary  
-                        for method_name, method in methods:  
-                            if not method_name.startswith("_"):
-                                functions_dict[method_name] = method  
+        if module_names is None: #not given by the profile bundle, look for the agent's tool modules
+            tools_path = Path(__file__).parent / 'tools'  
+            module_names = [file[:-3] for file in os.listdir(tools_path) if (file.endswith('.py') and agent_name in file) or file=="tools.py"]
+
+        for module_name in module_names:  
+            module = importlib.import_module(f'src.agents.tools.{module_name}')  
+              
+            # Iterate over all classes in the module  
+            for name, obj in inspect.getmembers(module, inspect.isclass):  
+                if name.endswith("Tool"):
+                    # One instance of the tool class, shared with the other agents using it
+                    tool_instance = _tool_instance(obj)  
+                    # Get all methods from the tool instance  
+                    methods = inspect.getmembers(tool_instance, predicate=inspect.ismethod)  
+                    # Add methods to the dictionary  
+                    for method_name, method in methods:  
+                        if not method_name.startswith("_"):
+                            functions_dict[method_name] = method  
           
         return functions_dict  
 
 
-    def __init__(self,agent_name, base_path):
+    def __init__(self,agent_name, base_path, profiles=None, user_profile=None):
+        """`profiles` is the compiled profile bundle and `user_profile` the customer, both read from disk when not given."""
+        start = time.perf_counter()
         self.name = agent_name
 
-        self.client = AzureOpenAI(  
-        api_key=os.environ.get("AZURE_OPENAI_API_KEY"),  
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),  
-        azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT")   
-        ) 
-        with open(os.environ.get("USER_PROFILE_FILE")) as f:
-            user_profile = json.load(f)
+        self.client = get_openai_client()
+        self.llm_scheduler = get_llm_scheduler()
+        if user_profile is None:
+            with open(os.environ.get("USER_PROFILE_FILE")) as f:
+                user_profile = json.load(f)
       
         self.engine = os.environ.get("AZURE_OPENAI_CHAT_DEPLOYMENT")
-        profile_file = f'{base_path}/{agent_name}_profile.yaml'
-        with open(profile_file, 'r') as file:  
-            profile = yaml.safe_load(file)  
+        if profiles is None:
+            profile_file = f'{base_path}/{agent_name}_profile.yaml'
+            with open(profile_file, 'r') as file:  
+                profile = yaml.safe_load(file)  
+            common_profile_file = f'{base_path}/common_agent_profile.yaml'
+            with open(common_profile_file, 'r') as file:
+                common_profile = yaml.safe_load(file)
+            tool_modules = None
+        else:
+            profile = profiles["agents"][agent_name]
+            common_profile = profiles["common"]
+            tool_modules = profiles["tool_modules"][agent_name]
         self.domain_description = profile["domain_description"]
-        common_profile_file = f'{base_path}/common_agent_profile.yaml'
-        with open(common_profile_file, 'r') as file:
-            common_profile = yaml.safe_load(file)
         if profile.get('default_agent') ==True:
             self.default_agent = True
             print("Default agent is set to ", self.name)
         else:
             self.default_agent = False
-        self.init_history =[{"role":"system", "content":profile["persona"].format(customer_name =user_profile['name'], customer_id=user_profile['customer_id'])}, {"role":"assistant", "content":profile["initial_message"]}]
+        #Template shared by every session: a tuple so it cannot be appended to, copied by new_conversation
+        self.init_history = ({"role":"system", "content":profile["persona"].format(customer_name =user_profile['name'], customer_id=user_profile['customer_id'])}, {"role":"assistant", "content":profile["initial_message"]})
+        #Details of the persona kept out of the semantic cache, which serves answers to other customers
+        self.personal_details = {"customer_name": user_profile['name'], "customer_first_name": user_profile['name'].split()[0], "customer_id": str(user_profile['customer_id'])}
         self.function_spec = []
         for tool in profile.get('tools', []):
             self.function_spec.append({        
@@ -155,20 +154,50 @@ class Smart_Agent():
         #Create a dictionary of functions with name of function and the actual function object
 
 
-        self.functions_list = self._create_functions_dict(profile["name"])  
+        tools_start = time.perf_counter()
+        self.functions_list = self._create_functions_dict(profile["name"], tool_modules)  
+        tools_seconds = time.perf_counter() - tools_start
+
+        #Answers to the opening question of a conversation produced only with these tools do not depend on the customer and can be served from the semantic cache
+        self.cacheable_tools = profile.get('cacheable_tools', [])
+        self.semantic_cache = get_semantic_cache(self.functions_list["get_embedding"]) if self.cacheable_tools else None
+        #Tools flagged read_only in the profile have no side effects and may run together when the model asks for several at once
+        self.read_only_tools = {tool['name'] for tool in profile.get('tools', []) + common_profile.get('tools', []) if tool.get('read_only')}
+        #Results of tools with a cache_ttl in the profile are reused within a session for the same arguments, until a tool that lists them in `invalidates` runs
+        tools = profile.get('tools', []) + common_profile.get('tools', [])
+        self.tool_cache_ttl = {tool['name']: tool['cache_ttl'] for tool in tools if tool.get('cache_ttl')}
+        self.tool_invalidates = {tool['name']: tool['invalidates'] for tool in tools if tool.get('invalidates')}
+        self.tool_cache = get_tool_cache() if self.tool_cache_ttl else None
+        #Identical read-only calls running at the same time, from any session, share one execution
+        self.tool_reads = get_single_flight("tool_reads")
+        self.context_window = get_context_window(self._summarize)
+        self.build_seconds = {"tools": tools_seconds, "total": time.perf_counter() - start}
         
     def run(self, user_input, conversation=None):
         if user_input is None: #if no input return init message
             print("1st request, return init message")
-            return False, self.init_history, self.init_history[1]["content"]
-        if conversation is None: #if no history return init message
-            conversation = self.init_history.copy()
+            return False, self.new_conversation(), self.init_history[1]["content"]
+        #Work on a copy: the caller's list (e.g. the one held by the session store) is never modified
+        conversation = self.new_conversation() if conversation is None else list(conversation)
+        use_cache = self.semantic_cache is not None and self._opening_question(conversation) and self.semantic_cache.standalone(user_input, self.personal_details)
+        if self.context_window is not None:
+            conversation = self._compact(conversation)
         conversation.append({"role": "user", "content": user_input})
         request_help = False
+        question_vector = None
+        if use_cache:
+            question_vector = self.semantic_cache.embed(user_input)
+            cached = self.semantic_cache.lookup(self.name, question_vector)
+            if cached is not None:
+                print("semantic cache hit:", cached["question"])
+                answer = self.semantic_cache.render(cached, self.personal_details)
+                conversation.append({"role": "assistant", "content": answer})
+                return request_help, conversation, answer
+        tools_used = set()
         if len(self.function_spec)>0:
             while True:
 
-                response = self.client.chat.completions.create(
+                response = self.llm_scheduler.request(self.client.chat.completions.create,
                     model=self.engine, 
                     messages=conversation,
                 tools=self.function_spec,
@@ -188,57 +217,21 @@ class Smart_Agent():
                 if  tool_calls:
                     conversation.append(response_message)  # extend conversation with assistant's reply
                     for tool_call in tool_calls:
-                        function_name = tool_call.function.name
+                        tools_used.add(tool_call.function.name)
                         print("Recommended Function call:")
-                        print(function_name)
-                        print()                                    
-                        # verify function exists
-                        if function_name not in self.functions_list:
-                            # raise Exception("Function " + function_name + " does not exist")
-                            conversation.pop()
-                            continue
-                        function_to_call = self.functions_list[function_name]
-                        
-                        # verify function has correct number of arguments
-                        function_args = json.loads(tool_call.function.arguments)
-
-                        if self.check_args(function_to_call, function_args) is False:
-                            # raise Exception("Invalid number of arguments for function: " + function_name)
-                            conversation.pop()
-                            continue
-
-                        
-                        # print("beginning function call")
-                        function_response = str(function_to_call(**function_args))
-
-                        if function_name=="get_help": #scenario where the agent asks for help
-                            summary_conversation = []
-                            for message in conversation:
-                                message = dict(message)
-                                if message.get("role") != "system" and message.get("role") != "tool" and len(message.get("content"))>0:
-                                    summary_conversation.append({"role":message.get("role"), "content":message.get("content")})
-                            summary_conversation.pop() #remove the last message which is the agent asking for help
-                            return True, summary_conversation, function_response
-
-                        print("Output of function call:")
-                        print(function_response)
+                        print(tool_call.function.name)
                         print()
-                    
-                        conversation.append(
-                            {
-                                "tool_call_id": tool_call.id,
-                                "role": "tool",
-                                "name": function_name,
-                                "content": function_response,
-                            }
-                        )  # extend conversation with function response
-                        
+                    # Consecutive read-only calls run concurrently, any other call runs on its own, in the order the model asked
+                    for step in self._plan_tool_calls(tool_calls):
+                        help_request = self._apply_tool_results(step, self._execute_step(step), conversation)
+                        if help_request is not None: #scenario where the agent asks for help
+                            return help_request
 
                     continue
                 else:
                     break #if no function call break out of loop as this indicates that the agent finished the research and is ready to respond to the user
         else:
-            response = self.client.chat.completions.create(
+            response = self.llm_scheduler.request(self.client.chat.completions.create,
                 model=self.engine, 
                 messages=conversation,
                 )
@@ -246,6 +239,295 @@ class Smart_Agent():
 
         conversation.append(response_message)
         assistant_response = response_message.content
+        if question_vector is not None:
+            self.semantic_cache.admit(self.name, user_input, assistant_response, question_vector, tools_used, self.cacheable_tools, self.personal_details)
+
+        return request_help, conversation, assistant_response
+
+    async def arun(self, user_input, conversation=None, events=None):
+        """
+        Async version of run for the API: LLM calls go through AsyncAzureOpenAI and blocking tools, embeddings
+        included, run on the bounded tool thread pool, so one slow turn does not hold up the event loop.
+        When `events` (an async callable taking an event dict) is given, completions are streamed and the turn
+        reports its progress as it goes: "token" events carry answer text, "tool_call" and "tool_result" events
+        the tool rounds.
+        """
+        if user_input is None: #if no input return init message
+            print("1st request, return init message")
+            await _emit(events, {"type": "token", "content": self.init_history[1]["content"]})
+            return False, self.new_conversation(), self.init_history[1]["content"]
+        #Work on a copy: the caller's list (e.g. the one held by the session store) is never modified
+        conversation = self.new_conversation() if conversation is None else list(conversation)
+        use_cache = self.semantic_cache is not None and self._opening_question(conversation) and self.semantic_cache.standalone(user_input, self.personal_details)
+        if self.context_window is not None:
+            conversation = await call_tool(self._compact, conversation)
+        conversation.append({"role": "user", "content": user_input})
+        request_help = False
+        question_vector = None
+        if use_cache:
+            question_vector = await call_tool(self.semantic_cache.embed, user_input)
+            cached = self.semantic_cache.lookup(self.name, question_vector)
+            if cached is not None:
+                print("semantic cache hit:", cached["question"])
+                answer = self.semantic_cache.render(cached, self.personal_details)
+                await _emit(events, {"type": "token", "content": answer})
+                conversation.append({"role": "assistant", "content": answer})
+                return request_help, conversation, answer
+        tools_used = set()
+        if len(self.function_spec)>0:
+            while True:
+                response_message = await self._acomplete(conversation, events, tools=self.function_spec, tool_choice='auto')
+                if response_message.content is None:
+                    response_message.content = ""
+                tool_calls = response_message.tool_calls
+                print("assistant response: ", response_message.content)
+                if not tool_calls:
+                    break #the agent finished the research and is ready to respond to the user
+                conversation.append(response_message)
+                for tool_call in tool_calls:
+                    tools_used.add(tool_call.function.name)
+                    print("Recommended Function call:", tool_call.function.name)
+                for step in self._plan_tool_calls(tool_calls):
+                    for tool_call, _, _ in step:
+                        await _emit(events, {"type": "tool_call", "agent": self.name, "name": tool_call.function.name})
+                    results = await self._aexecute_step(step)
+                    for (tool_call, _, _), (_, seconds) in zip(step, results):
+                        await _emit(events, {"type": "tool_result", "agent": self.name, "name": tool_call.function.name, "ms": round(seconds * 1000, 1)})
+                    help_request = self._apply_tool_results(step, results, conversation)
+                    if help_request is not None: #scenario where the agent asks for help
+                        return help_request
+        else:
+            response_message = await self._acomplete(conversation, events)
+
+        conversation.append(response_message)
+        assistant_response = response_message.content
+        if question_vector is not None:
+            self.semantic_cache.admit(self.name, user_input, assistant_response, question_vector, tools_used, self.cacheable_tools, self.personal_details)
 
         return request_help, conversation, assistant_response
+
+    async def _acomplete(self, conversation, events=None, **kwargs):
+        """
+        One chat completion round. Without `events` this is a plain request; with it the completion is streamed,
+        text deltas are sent as "token" events as they arrive and the tool call deltas are put back together, so
+        the returned message looks the same either way.
+        """
+        if events is None:
+            response = await self.llm_scheduler.arequest(self.async_client.chat.completions.create, model=self.engine, messages=conversation, **kwargs)
+            return response.choices[0].message
+        stream = await self.llm_scheduler.arequest(self.async_client.chat.completions.create, model=self.engine, messages=conversation, stream=True, **kwargs)
+        content = []
+        tool_calls = {}
+        async for chunk in stream:
+            if not chunk.choices: #Azure sends the prompt filter results in a chunk without choices
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                await events({"type": "token", "content": delta.content})
+            for tool_call in delta.tool_calls or []:
+                call = tool_calls.setdefault(tool_call.index, {"id": None, "name": "", "arguments": ""})
+                if tool_call.id:
+                    call["id"] = tool_call.id
+                if tool_call.function is not None:
+                    call["name"] += tool_call.function.name or ""
+                    call["arguments"] += tool_call.function.arguments or ""
+        return ChatCompletionMessage(role="assistant", content="".join(content), tool_calls=[
+            ChatCompletionMessageToolCall(id=call["id"], type="function", function=Function(name=call["name"], arguments=call["arguments"]))
+            for _, call in sorted(tool_calls.items())] or None)
+
+    @property
+    def async_client(self):
+        """The shared async client of the running event loop."""
+        return get_async_openai_client()
+
+    def new_conversation(self):
+        """A fresh conversation starting with this agent's persona and greeting."""
+        return [dict(message) for message in self.init_history]
+
+    def _opening_question(self, conversation):
+        """
+        True when nothing follows this agent's latest persona message but its greeting, so the question about to be
+        appended is the first one the agent is asked: a new conversation, or one just handed over with get_help
+        (the messages before the persona are the previous agent's). Only then is the semantic cache used: a
+        follow-up ("is it the same for infants?") depends on history that the question embedding does not capture.
+        """
+        messages = [dict(message) for message in conversation]
+        persona = self.init_history[0]
+        starts = [i for i, message in enumerate(messages) if message.get("role") == "system" and message.get("content") == persona["content"]]
+        return bool(starts) and messages[starts[-1]:] == list(self.init_history)
+
+    def _plan_tool_calls(self, tool_calls):
+        """
+        Split the tool calls of one model response into steps, keeping their order. Consecutive valid calls to
+        tools marked `read_only` in the profile share a step and run concurrently; a mutating call, get_help
+        and an invalid call (unknown function or wrong arguments) each get a step of their own.
+        Every call is a (tool_call, function, args) tuple, function being None for an invalid call.
+        """
+        steps = []
+        group = []
+        for tool_call in tool_calls:
+            function_to_call = self.functions_list.get(tool_call.function.name)
+            function_args = None
+            if function_to_call is not None:
+                function_args = json.loads(tool_call.function.arguments)
+                if self.check_args(function_to_call, function_args) is False:
+                    function_to_call = None
+            call = (tool_call, function_to_call, function_args)
+            if function_to_call is not None and tool_call.function.name in self.read_only_tools:
+                group.append(call)
+                continue
+            if group:
+                steps.append(group)
+                group = []
+            steps.append([call])
+        if group:
+            steps.append(group)
+        return steps
+
+    def _execute_step(self, step):
+        """Run the calls of a step, on the tool thread pool when there are several; returns (response, seconds) per call."""
+        start = time.perf_counter()
+        if len(step) == 1:
+            results = [self._call_tool(step[0])]
+        else:
+            #Each call in a copy of this context, so its spans count in the turn
+            contexts = [contextvars.copy_context() for _ in step]
+            results = list(get_tool_executor().map(lambda context, call: context.run(self._call_tool, call), contexts, step))
+        self._report_step(step, results, time.perf_counter() - start)
+        return results
+
+    async def _aexecute_step(self, step):
+        start = time.perf_counter()
+        results = await asyncio.gather(*(call_tool(self._call_tool, call) for call in step))
+        self._report_step(step, results, time.perf_counter() - start)
+        return results
+
+    def _call_tool(self, call):
+        """
+        _timed_call through the tool result cache and single-flight: cached tools are looked up first among the results of the
+        turn's session, read-only calls
+        join an identical call already running, and writes evict the cached results and detach the running reads
+        they invalidate, so no later call gets a result from before the write.
+        """
+        tool_call, function_to_call, function_args = call
+        if function_to_call is None:
+            return _timed_call(call)
+        name = tool_call.function.name
+        run = lambda: _timed_call(call)
+        if self.tool_reads is not None and name in self.read_only_tools:
+            run = lambda: self._shared_call(call)
+        with metrics.histogram("tool_call_seconds", "Time the turn spent on tool calls, cache hits and shared calls included", labels={"tool": name}, buckets=metrics.FAST_BUCKETS).time():
+            scope = current_scope()
+            if self.tool_cache is not None and name in self.tool_cache_ttl and scope is not None:
+                return self.tool_cache.get_or_call(scope, name, function_args, self.tool_cache_ttl[name], run)
+            result = run()
+        if name in self.tool_invalidates:
+            if self.tool_cache is not None:
+                evicted = self.tool_cache.invalidate(self.tool_invalidates[name])
+                print(f"{name} evicted {evicted} cached tool results")
+            if self.tool_reads is not None:
+                self.tool_reads.forget(lambda key: key[1] in self.tool_invalidates[name])
+        return result
+
+    def _shared_call(self, call):
+        """_timed_call of a read-only tool through single-flight, keyed by tool instance, name and arguments; the time is this caller's wait."""
+        tool_call, function_to_call, function_args = call
+        start = time.perf_counter()
+        key = (id(getattr(function_to_call, "__self__", function_to_call)), tool_call.function.name, normalize_args(function_args))
+        response, _ = self.tool_reads.do(key, lambda: _timed_call(call))
+        return response, time.perf_counter() - start
+
+    def _report_step(self, step, results, elapsed):
+        if len(step) > 1:
+            sequential = sum(seconds for _, seconds in results)
+            parallel_tool_steps.inc()
+            parallel_tool_seconds_saved.inc(max(sequential - elapsed, 0.0))
+            print(f"ran {len(step)} read-only tool calls concurrently in {elapsed:.3f}s, {sequential - elapsed:.3f}s saved over running them in sequence")
+
+    def _apply_tool_results(self, step, results, conversation):
+        """Append the tool messages of a step in tool call order; returns the help request when the step is get_help."""
+        for (tool_call, function_to_call, _), (function_response, _) in zip(step, results):
+            if function_to_call is None:
+                conversation.pop()
+                continue
+            if tool_call.function.name == "get_help":
+                return True, self._help_summary(conversation), function_response
+            print("Output of function call:")
+            print(function_response)
+            print()
+            conversation.append(
+                {
+                    "tool_call_id": tool_call.id,
+                    "role": "tool",
+                    "name": tool_call.function.name,
+                    "content": function_response,
+                }
+            )  # extend conversation with function response
+        return None
+
+    def _compact(self, conversation):
+        """Fit the stored conversation into the context window before the new question, reporting the prompt tokens saved."""
+        conversation, report = self.context_window.compact(conversation)
+        prompt_tokens_full.observe(report["tokens_before"])
+        prompt_tokens_sent.observe(report["tokens_after"])
+        if report["tokens_after"] < report["tokens_before"]:
+            print(f"context window: {report['tokens_before']} -> {report['tokens_after']} prompt tokens, "
+                  f"{report['tool_messages_dropped']} tool messages dropped, {report['messages_summarized']} messages summarized")
+        return conversation
+
+    def _summarize(self, previous_summary, messages, max_tokens):
+        """
+        Rolling summary of the turns that no longer fit the context window, written by the evaluator model.
+        The turn waits on it before its first completion, so it is sent at "routing" priority: ahead of background
+        work, behind the customer turns already answering.
+        """
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in map(dict, messages) if message.get("content"))
+        response = self.llm_scheduler.request(self.client.chat.completions.create, priority="routing",
+            model=os.getenv("AZURE_OPENAI_EVALUATOR_DEPLOYMENT", self.engine),
+            messages=[{"role": "system", "content": "You maintain a running summary of a customer service conversation for the agent handling it. "
+                                                    "Keep facts the agent may need later: customer requests, booking and ticket numbers, dates, decisions and open issues. "
+                                                    f"Answer with the updated summary only, in at most {max_tokens} tokens."},
+                      {"role": "user", "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}],
+            max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content
+
+    def _help_summary(self, conversation):
+        """User and assistant messages with content, handed to the next agent when this one asks for help."""
+        summary_conversation = []
+        for message in conversation:
+            message = dict(message)
+            if message.get("role") != "system" and message.get("role") != "tool" and len(message.get("content"))>0:
+                summary_conversation.append({"role":message.get("role"), "content":message.get("content")})
+        summary_conversation.pop() #remove the last message which is the agent asking for help
+        return summary_conversation
   
+
+
+_tool_instances = {}
+_tool_instances_lock = threading.Lock()
+
+
+def _tool_instance(tool_class):
+    """The process-wide instance of a tool class: creating one loads policy indexes and opens DB engines."""
+    with _tool_instances_lock:
+        instance = _tool_instances.get(tool_class)
+        if instance is None:
+            instance = _tool_instances[tool_class] = tool_class()
+        return instance
+
+
+def _timed_call(call):
+    """Call one planned tool call; returns its response as a string (None for an invalid call) and how long it took."""
+    _, function_to_call, function_args = call
+    if function_to_call is None:
+        return None, 0.0
+    start = time.perf_counter()
+    function_response = str(function_to_call(**function_args))
+    return function_response, time.perf_counter() - start
+
+
+async def _emit(events, event):
+    if events is not None:
+        await events(event)
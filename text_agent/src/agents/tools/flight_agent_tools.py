@@ -4,9 +4,10 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Union, Tuple
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey  
 from sqlalchemy.ext.declarative import declarative_base  
-from sqlalchemy.orm import sessionmaker, relationship  
+from sqlalchemy.orm import sessionmaker, relationship, scoped_session  
 from dateutil import parser  
-from .tools import Tool  
+from .tools import Tool, db_call  
+from src.utils.policy_store import load_policy_index
 import json
 Base = declarative_base()  
 
@@ -40,14 +41,12 @@ def transfer_conversation(user_request: str) -> str:
 class FlightAgentTool(Tool):  
     def __init__(self):  
         super().__init__()
-        emb_map_file_path=os.getenv("FLIGHT_POLICY_FILE")  
-        with open(emb_map_file_path) as file:  
-            self.chunks_emb = json.load(file)  
+        self.policy_index = load_policy_index(os.getenv("FLIGHT_POLICY_FILE"))  
 
-        engine = create_engine(f'sqlite:///{os.getenv("FLIGHT_DB_FILE", "../data/flight_db.db")}')  
+        engine = create_engine(f'sqlite:///{os.getenv("FLIGHT_DB_FILE", "../data/flight_db.db")}', connect_args={"check_same_thread": False})  
         Base.metadata.create_all(engine)  
-        Session = sessionmaker(bind=engine)  
-        self.session = Session()  
+        #One session per thread, the async API runs tools concurrently on a thread pool; db_call removes it after each call
+        self.session = scoped_session(sessionmaker(bind=engine))  
   
     def search_airline_knowledgebase(self, search_query: str) -> str:  
         return self.search_knowledge_base(search_query, topk=3)  
@@ -69,6 +68,7 @@ class FlightAgentTool(Tool):
                         f"flight_status: on time\n")  
         return flights  
   
+    @db_call
     def check_flight_status(self, flight_num: str, from_: str) -> str:  
         print("check_flight_status")  
         result = self.session.query(Flight).filter_by(flight_num=flight_num, departure_airport=from_, status="open").first()  
@@ -85,6 +85,7 @@ class FlightAgentTool(Tool):
             output = f"Cannot find status for the flight {flight_num} from {from_}"  
         return str(output)  
   
+    @db_call
     def confirm_flight_change(self, current_ticket_number: str, new_flight_number: str, new_departure_time: str, new_arrival_time: str) -> str:  
         charge = 80  
         old_flight = self.session.query(Flight).filter_by(ticket_num=current_ticket_number, status="open").first()  
@@ -119,6 +120,7 @@ class FlightAgentTool(Tool):
         charge = 80  
         return f"Changing your ticket from {current_flight_number} to new flight {new_flight_number} departing from {from_} would cost {charge} dollars."  
   
+    @db_call
     def load_user_flight_info(self, user_id: str) -> str:  
         print("load_user_flight_info")  
         matched_flights = self.session.query(Flight).filter_by(customer_id=user_id, status="open").all()  
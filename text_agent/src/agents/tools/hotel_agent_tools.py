@@ -5,12 +5,9 @@ from datetime import datetime
 from typing import List, Dict, Union  
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey  
 from sqlalchemy.ext.declarative import declarative_base  
-from sqlalchemy.orm import sessionmaker, relationship  
-from dotenv import load_dotenv  
-from openai import AzureOpenAI  
-from scipy import spatial  
-from pathlib import Path  
-from .tools import Tool  
+from sqlalchemy.orm import sessionmaker, relationship, scoped_session  
+from .tools import Tool, db_call  
+from src.utils.policy_store import load_policy_index
 
 Base = declarative_base()  
 
@@ -33,26 +30,16 @@ class Reservation(Base):
 class HotelAgentTool(Tool):  
     def __init__(self):  
         super().__init__()
-        emb_map_file_path=os.getenv("HOTEL_POLICY_FILE")  
-        with open(emb_map_file_path) as file:  
-            self.chunks_emb = json.load(file)  
+        self.policy_index = load_policy_index(os.getenv("HOTEL_POLICY_FILE"))  
   
           
   
         # SQLAlchemy setup  
-        engine = create_engine(f'sqlite:///{os.getenv("HOTEL_DB_FILE")}')  
+        engine = create_engine(f'sqlite:///{os.getenv("HOTEL_DB_FILE")}', connect_args={"check_same_thread": False})  
         Base.metadata.create_all(engine)  
-        Session = sessionmaker(bind=engine)  
-        self.session = Session()  
+        #One session per thread, the async API runs tools concurrently on a thread pool; db_call removes it after each call
+        self.session = scoped_session(sessionmaker(bind=engine))  
   
-        # Azure OpenAI setup  
-        self.openai_emb_engine = os.getenv("AZURE_OPENAI_EMB_DEPLOYMENT")  
-        self.openai_chat_engine = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")  
-        self.openai_client = AzureOpenAI(  
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),  
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")  
-        )  
   
     def search_hotel_knowledgebase(self, search_query: str) -> str:  
         print("search_hotel_knowledgebase")  
@@ -67,6 +54,7 @@ class HotelAgentTool(Tool):
         )  
         return rooms  
   
+    @db_call
     def check_reservation_status(self, reservation_id: int) -> str:  
         print("check_reservation_status")  
         result = self.session.query(Reservation).filter_by(id=reservation_id, status="booked").first()  
@@ -84,6 +72,7 @@ class HotelAgentTool(Tool):
             output = f"Cannot find status for the reservation with ID {reservation_id}"  
         return str(output)  
   
+    @db_call
     def confirm_reservation_change(self, current_reservation_id: int, new_room_type: str, new_check_in_date: str, new_check_out_date: str) -> str:  
         charge = 50  
         old_reservation = self.session.query(Reservation).filter_by(id=current_reservation_id, status="booked").first()  
@@ -112,6 +101,7 @@ class HotelAgentTool(Tool):
         charge = 50  
         return f"Changing your reservation will cost an additional ${charge}."  
   
+    @db_call
     def load_user_reservation_info(self, user_id: str) -> str:  
         print("load_user_reservation_info")  
         matched_reservations = self.session.query(Reservation).filter_by(customer_id=user_id, status="booked").all()  
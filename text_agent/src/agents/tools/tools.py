@@ -1,23 +1,37 @@
+import functools
 import os  
-import json  
-from typing import List, Tuple  
-from scipy import spatial  # for calculating vector similarities for search  
-from openai import AzureOpenAI    
+from typing import List  
+from src.utils.policy_index import format_results
+from src.utils.hybrid_search import get_hybrid_search
+from src.utils.policy_store import load_policy_index
+from agent_common.embedding_cache import get_embedding_cache
+from agent_common.embedding_batcher import get_embedding_batcher
+from agent_common.openai_clients import get_openai_client
+from agent_common.llm_scheduler import get_llm_scheduler
   
   
+def db_call(method):
+    """
+    For tool methods using `self.session`, a scoped_session: the calling thread's session is removed when the call
+    returns, so no thread keeps an identity map of rows that a write from another thread may have changed since.
+    """
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.session.remove()
+    return call
+
+
 class Tool:  
     def __init__(self):  
         if os.getenv("EMB_MAP_FILE_PATH"):
-            with open(os.getenv("EMB_MAP_FILE_PATH")) as file:  
-                self.chunks_emb = json.load(file)  
+            self.policy_index = load_policy_index(os.getenv("EMB_MAP_FILE_PATH"))  
   
         self.openai_emb_engine = os.getenv("AZURE_OPENAI_EMB_DEPLOYMENT")  
         self.openai_chat_engine = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")  
-        self.openai_client = AzureOpenAI(  
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),  
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")  
-        )  
+        self.openai_client = get_openai_client()  
   
     def get_help(self, user_request: str) -> str:  
         return f"{user_request}"  
@@ -28,16 +42,14 @@ class Tool:
     def search_knowledge_base(self, question: str, topk: int = 3) -> str:  
         """Search the knowledge base and return top-k results."""  
         print("question", question)  
-        input_vector = self.get_embedding(question)  
-        cosine_list: List[Tuple[str, str, float]] = []  
-        for item in self.chunks_emb:  
-            cosine_sim = 1 - spatial.distance.cosine(input_vector, item['policy_text_embedding'])  
-            cosine_list.append((item['id'], item['policy_text'], cosine_sim))  
-        cosine_list.sort(key=lambda x: x[2], reverse=True)  
-        cosine_list = cosine_list[:topk]  
-        text_content = "\n".join(f"{chunk[0]}\n{chunk[1]}" for chunk in cosine_list)  
-        return text_content  
+        return format_results(get_hybrid_search(self.policy_index).search(question, self.get_embedding, topk=topk))  
   
     def get_embedding(self, text: str) -> List[float]:  
         text = text.replace("\n", " ")  
-        return self.openai_client.embeddings.create(input=[text], model=self.openai_emb_engine).data[0].embedding  
\ No newline at end of file
+        return get_embedding_cache().get_or_create(self.openai_emb_engine, text, self._create_embedding)  
+  
+    def _create_embedding(self, text: str) -> List[float]:  
+        batcher = get_embedding_batcher(self.openai_client, self.openai_emb_engine)  
+        if batcher is not None:  
+            return batcher.embed(text)  
+        return get_llm_scheduler().request(self.openai_client.embeddings.create, input=[text], model=self.openai_emb_engine).data[0].embedding  
\ No newline at end of file
@@ -1,25 +1,28 @@
+import asyncio
+import json
 import os  
+import time
 import uuid  
 from pathlib import Path  
 from dotenv import load_dotenv  
-from openai import AzureOpenAI  
 from fastapi import FastAPI, HTTPException, Request  
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import sys
 from src.agents.agent_manager import Agent_Runner  
 from src.utils.session_state import SessionState  
+from agent_common import metrics
 
 load_dotenv()  
   
 session_state = SessionState()  
 agent_runner = Agent_Runner(session_state)  
   
-client = AzureOpenAI(  
-    api_key=os.environ.get("AZURE_OPENAI_API_KEY"),  
-    api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),  
-    azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT")  
-)  
-  
 app = FastAPI()  
+
+chat_ttft = metrics.histogram("chat_ttft_seconds", "Time from request to the first answer token of a /chat/stream turn")
+chat_turn = metrics.histogram("chat_turn_seconds", "Time from request to the complete answer of a /chat/ or /chat/stream turn")
+#Running /chat/stream turns, referenced until they finish
+streaming_turns = set()
   
 @app.post("/chat/")  
 async def chat(request: Request):  
@@ -27,8 +30,58 @@ async def chat(request: Request):
     message = data.get("message")  
     session_id = data.get("session_id", str(uuid.uuid4()))  
 
-    response = agent_runner.run(message, session_id)  
+    with chat_turn.time():
+        response = await agent_runner.arun(message, session_id)  
     return {"response": response, "session_id": session_id}  
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    """
+    Same turn as /chat/, answered as server-sent events while it runs: "token" (answer text), "tool_call" and
+    "tool_result" (progress of the tool rounds), "handoff" (another agent takes over and starts the answer
+    over), then "done" with the full response, or "error".
+    """
+    start = time.perf_counter()
+    data = await request.json()
+    message = data.get("message")
+    session_id = data.get("session_id", str(uuid.uuid4()))
+    events = asyncio.Queue()
+
+    async def turn():
+        try:
+            response = await agent_runner.arun(message, session_id, events=events.put)
+            await events.put({"type": "done", "response": response, "session_id": session_id})
+        except Exception as e:
+            await events.put({"type": "error", "message": str(e), "session_id": session_id})
+
+    async def event_stream():
+        #The turn is a separate task: if the client goes away it still finishes and saves the session
+        task = asyncio.create_task(turn())
+        streaming_turns.add(task)
+        task.add_done_callback(streaming_turns.discard)
+        ttft = None
+        while True:
+            event = await events.get()
+            if event["type"] == "token" and ttft is None:
+                ttft = time.perf_counter() - start
+                chat_ttft.observe(ttft)
+            if event["type"] == "done":
+                chat_turn.observe(time.perf_counter() - start)
+                event["ttft_ms"] = round(ttft * 1000, 1) if ttft is not None else None
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            if event["type"] in ("done", "error"):
+                break
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics/summary")
+async def metrics_summary():
+    return metrics.snapshot()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Every metric in the Prometheus text format, for scraping."""
+    return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
           
 if __name__ == "__main__":  
     import uvicorn  
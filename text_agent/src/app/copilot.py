@@ -1,3 +1,4 @@
+import json
 import uuid  
 import streamlit as st  
 import requests  
@@ -10,6 +11,17 @@ load_dotenv()
   
 # Set up Streamlit page  
 st.set_page_config(layout="wide", page_title="Chat Client", page_icon="💬")  
+def stream_chat(message):
+    # Events of the /chat/stream endpoint as they arrive
+    with requests.post(
+        f"http://{os.getenv('API_HOST')}:{os.getenv('API_PORT')}/chat/stream",
+        json={"message": message, "session_id": st.session_state['session_id']},
+        stream=True,
+    ) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data: "):
+                yield json.loads(line[len("data: "):])
+
 def initialize_chat_session():
     # Initialize session state  
 
@@ -64,15 +76,32 @@ if user_input:
     # Append user's message to history  
     st.session_state['history'].append({"role": "user", "content": user_input})  
   
-    # Send user input to backend and get response  
-    response = requests.post(  
-        f"http://{os.getenv('API_HOST')}:{os.getenv('API_PORT')}/chat/",  
-        json={"message": user_input, "session_id": st.session_state['session_id']}  
-    )  
-    response_data = response.json()  
-    assistant_response = response_data.get("response", "No response received.")  
+    # Send user input to backend and render the response as it streams in  
     with st.chat_message("assistant"):
-        st.markdown(assistant_response)
+        status = st.empty()
+        placeholder = st.empty()
+        assistant_response = ""
+        for event in stream_chat(user_input):
+            if event["type"] == "token":
+                assistant_response += event["content"]
+                placeholder.markdown(assistant_response + "▌")
+            elif event["type"] == "tool_call":
+                # Text before a tool round is not part of the final answer
+                assistant_response = ""
+                placeholder.empty()
+                status.caption(f"Looking this up ({event['name']})...")
+            elif event["type"] == "tool_result":
+                status.caption(f"{event['name']} done in {event['ms']:.0f} ms")
+            elif event["type"] == "handoff":
+                assistant_response = ""
+                placeholder.empty()
+                status.caption(f"Transferring you to {event['agent']}...")
+            elif event["type"] == "done":
+                assistant_response = event["response"]
+            elif event["type"] == "error":
+                assistant_response = "No response received."
+        status.empty()
+        placeholder.markdown(assistant_response)
         
     # Append assistant's response to history  
     st.session_state['history'].append({"role": "assistant", "content": assistant_response})  
@@ -0,0 +1,115 @@
+#Approximate nearest neighbour (faiss HNSW or IVF) backend for the knowledge base search, built offline from a policy store.
+#Build with: python -m src.utils.ann_index ../data/flight_policy.json --kind hnsw
+import argparse
+import json
+import os
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from src.utils import policy_store
+
+ANN_KINDS = ("hnsw", "ivf")
+
+
+def ann_index_path(prefix: str, kind: str) -> str:
+    return f"{prefix}.{kind}.faiss"
+
+
+class AnnPolicyIndex:
+    """
+    Policy chunk index answering top-k queries through a faiss index instead of an exact scan.
+
+    Vectors are L2-normalized and indexed with inner-product metric, so scores are cosine similarities
+    and results have the same (id, text, score) shape as PolicyIndex.search.
+
+    Args:
+        ids (list): Chunk ids in faiss row order.
+        texts (list): Chunk texts in faiss row order.
+        index: A faiss index over the normalized chunk embeddings.
+        ef_search (int): HNSW candidate list size per query; larger is slower and more accurate.
+        nprobe (int): IVF clusters visited per query; larger is slower and more accurate.
+    """
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], index, ef_search: int = 64, nprobe: int = 8):
+        import faiss
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.index = index
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = ef_search
+        ivf = faiss.try_extract_index_ivf(index) if hasattr(faiss, "try_extract_index_ivf") else None
+        if ivf is not None:
+            ivf.nprobe = nprobe
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query_vector: Sequence[float], topk: int = 3) -> List[Tuple[str, str, float]]:
+        query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        query_norm = np.linalg.norm(query)
+        if query_norm > 0:
+            query = query / query_norm
+        scores, rows = self.index.search(query, min(topk, len(self.ids)))
+        return [(self.ids[row], self.texts[row], float(score)) for row, score in zip(rows[0], scores[0]) if row >= 0]
+
+
+def build_faiss_index(matrix: np.ndarray, kind: str = "hnsw", hnsw_m: int = 32, ef_construction: int = 200, nlist: int = None):
+    """Build a faiss inner-product index over rows of an L2-normalized float32 matrix."""
+    import faiss
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    n_chunks, dim = matrix.shape
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    elif kind == "ivf":
+        # Rule of thumb: about sqrt(N) clusters, with at least 39 training points per cluster.
+        nlist = nlist or max(1, min(int(np.sqrt(n_chunks)), n_chunks // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(matrix)
+    else:
+        raise ValueError(f"unknown ANN index kind {kind}, expected one of {ANN_KINDS}")
+    index.add(matrix)
+    return index
+
+
+def build(policy_path: str, kind: str = "hnsw", **params) -> str:
+    """Build and save the ANN index for a policy file, converting it into a store first when needed."""
+    import faiss
+    prefix = policy_store.store_prefix(policy_path)
+    if not policy_store.has_store(prefix) or policy_store.is_stale(prefix, prefix + ".json"):
+        policy_store.convert(prefix + ".json", prefix)
+    matrix = np.load(prefix + policy_store.MATRIX_SUFFIX, mmap_mode="r")
+    index = build_faiss_index(matrix, kind, **params)
+    path = ann_index_path(prefix, kind)
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def open_ann_index(prefix: str, kind: str) -> AnnPolicyIndex:
+    """Load a prebuilt ANN index with the ids and texts of its store; search knobs come from POLICY_ANN_EF_SEARCH and POLICY_ANN_NPROBE."""
+    import faiss
+    index = faiss.read_index(ann_index_path(prefix, kind))
+    with open(prefix + policy_store.SIDECAR_SUFFIX) as file:
+        sidecar = json.load(file)
+    return AnnPolicyIndex(sidecar["ids"], sidecar["texts"], index,
+                          ef_search=int(os.getenv("POLICY_ANN_EF_SEARCH", "64")),
+                          nprobe=int(os.getenv("POLICY_ANN_NPROBE", "8")))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Build approximate nearest neighbour indexes for policy files.")
+    arg_parser.add_argument("policy_files", nargs="+", help="policy JSON files or converted stores")
+    arg_parser.add_argument("--kind", choices=ANN_KINDS, default="hnsw")
+    arg_parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW graph degree")
+    arg_parser.add_argument("--ef-construction", type=int, default=200, help="HNSW build-time candidate list size")
+    arg_parser.add_argument("--nlist", type=int, help="IVF cluster count (default: about sqrt of the chunk count)")
+    args = arg_parser.parse_args()
+    for policy_file in args.policy_files:
+        start = time.perf_counter()
+        params = {"hnsw_m": args.hnsw_m, "ef_construction": args.ef_construction} if args.kind == "hnsw" else {"nlist": args.nlist}
+        path = build(policy_file, args.kind, **params)
+        print(f"{policy_file} -> {path} in {time.perf_counter() - start:.2f}s")
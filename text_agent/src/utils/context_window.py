@@ -0,0 +1,159 @@
+#Keeps the conversation sent to the model under a token budget: recent turns verbatim, older tool payloads dropped, the rest folded into a rolling summary.
+import os
+from typing import Callable, List, Optional, Tuple
+
+from agent_common.token_counter import TokenCounter, get_token_counter, message_fields
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+HANDOFF_NOTE = "The conversation was handed over here to the agent that greeted the customer with: "
+
+
+def extractive_summary(previous_summary: str, messages: List[dict], max_tokens: int, counter: TokenCounter) -> str:
+    """Summary without a model call: the previous summary followed by the folded exchanges, oldest lines dropped first to fit `max_tokens`."""
+    lines = previous_summary.split("\n") if previous_summary else []
+    lines += [f"{role}: {' '.join(content.split())}" for role, content, _ in map(message_fields, messages) if content]
+    while lines and counter.count_text("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ContextWindow:
+    """
+    Compacts a stored conversation at the start of each turn.
+
+    - The last `keep_turns` turns (a turn starts at a user message) stay verbatim, tool calls and results included.
+    - Older turns lose their tool calls and tool results (stale payloads: customer records, knowledge base
+      excerpts), keeping the user questions and assistant answers, the text of an answer that also called tools
+      included.
+    - When the conversation is still over `budget_tokens`, those older turns are folded into a rolling summary
+      system message of at most `summary_tokens`, updated with `summarize_fn(previous summary, messages,
+      max tokens)`; the extractive summary is used when no summarizer is given or it fails.
+    System messages (agent personas, handoffs included) are always kept, a handoff persona with the greeting
+    that follows it. Folding moves the summary after the handoffs it covers, so the summarized messages carry a
+    HANDOFF_NOTE where each handoff was, and the latest persona is never followed by its greeting alone.
+
+    Folded messages are replaced by the summary in the conversation that is stored, so the older turns found
+    after the summary are exactly those not summarized yet. The summary is only refreshed once they reach
+    `fold_tokens`: a long conversation pays one summarizer call every few turns instead of one per turn, and
+    may go over the budget by up to `fold_tokens` in between.
+
+    Args:
+        budget_tokens (int): Conversation size that triggers folding into the summary.
+        keep_turns (int): Recent turns kept verbatim.
+        summary_tokens (int): Maximum size of the rolling summary.
+        fold_tokens (int): Older turns not summarized yet that trigger a summary refresh, a quarter of the budget by default.
+        summarize_fn (callable): Optional model-backed summarizer.
+        counter (TokenCounter): Shared token counter.
+    """
+
+    def __init__(self, budget_tokens: int = 4000, keep_turns: int = 2, summary_tokens: int = 400, fold_tokens: Optional[int] = None,
+                 summarize_fn: Optional[Callable[[str, List[dict], int], str]] = None, counter: Optional[TokenCounter] = None):
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.fold_tokens = budget_tokens // 4 if fold_tokens is None else fold_tokens
+        self.summarize_fn = summarize_fn
+        self.counter = counter or get_token_counter()
+
+    def compact(self, conversation: list) -> Tuple[list, dict]:
+        """Return the compacted conversation and a report with its token counts before and after."""
+        before = self.counter.total(conversation)
+        report = {"tokens_before": before, "tokens_after": before, "tool_messages_dropped": 0, "messages_summarized": 0}
+        preamble, turns = split_turns(conversation)
+        if len(turns) <= self.keep_turns:
+            return conversation, report
+        previous_summary = ""
+        kept_preamble = []
+        for message in preamble:
+            role, content, _ = message_fields(message)
+            if role == "system" and content.startswith(SUMMARY_PREFIX):
+                previous_summary = content[len(SUMMARY_PREFIX):]
+            else:
+                kept_preamble.append(message)
+        split = len(turns) - self.keep_turns
+        old = [message for turn in turns[:split] for message in turn]
+        recent = [message for turn in turns[split:] for message in turn]
+        stripped = []
+        for message in old:
+            role, content, tool_calls = message_fields(message)
+            if role == "tool" or tool_calls:
+                report["tool_messages_dropped"] += 1
+                if role == "assistant" and content:
+                    stripped.append({"role": "assistant", "content": content})
+            elif role == "system" or content:
+                stripped.append(message)
+
+        def assemble(handoffs, summary, old_messages):
+            summary_message = [{"role": "system", "content": SUMMARY_PREFIX + summary}] if summary else []
+            return kept_preamble + handoffs + summary_message + old_messages + recent
+
+        compacted = assemble([], previous_summary, stripped)
+        handoffs, to_fold = split_handoffs(stripped)
+        if self.counter.total(compacted) > self.budget_tokens and to_fold and self.counter.total(to_fold) >= self.fold_tokens:
+            summary = self.summarize(previous_summary, to_fold)
+            compacted = assemble(handoffs, summary, [])
+            report["messages_summarized"] = len(to_fold)
+        report["tokens_after"] = self.counter.total(compacted)
+        return compacted, report
+
+    def summarize(self, previous_summary: str, messages: List[dict]) -> str:
+        if self.summarize_fn is not None:
+            try:
+                summary = self.summarize_fn(previous_summary, messages, self.summary_tokens)
+                if summary:
+                    return summary
+            except Exception as e:
+                print("summarizer failed, using the extractive summary:", e)
+        return extractive_summary(previous_summary, messages, self.summary_tokens, self.counter)
+
+
+def split_handoffs(messages: list) -> Tuple[list, list]:
+    """
+    (handoff personas each with the greeting that follows it, the other messages) of stripped older turns; each
+    handoff is replaced in the other messages by a HANDOFF_NOTE with its greeting, to keep its place in the summary.
+    """
+    handoffs = []
+    others = []
+    i = 0
+    while i < len(messages):
+        if message_fields(messages[i])[0] != "system":
+            others.append(messages[i])
+            i += 1
+            continue
+        handoff = messages[i:i + 2] if i + 1 < len(messages) and message_fields(messages[i + 1])[0] == "assistant" else messages[i:i + 1]
+        greeting = message_fields(handoff[-1])[1] if len(handoff) == 2 else ""
+        handoffs += handoff
+        others.append({"role": "system", "content": HANDOFF_NOTE + greeting})
+        i += len(handoff)
+    return handoffs, others
+
+
+def split_turns(conversation: list) -> Tuple[list, List[list]]:
+    """(messages before the first user message, [turn, ...]) where every turn starts with a user message."""
+    preamble = []
+    turns = []
+    for message in conversation:
+        if message_fields(message)[0] == "user":
+            turns.append([message])
+        elif turns:
+            turns[-1].append(message)
+        else:
+            preamble.append(message)
+    return preamble, turns
+
+
+def get_context_window(summarize_fn: Optional[Callable[[str, List[dict], int], str]] = None) -> Optional[ContextWindow]:
+    """
+    Context window configured with CONTEXT_TOKEN_BUDGET (0 turns compaction off), CONTEXT_KEEP_TURNS,
+    CONTEXT_SUMMARY_TOKENS and CONTEXT_FOLD_TOKENS; `summarize_fn` is used unless CONTEXT_SUMMARIZER is "extractive".
+    """
+    budget_tokens = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+    if budget_tokens <= 0:
+        return None
+    if os.getenv("CONTEXT_SUMMARIZER", "llm").lower() == "extractive":
+        summarize_fn = None
+    return ContextWindow(budget_tokens=budget_tokens,
+                         keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "2")),
+                         summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "400")),
+                         fold_tokens=int(os.getenv("CONTEXT_FOLD_TOKENS")) if os.getenv("CONTEXT_FOLD_TOKENS") else None,
+                         summarize_fn=summarize_fn)
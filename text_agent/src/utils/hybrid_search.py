@@ -0,0 +1,127 @@
+#Hybrid knowledge base search: BM25 keyword scores fused with vector similarity, plus a lexical-only fast path.
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from src.utils.lexical_index import BM25Index
+from src.utils.policy_index import top_k_rows
+
+#Print a stats line every this many searches
+STATS_EVERY = 100
+
+
+class HybridSearch:
+    """
+    Knowledge base search over a vector index (PolicyIndex or AnnPolicyIndex) and a BM25 index of the same chunks.
+
+    A question is first scored lexically. When its best keyword hit covers at least `fast_path_coverage`
+    of the question's terms (weighted by idf) and beats the runner-up by `fast_path_margin`, the lexical
+    results are returned without calling the embedding API. Otherwise the question is embedded and the
+    vector results are fused with the lexical ones by weighted reciprocal rank fusion.
+
+    Args:
+        vector_index: Index with `ids`, `texts` and `search(query_vector, topk)`.
+        lexical_weight (float): Weight of the BM25 ranking in the fusion, 0 keeps pure vector ranking.
+        fast_path_coverage (float): Minimum idf-weighted term coverage of the top keyword hit, 0 disables the fast path.
+        fast_path_margin (float): Minimum ratio between the top and the second BM25 score for the fast path.
+        candidates (int): Results taken from each ranking before fusion.
+        rrf_k (int): Reciprocal rank fusion constant; larger values flatten the rank contributions.
+    """
+
+    def __init__(self, vector_index, lexical_weight: float = 0.0, fast_path_coverage: float = 0.0,
+                 fast_path_margin: float = 1.3, candidates: int = 20, rrf_k: int = 60):
+        self.vector_index = vector_index
+        self.lexical_weight = lexical_weight
+        self.fast_path_coverage = fast_path_coverage
+        self.fast_path_margin = fast_path_margin
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.ids = list(vector_index.ids)
+        self.texts = list(vector_index.texts)
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self.lexical_index = BM25Index(self.texts) if lexical_weight > 0 or fast_path_coverage > 0 else None
+        self.queries = 0
+        self.fast_path_hits = 0
+        self.latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def search(self, question: str, embed_fn: Callable[[str], Sequence[float]], topk: int = 3) -> List[Tuple[str, str, float]]:
+        """Top-k (id, text, score) tuples for a question; `embed_fn` is only called when the fast path does not apply."""
+        start = time.perf_counter()
+        fast_path = False
+        try:
+            if self.lexical_index is None:
+                return self.vector_index.search(embed_fn(question), topk=topk)
+            scores, coverage = self.lexical_index.scores(question)
+            lexical_rows = top_k_rows(scores, min(max(self.candidates, topk), len(scores)))
+            lexical_rows = lexical_rows[scores[lexical_rows] > 0]
+            if self._confident(scores, coverage, lexical_rows):
+                fast_path = True
+                return [(self.ids[row], self.texts[row], float(scores[row])) for row in lexical_rows[:topk]]
+            vector_results = self.vector_index.search(embed_fn(question), topk=max(self.candidates, topk))
+            if self.lexical_weight <= 0:
+                return vector_results[:topk]
+            return self._fuse(vector_results, lexical_rows, topk)
+        finally:
+            self._record(time.perf_counter() - start, fast_path)
+
+    def stats(self) -> Dict[str, float]:
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {"queries": self.queries, "fast_path_hits": self.fast_path_hits,
+                "fast_path_rate": self.fast_path_hits / self.queries if self.queries else 0.0,
+                "mean_ms": float(latencies.mean()), "p50_ms": float(np.percentile(latencies, 50)), "p95_ms": float(np.percentile(latencies, 95))}
+
+    def _confident(self, scores: np.ndarray, coverage: np.ndarray, lexical_rows: np.ndarray) -> bool:
+        if self.fast_path_coverage <= 0 or len(lexical_rows) == 0:
+            return False
+        top = lexical_rows[0]
+        if coverage[top] < self.fast_path_coverage:
+            return False
+        return len(lexical_rows) == 1 or scores[top] >= self.fast_path_margin * scores[lexical_rows[1]]
+
+    def _fuse(self, vector_results: List[Tuple[str, str, float]], lexical_rows: np.ndarray, topk: int) -> List[Tuple[str, str, float]]:
+        fused: Dict[int, float] = {}
+        for rank, result in enumerate(vector_results):
+            row = self.rows[result[0]]
+            fused[row] = fused.get(row, 0.0) + (1 - self.lexical_weight) / (self.rrf_k + rank + 1)
+        for rank, row in enumerate(lexical_rows.tolist()):
+            fused[row] = fused.get(row, 0.0) + self.lexical_weight / (self.rrf_k + rank + 1)
+        ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:topk]
+        return [(self.ids[row], self.texts[row], score) for row, score in ranked]
+
+    def _record(self, seconds: float, fast_path: bool) -> None:
+        with self._lock:
+            self.queries += 1
+            self.fast_path_hits += fast_path
+            self.latencies.append(seconds)
+            report = self.queries % STATS_EVERY == 0
+        if report:
+            print("knowledge base search stats", self.stats())
+
+
+_searches = weakref.WeakKeyDictionary()
+_searches_lock = threading.Lock()
+
+
+def get_hybrid_search(vector_index) -> HybridSearch:
+    """
+    Process-wide HybridSearch for a vector index, configured with POLICY_HYBRID_WEIGHT (BM25 weight in the
+    fusion, default 0), POLICY_LEXICAL_FAST_PATH (term coverage needed to skip the embedding call, default
+    0 = off) and POLICY_LEXICAL_FAST_PATH_MARGIN. With both left at 0 searches are pure vector searches.
+    """
+    search = _searches.get(vector_index)
+    if search is None:
+        with _searches_lock:
+            search = _searches.get(vector_index)
+            if search is None:
+                search = HybridSearch(vector_index,
+                                      lexical_weight=float(os.getenv("POLICY_HYBRID_WEIGHT", "0")),
+                                      fast_path_coverage=float(os.getenv("POLICY_LEXICAL_FAST_PATH", "0")),
+                                      fast_path_margin=float(os.getenv("POLICY_LEXICAL_FAST_PATH_MARGIN", "1.3")))
+                _searches[vector_index] = search
+    return search
@@ -0,0 +1,216 @@
+#Local intent router: a TF-IDF + logistic regression model trained on the labeled routing conversations, used before the LLM classifier.
+#Train it once with: python -m src.utils.intent_router train
+import argparse
+import json
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "voice_agent", "intent_detection_model")
+DEFAULT_TRAIN_FILE = os.path.join(DATA_DIR, "training_data_v2.jsonl")
+DEFAULT_VALIDATION_FILE = os.path.join(DATA_DIR, "validation_data_v2.jsonl")
+DEFAULT_MODEL_PREFIX = "../data/intent_router"
+WEIGHTS_SUFFIX = ".npz"
+SIDECAR_SUFFIX = ".meta.json"
+#Routing labels that are named differently from the text agents
+LABEL_TO_AGENT = {"general_agent": "generic_agent"}
+#Same tokens as scikit-learn's default token_pattern
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def last_user_line(conversation: str) -> str:
+    """The last `user:` line of a routing conversation, which decides the intent when the customer changes topic."""
+    lines = [line for line in conversation.split("\n") if line.startswith("user:")]
+    return lines[-1] if lines else conversation
+
+
+#Texts a conversation is featurized from, each with its own vocabulary and its own L2-normalized block of features
+FIELDS = (lambda conversation: conversation, last_user_line)
+
+
+class IntentRouter:
+    """
+    Scores a request with a linear model over sublinear TF-IDF word unigrams and bigrams of the whole
+    conversation and, separately, of its last user line. Prediction is done with plain dictionary lookups and
+    one small matrix product rather than the scikit-learn pipeline, which spends most of a single prediction
+    on input validation.
+
+    Args:
+        vocabulary (dict): Term to feature column, per field; columns are numbered across fields.
+        idf (np.ndarray): Inverse document frequency per feature.
+        coef (np.ndarray): (features, labels) weights of the logistic regression.
+        intercept (np.ndarray): Bias per label.
+        labels (list): Routing labels, in coef column order.
+        metadata (dict): Training settings and validation report stored with the model.
+    """
+
+    def __init__(self, vocabulary: List[Dict[str, int]], idf: np.ndarray, coef: np.ndarray, intercept: np.ndarray,
+                 labels: List[str], metadata: dict = None):
+        self.vocabulary = vocabulary
+        self.idf = idf.astype(np.float32)
+        self.coef = np.ascontiguousarray(coef, dtype=np.float32)
+        self.intercept = intercept.astype(np.float32)
+        self.labels = list(labels)
+        self.agents = [LABEL_TO_AGENT.get(label, label) for label in self.labels]
+        self.metadata = metadata or {}
+
+    def features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Column indices and TF-IDF values of the terms of `text` that are in the vocabulary, normalized per field."""
+        all_columns, all_values = [], []
+        for field, vocabulary in zip(FIELDS, self.vocabulary):
+            tokens = TOKEN_PATTERN.findall(field(text).lower())
+            counts: Dict[int, int] = {}
+            for term in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                column = vocabulary.get(term)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            if not counts:
+                continue
+            columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * self.idf[columns]
+            all_columns.append(columns)
+            all_values.append(values / np.linalg.norm(values))
+        if not all_columns:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(all_columns), np.concatenate(all_values)
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        columns, values = self.features(text)
+        logits = values @ self.coef[columns] + self.intercept
+        logits = np.exp(logits - logits.max())
+        return logits / logits.sum()
+
+    def rank(self, text: str, candidates: Iterable[str] = None, exclude: str = None) -> List[Tuple[str, float]]:
+        """(agent, probability) for the agents among `candidates` (all agents when None) other than `exclude`, most likely first."""
+        return self.rank_probabilities(self.predict_proba(text), candidates, exclude)
+
+    def rank_probabilities(self, probabilities: np.ndarray, candidates: Iterable[str] = None, exclude: str = None) -> List[Tuple[str, float]]:
+        """
+        rank from the output of predict_proba. The probabilities are renormalized without `exclude`, so they are
+        those of the request belonging to each agent given that it does not belong to `exclude`. Labels that are
+        not among `candidates` keep their share: a request most likely for an agent that does not exist here
+        does not become a confident request for one that does.
+        """
+        if exclude in self.agents:
+            remaining = 1.0 - float(probabilities[self.agents.index(exclude)])
+            probabilities = probabilities / remaining if remaining > 0 else np.zeros_like(probabilities)
+        allowed = set(candidates) if candidates is not None else set(self.agents)
+        ranked = [(agent, float(probability)) for agent, probability in zip(self.agents, probabilities) if agent in allowed and agent != exclude]
+        return sorted(ranked, key=lambda item: item[1], reverse=True)
+
+    def route(self, text: str, candidates: Iterable[str] = None, exclude: str = None) -> Tuple[Optional[str], float]:
+        """
+        Best agent for `text` among `candidates` (all agents when None) other than `exclude`, with its probability.
+        Returns (None, 0.0) when no label of the model maps to an allowed agent.
+        """
+        ranked = self.rank(text, candidates, exclude)
+        return ranked[0] if ranked else (None, 0.0)
+
+    def save(self, prefix: str) -> None:
+        np.savez(prefix + ".tmp" + WEIGHTS_SUFFIX, idf=self.idf, coef=self.coef, intercept=self.intercept)
+        with open(prefix + ".tmp" + SIDECAR_SUFFIX, "w") as file:
+            json.dump({"labels": self.labels, "vocabulary": self.vocabulary, **self.metadata}, file)
+        os.replace(prefix + ".tmp" + WEIGHTS_SUFFIX, prefix + WEIGHTS_SUFFIX)
+        os.replace(prefix + ".tmp" + SIDECAR_SUFFIX, prefix + SIDECAR_SUFFIX)
+
+    @classmethod
+    def load(cls, prefix: str) -> "IntentRouter":
+        with open(prefix + SIDECAR_SUFFIX) as file:
+            sidecar = json.load(file)
+        with np.load(prefix + WEIGHTS_SUFFIX) as weights:
+            return cls(sidecar.pop("vocabulary"), weights["idf"], weights["coef"], weights["intercept"], sidecar.pop("labels"), sidecar)
+
+
+def read_examples(path: str) -> Tuple[List[str], List[str]]:
+    texts, labels = [], []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                example = json.loads(line)
+                texts.append(example["conversation"])
+                labels.append(example["intent"])
+    return texts, labels
+
+
+def train(texts: List[str], labels: List[str], c: float = 10.0, min_df: int = 1) -> IntentRouter:
+    from scipy.sparse import hstack
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    blocks, vocabulary, idf = [], [], []
+    offset = 0
+    for field in FIELDS:
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=min_df)
+        blocks.append(vectorizer.fit_transform([field(text) for text in texts]))
+        vocabulary.append({term: int(column) + offset for term, column in vectorizer.vocabulary_.items()})
+        idf.append(vectorizer.idf_)
+        offset += len(vectorizer.vocabulary_)
+    classifier = LogisticRegression(C=c, max_iter=3000).fit(hstack(blocks).tocsr(), labels)
+    return IntentRouter(vocabulary, np.concatenate(idf), classifier.coef_.T, classifier.intercept_, list(classifier.classes_),
+                        {"c": c, "min_df": min_df, "examples": len(texts)})
+
+
+def evaluate(router: IntentRouter, texts: List[str], labels: List[str], thresholds=(0.0, 0.5, 0.6, 0.7, 0.8, 0.9)) -> dict:
+    """Accuracy, and for each confidence threshold the share routed locally and their accuracy, plus route() latency."""
+    predictions, confidences, latencies = [], [], []
+    for text in texts:
+        start = time.perf_counter()
+        probabilities = router.predict_proba(text)
+        latencies.append(time.perf_counter() - start)
+        predictions.append(router.labels[int(np.argmax(probabilities))])
+        confidences.append(float(np.max(probabilities)))
+    correct = np.array(predictions) == np.array(labels)
+    confidences = np.array(confidences)
+    latencies = np.array(latencies) * 1000
+    per_label = {label: round(float(correct[np.array(labels) == label].mean()), 4) for label in router.labels}
+    by_threshold = []
+    for threshold in thresholds:
+        local = confidences >= threshold
+        by_threshold.append({"threshold": threshold, "coverage": round(float(local.mean()), 4),
+                             "accuracy": round(float(correct[local].mean()), 4) if local.any() else None})
+    return {"examples": len(texts), "accuracy": round(float(correct.mean()), 4), "per_label_accuracy": per_label,
+            "by_threshold": by_threshold, "latency_ms": {"p50": round(float(np.percentile(latencies, 50)), 4),
+                                                          "p99": round(float(np.percentile(latencies, 99)), 4)}}
+
+
+def load_intent_router(agent_names: List[str]) -> Optional[IntentRouter]:
+    """
+    The router stored at INTENT_ROUTER_MODEL (default ../data/intent_router), or None when INTENT_ROUTER_MODEL is
+    empty or the model is missing, in which case intents are classified by the LLM only.
+    """
+    prefix = os.getenv("INTENT_ROUTER_MODEL", DEFAULT_MODEL_PREFIX)
+    if not prefix:
+        return None
+    if not os.path.exists(prefix + WEIGHTS_SUFFIX):
+        print(f"intent router model {prefix} not found, classifying intents with the LLM only")
+        return None
+    router = IntentRouter.load(prefix)
+    print("intent router loaded, routes to", [agent for agent in router.agents if agent in agent_names])
+    return router
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Train or evaluate the local intent router.")
+    arg_parser.add_argument("command", choices=["train", "evaluate"])
+    arg_parser.add_argument("--train-file", default=DEFAULT_TRAIN_FILE)
+    arg_parser.add_argument("--validation-file", default=DEFAULT_VALIDATION_FILE)
+    arg_parser.add_argument("--model", default=DEFAULT_MODEL_PREFIX, help="model path without suffix")
+    arg_parser.add_argument("--c", type=float, default=10.0, help="inverse regularization strength")
+    arg_parser.add_argument("--min-df", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    if args.command == "train":
+        start = time.perf_counter()
+        router = train(*read_examples(args.train_file), c=args.c, min_df=args.min_df)
+        print(f"trained on {router.metadata['examples']} examples, {len(router.idf)} features in {time.perf_counter() - start:.2f}s")
+    else:
+        router = IntentRouter.load(args.model)
+    report = evaluate(router, *read_examples(args.validation_file))
+    print(json.dumps(report, indent=2))
+    if args.command == "train":
+        router.metadata["validation"] = report
+        router.save(args.model)
+        print("saved", args.model + WEIGHTS_SUFFIX, args.model + SIDECAR_SUFFIX)
@@ -0,0 +1,84 @@
+#BM25 inverted index over policy chunk texts, used next to the vector index for keyword-heavy questions.
+import math
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from has have how i if in is it its me my of on or our
+please should so than that the their them there these they this to us was we what when where which who
+will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms without stopwords; a trailing plural `s` is dropped so `bags` matches `bag`."""
+    terms = []
+    for term in re.findall(r"[a-z0-9]+", text.lower()):
+        if term in STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of chunk texts.
+
+    The inverted index is precomputed at construction: every term maps to the rows containing it and
+    the BM25 weight of the term in each of those rows, so scoring a query is one scatter-add per query
+    term instead of a pass over every chunk.
+
+    Args:
+        texts (list): Chunk texts, one per row of the vector index they are searched alongside.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.n_docs = len(texts)
+        docs = [tokenize(text) for text in texts]
+        lengths = np.array([len(doc) for doc in docs], dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.n_docs and lengths.sum() else 1.0
+        frequencies: Dict[str, Dict[int, int]] = {}
+        for row, doc in enumerate(docs):
+            for term in doc:
+                postings = frequencies.setdefault(term, {})
+                postings[row] = postings.get(row, 0) + 1
+        self.idf: Dict[str, float] = {}
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, postings in frequencies.items():
+            rows = np.fromiter(postings.keys(), dtype=np.int32, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = self.term_idf(len(postings))
+            weights = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[rows] / avg_length))
+            self.idf[term] = idf
+            self.postings[term] = (rows, weights.astype(np.float32))
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def term_idf(self, doc_freq: int) -> float:
+        return math.log(1 + (self.n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 score of every row, and the share of the query's idf mass each row covers (1.0 when a row
+        contains every query term; terms unknown to the corpus count against every row).
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        coverage = np.zeros(self.n_docs, dtype=np.float32)
+        total_idf = 0.0
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term, self.term_idf(0))
+            total_idf += idf
+            if term in self.postings:
+                rows, weights = self.postings[term]
+                scores[rows] += weights
+                coverage[rows] += idf
+        if total_idf > 0:
+            coverage /= total_idf
+        return scores, coverage
@@ -0,0 +1,155 @@
+#Vectorized cosine-similarity index over policy chunks used by the knowledge base search tools.
+import json
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+#Rows converted back to float32 at a time when scanning quantized codes; small enough to stay in CPU cache
+SCAN_BLOCK_ROWS = 128
+
+
+class PolicyIndex:
+    """
+    In-memory index of policy chunks for top-k cosine similarity search.
+
+    All `policy_text_embedding` vectors are L2-normalized once at load time and kept in a single
+    contiguous float32 matrix, so a query is answered with one matrix-vector product followed by a
+    partial selection of the top-k rows instead of a Python loop over every chunk.
+
+    With `precision` set to float16 or int8 (int8 codes with one float32 scale per vector) a quantized copy
+    of the matrix is scanned instead to pick the best `shortlist` candidates, which are then re-ranked
+    exactly against the float32 matrix. Open the index from a memory-mapped store (see policy_store) to
+    benefit from the smaller footprint: the float32 rows then stay on disk / in the shared page cache and
+    only the shortlisted ones are read per query.
+
+    Args:
+        ids (list): Chunk ids, one per row of `matrix`.
+        texts (list): Chunk texts, one per row of `matrix`.
+        matrix (np.ndarray): (n_chunks, dim) matrix of chunk embeddings. A float32 C-contiguous matrix is
+            used as is (and normalized in place), anything else is converted first.
+        normalized (bool): Set to True when the rows of `matrix` are already L2-normalized.
+        precision (str): float32 (exact scan), float16 or int8 (quantized scan plus exact re-ranking).
+        shortlist (int): Candidates re-ranked exactly in the quantized modes.
+    """
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], matrix: np.ndarray, normalized: bool = False,
+                 precision: str = "float32", shortlist: int = 32):
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown precision {precision}, expected one of {PRECISIONS}")
+        if len(ids) != len(texts) or len(ids) != len(matrix):
+            raise ValueError("ids, texts and matrix must have the same number of rows")
+        self.ids = list(ids)
+        self.texts = list(texts)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if not normalized:
+            matrix = normalize_rows(matrix)
+        self.matrix = matrix
+        self.precision = precision
+        self.shortlist = shortlist
+        self.codes, self.scales = quantize(matrix, precision)
+
+    @classmethod
+    def from_chunks(cls, chunks: List[dict], **kwargs) -> "PolicyIndex":
+        """Build the index from the policy JSON records (`id`, `policy_text`, `policy_text_embedding`)."""
+        ids = [item['id'] for item in chunks]
+        texts = [item['policy_text'] for item in chunks]
+        if chunks:
+            matrix = np.array([item['policy_text_embedding'] for item in chunks], dtype=np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return cls(ids, texts, matrix, **kwargs)
+
+    @classmethod
+    def from_json_file(cls, file_path: str, **kwargs) -> "PolicyIndex":
+        with open(file_path) as file:
+            return cls.from_chunks(json.load(file), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query_vector: Sequence[float], topk: int = 3) -> List[Tuple[str, str, float]]:
+        """Return the top-k (id, text, cosine similarity) tuples, best match first."""
+        n_chunks = len(self.ids)
+        topk = min(topk, n_chunks)
+        if topk <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm > 0:
+            query = query / query_norm
+        if self.codes is None:
+            scores = self.matrix @ query
+            top_rows = top_k_rows(scores, topk)
+            return [(self.ids[row], self.texts[row], float(scores[row])) for row in top_rows]
+        # Approximate pass over the quantized codes, then exact re-ranking of the shortlist.
+        candidates = np.sort(top_k_rows(self.approximate_scores(query), min(max(self.shortlist, topk), n_chunks)))
+        scores = self.matrix[candidates] @ query
+        top_rows = candidates[top_k_rows(scores, topk)]
+        exact = dict(zip(candidates.tolist(), scores.tolist()))
+        return [(self.ids[row], self.texts[row], exact[row]) for row in top_rows]
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Scores of every chunk computed from the quantized codes, one cache-sized block at a time."""
+        n_chunks = len(self.codes)
+        scores = np.empty(n_chunks, dtype=np.float32)
+        block = np.empty((SCAN_BLOCK_ROWS, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, n_chunks, SCAN_BLOCK_ROWS):
+            codes = self.codes[start:start + SCAN_BLOCK_ROWS]
+            rows = block[:len(codes)]
+            np.copyto(rows, codes, casting="unsafe")
+            np.dot(rows, query, out=scores[start:start + len(codes)])
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def nbytes(self) -> int:
+        """Bytes of the representation scanned on every query (the float32 matrix, or the quantized codes and scales)."""
+        if self.codes is None:
+            return self.matrix.nbytes
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize every row of a float32 matrix in place; all-zero rows are left untouched."""
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def quantize(matrix: np.ndarray, precision: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Quantized codes (and per-vector scales for int8) of a float32 matrix, built block by block so no
+    full-size temporary is allocated. Returns (None, None) for float32.
+    """
+    if precision == "float32" or matrix.size == 0:
+        return None, None
+    if precision == "float16":
+        return matrix.astype(np.float16), None
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    scales = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), 65536):
+        block = np.asarray(matrix[start:start + 65536], dtype=np.float32)
+        block_scales = np.abs(block).max(axis=1) / 127
+        block_scales[block_scales == 0] = 1.0
+        codes[start:start + len(block)] = np.rint(block / block_scales[:, None])
+        scales[start:start + len(block)] = block_scales
+    return codes, scales
+
+
+def top_k_rows(scores: np.ndarray, topk: int) -> np.ndarray:
+    """Indices of the `topk` highest scores, best first; ties keep the original row order."""
+    if topk < len(scores):
+        candidates = np.argpartition(-scores, topk - 1)[:topk]
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def format_results(results: List[Tuple[str, str, float]]) -> str:
+    """Render search results the way the knowledge base tools return them to the model."""
+    return "\n".join(f"{chunk[0]}\n{chunk[1]}" for chunk in results)
@@ -0,0 +1,134 @@
+#Binary on-disk store for policy embeddings, memory-mapped read-only and shared by all agents and worker processes.
+#Convert a policy JSON file once with: python -m src.utils.policy_store ../data/flight_policy.json
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+import numpy as np
+
+from src.utils.policy_index import PolicyIndex, normalize_rows
+
+MATRIX_SUFFIX = ".npy"
+SIDECAR_SUFFIX = ".meta.json"
+
+_indexes: Dict[str, PolicyIndex] = {}
+_lock = threading.Lock()
+
+
+def store_prefix(path: str) -> str:
+    """Path of a store without its suffix; `flight_policy.json` and `flight_policy.npy` share the prefix `flight_policy`."""
+    for suffix in (SIDECAR_SUFFIX, MATRIX_SUFFIX, ".json"):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def convert(json_path: str, prefix: str = None) -> str:
+    """
+    Convert a policy JSON file (list of `id`, `policy_text`, `policy_text_embedding` records) into a store.
+
+    The store is a float32 `<prefix>.npy` matrix with L2-normalized rows plus a `<prefix>.meta.json`
+    sidecar holding the chunk ids and texts in row order. Returns the store prefix.
+    """
+    prefix = prefix or store_prefix(json_path)
+    with open(json_path) as file:
+        chunks = json.load(file)
+    matrix = np.array([item['policy_text_embedding'] for item in chunks], dtype=np.float32)
+    normalize_rows(matrix)
+    sidecar = {
+        "source": os.path.basename(json_path),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "ids": [item['id'] for item in chunks],
+        "texts": [item['policy_text'] for item in chunks],
+    }
+    # Write to temporary names first so a reader never maps a half-written store.
+    np.save(prefix + ".tmp" + MATRIX_SUFFIX, matrix)
+    with open(prefix + ".tmp" + SIDECAR_SUFFIX, "w") as file:
+        json.dump(sidecar, file)
+    os.replace(prefix + ".tmp" + MATRIX_SUFFIX, prefix + MATRIX_SUFFIX)
+    os.replace(prefix + ".tmp" + SIDECAR_SUFFIX, prefix + SIDECAR_SUFFIX)
+    return prefix
+
+
+def has_store(prefix: str) -> bool:
+    return os.path.exists(prefix + MATRIX_SUFFIX) and os.path.exists(prefix + SIDECAR_SUFFIX)
+
+
+def open_store(prefix: str, **kwargs) -> PolicyIndex:
+    """Open a converted store; the matrix is memory-mapped read-only, not read into the heap."""
+    matrix = np.load(prefix + MATRIX_SUFFIX, mmap_mode="r")
+    with open(prefix + SIDECAR_SUFFIX) as file:
+        sidecar = json.load(file)
+    return PolicyIndex(sidecar["ids"], sidecar["texts"], matrix, normalized=True, **kwargs)
+
+
+def is_stale(prefix: str, json_path: str, built_path: str = None) -> bool:
+    """True when the policy JSON is newer than a file built from it (the store matrix by default)."""
+    built_path = built_path or prefix + MATRIX_SUFFIX
+    return os.path.exists(json_path) and os.path.getmtime(json_path) > os.path.getmtime(built_path)
+
+
+def _open_ann_index(prefix: str, backend: str):
+    """The prebuilt ANN index for `backend`, or None (with a warning) when it is missing or out of date."""
+    from src.utils.ann_index import ann_index_path, open_ann_index
+    path = ann_index_path(prefix, backend)
+    if not has_store(prefix) or not os.path.exists(path) or is_stale(prefix, prefix + ".json", path):
+        print(f"POLICY_INDEX_BACKEND={backend} but {path} is missing or older than the policy file, using exact search")
+        return None
+    return open_ann_index(prefix, backend)
+
+
+def load_policy_index(path: str) -> PolicyIndex:
+    """
+    Return the process-wide PolicyIndex for a policy file.
+
+    `path` may point at the policy JSON or at a converted store. When a store that is at least as new as
+    the JSON exists next to it, the store is memory-mapped; otherwise the JSON is parsed. Either way the
+    index is built once per process and shared by every tool instance that asks for the same file.
+
+    POLICY_INDEX_BACKEND selects the search backend: `exact` (default) scans every chunk, `hnsw` and `ivf`
+    load the approximate index built offline with `python -m src.utils.ann_index`.
+    For exact search, POLICY_INDEX_PRECISION (float32, float16 or int8) selects the precision of the scan and
+    POLICY_INDEX_SHORTLIST how many candidates of a quantized scan are re-ranked at full precision.
+    """
+    key = os.path.abspath(path)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+    with _lock:
+        index = _indexes.get(key)
+        if index is None:
+            start = time.perf_counter()
+            prefix = store_prefix(path)
+            backend = os.getenv("POLICY_INDEX_BACKEND", "exact").lower()
+            index = _open_ann_index(prefix, backend) if backend != "exact" else None
+            if index is not None:
+                source = f"{backend} index"
+            else:
+                precision = os.getenv("POLICY_INDEX_PRECISION", "float32").lower()
+                options = {"precision": precision, "shortlist": int(os.getenv("POLICY_INDEX_SHORTLIST", "32"))}
+                if has_store(prefix) and not is_stale(prefix, prefix + ".json"):
+                    index = open_store(prefix, **options)
+                    source = f"memory-mapped store, {precision}"
+                else:
+                    index = PolicyIndex.from_json_file(prefix + ".json", **options)
+                    source = f"json, {precision}"
+            print(f"loaded {len(index)} policy chunks from {path} ({source}) in {time.perf_counter() - start:.3f}s")
+            _indexes[key] = index
+    return index
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Convert policy embedding JSON files into memory-mappable stores.")
+    arg_parser.add_argument("json_files", nargs="+", help="policy JSON files to convert")
+    arg_parser.add_argument("--out", help="store prefix, only valid with a single input file (default: input path without .json)")
+    args = arg_parser.parse_args()
+    if args.out and len(args.json_files) > 1:
+        arg_parser.error("--out can only be used with a single input file")
+    for json_file in args.json_files:
+        start = time.perf_counter()
+        prefix = convert(json_file, args.out)
+        print(f"{json_file} -> {prefix}{MATRIX_SUFFIX}, {prefix}{SIDECAR_SUFFIX} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,98 @@
+#All agent profiles compiled into one JSON bundle, so starting the service does not parse every YAML profile again.
+#Build it ahead of time (e.g. in the Docker image) with: python -m src.utils.profile_bundle
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import yaml
+
+PROFILE_SUFFIX = "_profile.yaml"
+COMMON_PROFILE = "common_agent_profile.yaml"
+BUNDLE_FILE = "profiles.bundle.json"
+TOOLS_PATH = os.path.join(os.path.dirname(__file__), "..", "agents", "tools")
+
+
+def profile_files(base_path: str) -> List[str]:
+    return sorted(f for f in os.listdir(base_path) if f.endswith(PROFILE_SUFFIX) or f == COMMON_PROFILE)
+
+
+def tool_files() -> List[str]:
+    return sorted(f for f in os.listdir(TOOLS_PATH) if f.endswith(".py"))
+
+
+def tool_modules(agent_name: str) -> List[str]:
+    """Tool modules of an agent: tools.py for every agent plus the modules whose file name contains the agent name."""
+    return sorted(f[:-3] for f in os.listdir(TOOLS_PATH) if (f.endswith(".py") and agent_name in f) or f == "tools.py")
+
+
+def compile_profiles(base_path: str) -> dict:
+    """
+    Parse the profiles in `base_path` into {"agents": {name: profile}, "common": common profile, "default_agent": name,
+    "tool_modules": {name: [module]}, "sources": {file: mtime}, "tool_sources": {file: mtime}}. Agent names come
+    from the profile file names; "tool_sources" are the tool modules the agents' modules were picked from.
+    """
+    agents = {}
+    common = {}
+    sources = {}
+    for file_name in profile_files(base_path):
+        path = os.path.join(base_path, file_name)
+        with open(path) as file:
+            profile = yaml.safe_load(file)
+        sources[file_name] = os.path.getmtime(path)
+        if file_name == COMMON_PROFILE:
+            common = profile
+        else:
+            agents[file_name[:-len(PROFILE_SUFFIX)]] = profile
+    default_agent = next((name for name, profile in agents.items() if profile.get("default_agent") == True), None)
+    return {"agents": agents, "common": common, "default_agent": default_agent,
+            "tool_modules": {name: tool_modules(profile["name"]) for name, profile in agents.items()}, "sources": sources,
+            "tool_sources": {file_name: os.path.getmtime(os.path.join(TOOLS_PATH, file_name)) for file_name in tool_files()}}
+
+
+def is_stale(bundle: dict, base_path: str) -> bool:
+    """True when a profile or a tool module was added, removed or modified since the bundle was compiled."""
+    for sources, folder, files in (("sources", base_path, profile_files(base_path)), ("tool_sources", TOOLS_PATH, tool_files())):
+        if sorted(bundle.get(sources, {})) != files or any(
+                os.path.getmtime(os.path.join(folder, file_name)) > bundle[sources][file_name] for file_name in files):
+            return True
+    return False
+
+
+def save_bundle(bundle: dict, path: str) -> None:
+    with open(path + ".tmp", "w") as file:
+        json.dump(bundle, file)
+    os.replace(path + ".tmp", path)
+
+
+def load_profiles(base_path: str) -> Dict:
+    """
+    The compiled profiles of `base_path`, read from the bundle at AGENT_PROFILE_BUNDLE (default: profiles.bundle.json
+    next to the profiles) when it is up to date, otherwise compiled from the YAML files in memory. Nothing is
+    written at runtime, so the service runs from a read-only image and leaves the working tree clean; the bundle
+    is only written by the build step (python -m src.utils.profile_bundle). An empty AGENT_PROFILE_BUNDLE always
+    compiles the YAML files.
+    """
+    bundle_path = os.getenv("AGENT_PROFILE_BUNDLE", os.path.join(base_path, BUNDLE_FILE))
+    if bundle_path and os.path.exists(bundle_path):
+        with open(bundle_path) as file:
+            bundle = json.load(file)
+        if not is_stale(bundle, base_path):
+            return bundle
+        print(f"profile bundle {bundle_path} is older than the profiles or tool modules, compiling the profiles; "
+              "rebuild it with: python -m src.utils.profile_bundle")
+    return compile_profiles(base_path)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compile the agent profiles into one bundle.")
+    arg_parser.add_argument("--profiles", default="src/agents/agent_profiles", help="folder of the YAML profiles")
+    arg_parser.add_argument("--out", help=f"bundle path (default: {BUNDLE_FILE} in the profiles folder)")
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    bundle = compile_profiles(args.profiles)
+    out = args.out or os.path.join(args.profiles, BUNDLE_FILE)
+    save_bundle(bundle, out)
+    print(f"compiled {len(bundle['agents'])} agent profiles into {out} in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,181 @@
+#Local semantic cache of answers to stateless questions, using the same schema as the Azure AI Search cache index in create_cache_index.py.
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+#Words that point back at the conversation ("is it the same", "my booking"): the answer depends on earlier turns,
+#often those with another agent before a handoff, even when the question is the first this agent is asked
+CONVERSATION_REFERENCE = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|same|above|earlier|previous|again|also|"
+    r"(my|our) (booking|bookings|reservation|reservations|flight|flights|ticket|tickets|trip|seat|seats|room|hotel|account|case|request))\b",
+    re.IGNORECASE)
+
+
+class SemanticCache:
+    """
+    In-process cache of `{"id", "question", "answer", "questionVector"}` entries, one namespace per agent.
+
+    A new question is embedded and compared with the cached questions of the same namespace; when the best
+    cosine similarity reaches `threshold` the stored answer can be returned without running the agent.
+
+    Admission rules: only answers produced without asking for help, by a turn that called at least one tool
+    and nothing but tools declared cacheable (knowledge base searches, which do not depend on the customer),
+    for standalone questions: `min_question_words` to `max_question_chars` long, not referring to the
+    conversation (CONVERSATION_REFERENCE) and not mentioning the customer's personal details. The question must
+    also be the opening question of its conversation: the caller neither looks up nor admits a question that
+    follows earlier turns, whose answer depends on that history.
+    Personal details (e.g. the customer's name from the persona) are replaced by placeholders in the stored
+    answer, and `render` fills in those of the customer it is served to.
+    Eviction: least recently used first once a namespace holds `max_entries` entries, and entries expire
+    after `ttl_seconds`.
+
+    Args:
+        embed_fn (callable): Returns the embedding of a text, e.g. Tool.get_embedding or a fake embedder.
+        threshold (float): Minimum cosine similarity between questions to serve a cached answer.
+        max_entries (int): Maximum entries per namespace.
+        ttl_seconds (float): Lifetime of an entry.
+        min_question_words (int): Shorter questions ("yes", "do it") depend on the conversation and are never admitted.
+        max_question_chars (int): Longer questions are too specific to be worth caching.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], List[float]], threshold: float = 0.95, max_entries: int = 1000,
+                 ttl_seconds: float = 86400, min_question_words: int = 4, max_question_chars: int = 300):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_question_words = min_question_words
+        self.max_question_chars = max_question_chars
+        self._namespaces: Dict[str, "OrderedDict[str, dict]"] = {}
+        self._matrices: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def standalone(self, question: str, personal_details: Optional[Dict[str, str]] = None) -> bool:
+        """Whether the question can be answered without the conversation or the customer; only those are looked up or admitted."""
+        return (len(question) <= self.max_question_chars and len(re.findall(r"\w+", question)) >= self.min_question_words
+                and not CONVERSATION_REFERENCE.search(question)
+                and not any(_mentions(question, value) for value in (personal_details or {}).values()))
+
+    def lookup(self, namespace: str, question_vector: np.ndarray) -> Optional[dict]:
+        """Return the closest cached entry at or above the similarity threshold, or None."""
+        with self._lock:
+            self._expire(namespace)
+            entry_ids, matrix = self._matrix(namespace)
+            if not entry_ids:
+                self.misses += 1
+                return None
+            scores = matrix @ question_vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entries = self._namespaces[namespace]
+            entries.move_to_end(entry_ids[best])
+            self.hits += 1
+            return entries[entry_ids[best]]
+
+    def admit(self, namespace: str, question: str, answer: str, question_vector: np.ndarray,
+              tools_used: Iterable[str], cacheable_tools: Iterable[str], personal_details: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Store the answer if the turn passes the admission rules; returns whether it was stored. `personal_details`
+        maps placeholder names to the values of the customer who asked, e.g. {"customer_name": "John Doe"}.
+        """
+        tools_used, cacheable_tools = set(tools_used), set(cacheable_tools)
+        if not answer or not tools_used or not tools_used <= cacheable_tools or not self.standalone(question, personal_details):
+            self.rejected += 1
+            return False
+        for name, value in sorted((personal_details or {}).items(), key=lambda item: len(item[1]), reverse=True):
+            if value:
+                answer = re.sub(rf"\b{re.escape(value)}\b", "{" + name + "}", answer)
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entry_id = str(uuid.uuid4())
+            entries[entry_id] = {
+                "id": entry_id,
+                "question": question,
+                "answer": answer,
+                "questionVector": question_vector,
+                "created": time.time(),
+            }
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._matrices.pop(namespace, None)
+            self.admitted += 1
+        return True
+
+    @staticmethod
+    def render(entry: dict, personal_details: Optional[Dict[str, str]] = None) -> str:
+        """The answer of a cached entry with the placeholders filled in with `personal_details`."""
+        answer = entry["answer"]
+        for name, value in (personal_details or {}).items():
+            answer = answer.replace("{" + name + "}", value)
+        return answer
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "admitted": self.admitted, "rejected": self.rejected,
+                "entries": sum(len(entries) for entries in self._namespaces.values())}
+
+    def _expire(self, namespace: str) -> None:
+        entries = self._namespaces.get(namespace)
+        if not entries:
+            return
+        deadline = time.time() - self.ttl_seconds
+        expired = [entry_id for entry_id, entry in entries.items() if entry["created"] < deadline]
+        for entry_id in expired:
+            del entries[entry_id]
+        if expired:
+            self._matrices.pop(namespace, None)
+
+    def _matrix(self, namespace: str) -> tuple:
+        """Question vectors of a namespace stacked into one matrix, rebuilt only after entries change."""
+        cached = self._matrices.get(namespace)
+        if cached is None:
+            entries = self._namespaces.get(namespace, {})
+            entry_ids = list(entries)
+            matrix = np.stack([entries[entry_id]["questionVector"] for entry_id in entry_ids]) if entry_ids else None
+            cached = (entry_ids, matrix)
+            self._matrices[namespace] = cached
+        return cached
+
+
+def _mentions(text: str, value: str) -> bool:
+    return bool(value) and re.search(rf"\b{re.escape(value)}\b", text, re.IGNORECASE) is not None
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache(embed_fn: Callable[[str], List[float]]) -> Optional[SemanticCache]:
+    """
+    Process-wide semantic cache shared by all agents (each agent uses its own namespace), or None unless
+    SEMANTIC_CACHE_ENABLED is set. Tuned with SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE and SEMANTIC_CACHE_TTL.
+    """
+    global _semantic_cache
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    embed_fn,
+                    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                    max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+                    ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+                )
+    return _semantic_cache
@@ -3,6 +3,10 @@ import redis
 import pickle
 import base64
 from typing import Dict
+from agent_common import metrics
+
+session_load = metrics.histogram("session_load_seconds", "Time to load a session from the session store", buckets=metrics.FAST_BUCKETS)
+session_save = metrics.histogram("session_save_seconds", "Time to save a session to the session store", buckets=metrics.FAST_BUCKETS)
 
 class SessionState:  
     def __init__(self): 
@@ -18,17 +22,19 @@ class SessionState:
                 
     def get(self, key):  
         print("getting state")
-        if self.redis_client:
-            self.data = self.redis_client.get(key)  
-            return pickle.loads(base64.b64decode(self.data)) if self.data else None  
-        else:
-            return self.session_store.get(key)
+        with session_load.time():
+            if self.redis_client:
+                data = self.redis_client.get(key)  
+                return pickle.loads(base64.b64decode(data)) if data else None  
+            else:
+                return self.session_store.get(key)
 
           
     def set(self, key, value):  
         print("setting state")
-        if self.redis_client:
-            self.redis_client.set(key, base64.b64encode(pickle.dumps(value)))  
-        else:
-            self.session_store[key]=value
+        with session_save.time():
+            if self.redis_client:
+                self.redis_client.set(key, base64.b64encode(pickle.dumps(value)))  
+            else:
+                self.session_store[key]=value
           
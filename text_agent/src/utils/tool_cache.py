@@ -0,0 +1,148 @@
+#Cache of tool results (DB lookups) per session, filled and invalidated by Smart_Agent according to the agent profiles.
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from agent_common import metrics
+
+tool_cache_hits = metrics.counter("tool_cache_hits", "Tool calls answered from the tool result cache")
+tool_cache_misses = metrics.counter("tool_cache_misses", "Cacheable tool calls that ran the tool")
+tool_cache_invalidations = metrics.counter("tool_cache_invalidations", "Cached tool results evicted by a write")
+tool_cache_seconds_saved = metrics.counter("tool_cache_seconds_saved", "Tool time (mostly DB queries) not spent thanks to cache hits")
+
+
+def normalize_args(args: dict) -> str:
+    """Cache key part for tool arguments: sorted names, scalar values as stripped strings, so 123 and " 123" match."""
+    return json.dumps({name: str(value).strip() if isinstance(value, (str, int, float)) else value for name, value in args.items()},
+                      sort_keys=True, default=str)
+
+
+class ToolResultCache:
+    """
+    Results of read-only tools keyed by (scope, tool name, normalized arguments), the scope being the session
+    the turn belongs to (see tool_cache_scope), so sessions of different customers never share a result. Every
+    entry remembers how long the tool took so that hits can report the time saved.
+
+    Entries expire after the `ttl` given when they are stored, and `invalidate(tools)` evicts the entries of the
+    given tools after a write (e.g. confirm_flight_change evicts load_user_flight_info), in every scope: other
+    sessions may serve the same customer. A call that was running while its tool got invalidated does not store
+    its result, which may predate the write. Least recently used entries are evicted once the cache holds
+    `max_entries`.
+
+    Args:
+        max_entries (int): Maximum entries over all scopes.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], tuple]" = OrderedDict()
+        #tool -> number of invalidations so far
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+
+    def get_or_call(self, scope: str, tool: str, args: dict, ttl: float, call: Callable[[], Tuple[str, float]]) -> Tuple[str, float]:
+        """
+        The cached result of `tool` with `args` for `scope`, or the result of `call` (which returns the tool
+        response and its duration), stored for `ttl` seconds. Returns (response, seconds spent).
+        """
+        key = (scope, tool, normalize_args(args))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.seconds_saved += entry[2]
+                response, seconds = entry[0], entry[2]
+            else:
+                entry = None
+                self.misses += 1
+                generation = self._generations.get(tool, 0)
+        if entry is not None:
+            tool_cache_hits.inc()
+            tool_cache_seconds_saved.inc(seconds)
+            self._report()
+            return response, 0.0
+        tool_cache_misses.inc()
+        response, seconds = call()
+        with self._lock:
+            if self._generations.get(tool, 0) == generation:
+                self._entries[key] = (response, time.monotonic() + ttl, seconds)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        self._report()
+        return response, seconds
+
+    def invalidate(self, tools: Iterable[str]) -> int:
+        """Evict the entries of `tools` in every scope; returns how many were evicted."""
+        tools = set(tools)
+        with self._lock:
+            for tool in tools:
+                self._generations[tool] = self._generations.get(tool, 0) + 1
+            evicted = [key for key in self._entries if key[1] in tools]
+            for key in evicted:
+                del self._entries[key]
+            self.invalidations += len(evicted)
+        tool_cache_invalidations.inc(len(evicted))
+        return len(evicted)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations, "seconds_saved": self.seconds_saved, "entries": len(self._entries)}
+
+    def _report(self) -> None:
+        if (self.hits + self.misses) % 100 == 0:
+            stats = self.stats()
+            print(f"tool cache: {stats['hit_rate']:.1%} hit rate over {self.hits + self.misses} calls, "
+                  f"{stats['seconds_saved'] * 1000:.0f} ms of tool time saved, {stats['invalidations']} entries invalidated")
+
+
+_scope: contextvars.ContextVar = contextvars.ContextVar("tool_cache_scope", default=None)
+
+
+@contextmanager
+def tool_cache_scope(session_id: str):
+    """
+    Tool results cached in the block belong to `session_id`. Agent_Runner wraps every turn in it; tools run on
+    other threads see it when they run in a copy of this context (see tool_executor.call_tool).
+    """
+    token = _scope.set(session_id)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Optional[str]:
+    """Session of the running turn, None outside tool_cache_scope (results are then not cached)."""
+    return _scope.get()
+
+
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> Optional[ToolResultCache]:
+    """
+    Process-wide tool result cache shared by all agents, or None when TOOL_CACHE_ENABLED is false. Which tools
+    are cached, for how long, and which writes invalidate them is set per tool in the agent profiles
+    (`cache_ttl` and `invalidates`); TOOL_CACHE_SIZE bounds the number of entries.
+    """
+    global _tool_cache
+    if os.getenv("TOOL_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _tool_cache is None:
+        with _tool_cache_lock:
+            if _tool_cache is None:
+                _tool_cache = ToolResultCache(max_entries=int(os.getenv("TOOL_CACHE_SIZE", "10000")))
+    return _tool_cache
@@ -0,0 +1,33 @@
+#Bounded thread pool the async agent path uses to run blocking tools (DB queries, embeddings, session I/O) off the event loop.
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Process-wide tool thread pool, sized with TOOL_THREAD_POOL_SIZE (default 16)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_THREAD_POOL_SIZE", "16")),
+                                               thread_name_prefix="agent-tool")
+    return _executor
+
+
+async def call_tool(function, *args, **kwargs):
+    """
+    Await `function(*args, **kwargs)`: coroutine functions run on the event loop, anything else on the tool thread
+    pool, in a copy of the caller's context so the turn's metric spans include it.
+    """
+    if inspect.iscoroutinefunction(function):
+        return await function(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_tool_executor(), functools.partial(contextvars.copy_context().run, function, *args, **kwargs))
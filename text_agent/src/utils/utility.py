@@ -6,7 +6,8 @@ from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime  
 import random  
 from dotenv import load_dotenv  
-from openai import AsyncAzureOpenAI  
+from agent_common.openai_clients import get_async_openai_client
+from agent_common.llm_scheduler import get_llm_scheduler
 from pathlib import Path  
 import json  
 from scipy import spatial  # for calculating vector similarities for search  
@@ -32,11 +33,6 @@ def load_entity(file_path, entity_name):
 # Load environment variables  
 env_path = Path('./') / '.env'  
 load_dotenv(dotenv_path=env_path)  
-async_client = AsyncAzureOpenAI(  
-    api_key=os.environ.get("AZURE_OPENAI_API_KEY"),  
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),  
-    azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),  
-) 
 INTENT_SHIFT_API_KEY = os.environ.get("INTENT_SHIFT_API_KEY")
 INTENT_SHIFT_API_URL = os.environ.get("INTENT_SHIFT_API_URL") 
 INTENT_SHIFT_API_DEPLOYMENT=os.environ.get("INTENT_SHIFT_API_DEPLOYMENT")
@@ -47,7 +43,7 @@ async def detect_intent_change(job_description, conversation):
         start_time = time.time()
         conversation= [{"role":"user", "content":prompt_template.format(job_description=job_description, conversation=conversation)}]
 
-        response = await async_client.chat.completions.create(  
+        response = await get_llm_scheduler().arequest(get_async_openai_client().chat.completions.create, priority="background",  
             model=chat_deployment,  
             messages=conversation,  
         )  
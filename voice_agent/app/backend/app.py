@@ -6,6 +6,9 @@ from aiohttp import web
 from hotel_tools import attach_hotel_tools, attach_hotel_tools_as_backup, get_system_message as get_hotel_system_message, get_agent_name as get_hotel_agent_name, get_domain_description as get_hotel_domain_description
 from flight_tools import attach_flight_tools, attach_flight_tools_as_backup, get_system_message as get_flight_system_message, get_agent_name as get_flight_agent_name, get_domain_description as get_flight_domain_description
 from rtmt import RTMiddleTier
+from agent_common.openai_clients import connection_stats
+from agent_common.llm_scheduler import get_llm_scheduler
+from agent_common import metrics
 from azure.identity import DefaultAzureCredential
 from azure.core.credentials import AzureKeyCredential
 
@@ -44,5 +47,10 @@ if __name__ == "__main__":
     rtmt.attach_to_app(app, "/realtime")
 
     app.add_routes([web.get('/', lambda _: web.FileResponse('./static/index.html'))])
+    #Requests sent to Azure OpenAI by the tools, connections opened and TLS handshakes, to check that connections are reused
+    app.add_routes([web.get('/metrics/openai', lambda _: web.json_response(connection_stats()))])
+    #Rate limit scheduler: 429s, retries, tokens and time waited for capacity, and the state of each deployment
+    app.add_routes([web.get('/metrics/llm', lambda _: web.json_response(dict({name: value for name, value in metrics.snapshot().items() if name.startswith("llm_")},
+                                                                          deployments=get_llm_scheduler().stats())))])
     app.router.add_static('/', path='./static', name='static')
     web.run_app(app, host='localhost', port=8765)
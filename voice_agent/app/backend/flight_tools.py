@@ -1,3 +1,4 @@
+import asyncio  
 import os  
 import json  
 import random  
@@ -12,10 +13,14 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship  
 from scipy import spatial  # for calculating vector similarities for search  
 from dotenv import load_dotenv  
-from openai import AzureOpenAI  
+from agent_common.openai_clients import get_openai_client  
 from dateutil import parser  
   
 from rtmt import RTMiddleTier, Tool, ToolResult, ToolResultDirection  
+from search_registry import SearchIndexRegistry  
+from agent_common.embedding_cache import get_embedding_cache  
+from agent_common.embedding_batcher import get_embedding_batcher  
+from agent_common.llm_scheduler import get_llm_scheduler
   
 # Load environment variables  
 env_path = Path('.') / 'secrets.env'  
@@ -23,11 +28,7 @@ load_dotenv(dotenv_path=env_path)
   
 emb_engine = os.getenv("AZURE_OPENAI_EMB_DEPLOYMENT")  
 chat_engine = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")  
-client = AzureOpenAI(  
-    api_key=os.environ.get("AZURE_OPENAI_API_KEY"),  
-    api_version="2023-12-01-preview",  
-    azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT")  
-)  
+client = get_openai_client("2023-12-01-preview")  
   
 # SQLAlchemy setup  
 sqllite_db_path = os.environ.get("SQLITE_DB_PATH", "../../../data/flight_db.db")  
@@ -65,9 +66,15 @@ Base.metadata.create_all(engine)
 def transfer_conversation(user_request):  
     print("transfer_conversation!", user_request)  
     return f"{user_request}"  
+def create_embedding(text, model=emb_engine):  
+    batcher = get_embedding_batcher(client, model)  
+    if batcher is not None:  
+        return batcher.embed(text)  
+    return get_llm_scheduler().request(client.embeddings.create, input=[text], model=model).data[0].embedding  
+  
 def get_embedding(text, model=emb_engine):  
     text = text.replace("\n", " ")  
-    return client.embeddings.create(input=[text], model=model).data[0].embedding  
+    return get_embedding_cache().get_or_create(model, text, lambda text: create_embedding(text, model))  
   
 # Search Client class  
 class Search_Client:  
@@ -94,9 +101,12 @@ class Search_Client:
             text_content += f"{chunk_id}\n{content}\n"  
         return text_content  
   
+# Policy indexes are loaded once per process and shared by all sessions  
+search_clients = SearchIndexRegistry(Search_Client)  
+  
 def search_airline_knowledgebase(search_query):  
     print("search_airline_knowledgebase")  
-    faiss_search_client = Search_Client("../../../data/flight_policy.json")  
+    faiss_search_client = search_clients.get("../../../data/flight_policy.json")  
     return faiss_search_client.find_article(search_query, topk=3)  
   
 def query_flights(from_, to, departure_time):  
@@ -188,7 +198,8 @@ def load_user_flight_info(user_id):
 # Define tool functions  
 async def search_airline_knowledgebase_tool(args: Any) -> ToolResult:  
     search_query = args['search_query']  
-    result = search_airline_knowledgebase(search_query)  
+    # run off the event loop so searches from concurrent sessions can share an embeddings batch  
+    result = await asyncio.to_thread(search_airline_knowledgebase, search_query)  
     return ToolResult(result, ToolResultDirection.TO_SERVER)  
   
 async def query_flights_tool(args: Any) -> ToolResult:  
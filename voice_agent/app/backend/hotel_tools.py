@@ -1,6 +1,11 @@
 import yaml  
 from typing import Any  
 from rtmt import RTMiddleTier, Tool, ToolResult, ToolResultDirection  
+from search_registry import SearchIndexRegistry  
+from agent_common.embedding_cache import get_embedding_cache  
+from agent_common.embedding_batcher import get_embedding_batcher  
+from agent_common.llm_scheduler import get_llm_scheduler
+import asyncio  
 import os  
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey  
 from sqlalchemy.ext.declarative import declarative_base  
@@ -8,7 +13,7 @@ from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime  
 import random  
 from dotenv import load_dotenv  
-from openai import AzureOpenAI  
+from agent_common.openai_clients import get_openai_client  
 from pathlib import Path  
 import json  
 from scipy import spatial  # for calculating vector similarities for search  
@@ -46,15 +51,17 @@ Base.metadata.create_all(engine)
 # Define your functions  
 emb_engine = os.getenv("AZURE_OPENAI_EMB_DEPLOYMENT")  
 chat_engine = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")  
-client = AzureOpenAI(  
-    api_key=os.environ.get("AZURE_OPENAI_API_KEY"),  
-    api_version="2023-12-01-preview",  
-    azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT")  
-)  
+client = get_openai_client("2023-12-01-preview")  
+  
+def create_embedding(text, model=emb_engine):  
+    batcher = get_embedding_batcher(client, model)  
+    if batcher is not None:  
+        return batcher.embed(text)  
+    return get_llm_scheduler().request(client.embeddings.create, input=[text], model=model).data[0].embedding  
   
 def get_embedding(text, model=emb_engine):  
     text = text.replace("\n", " ")  
-    return client.embeddings.create(input=[text], model=model).data[0].embedding  
+    return get_embedding_cache().get_or_create(model, text, lambda text: create_embedding(text, model))  
   
 # Search Client class  
 class Search_Client():  
@@ -81,6 +88,9 @@ class Search_Client():
             text_content += f"{chunk_id}\n{content}\n"  
         return text_content  
   
+# Policy indexes are loaded once per process and shared by all sessions  
+search_clients = SearchIndexRegistry(Search_Client)  
+  
 # Define your functions  
 def transfer_conversation(user_request):  
     print("transfer_conversation!", user_request)  
@@ -88,7 +98,7 @@ def transfer_conversation(user_request):
   
 def search_hotel_knowledgebase(search_query):  
     print("search_hotel_knowledgebase")  
-    faiss_search_client = Search_Client("../../../data/hotel_policy.json")  
+    faiss_search_client = search_clients.get("../../../data/hotel_policy.json")  
     return faiss_search_client.find_article(search_query, topk=3)  
   
 def query_rooms(hotel_id, check_in_date, check_out_date):  
@@ -163,7 +173,8 @@ def load_user_reservation_info(user_id):
 # Define tool functions  
 async def hotel_search_tool(args: Any) -> ToolResult:  
     search_query = args['search_query']  
-    result = search_hotel_knowledgebase(search_query)  
+    # run off the event loop so searches from concurrent sessions can share an embeddings batch  
+    result = await asyncio.to_thread(search_hotel_knowledgebase, search_query)  
     return ToolResult(result, ToolResultDirection.TO_SERVER)  
   
 async def query_rooms_tool(args: Any) -> ToolResult:  
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+
+class SearchIndexRegistry:
+    """
+    Process-wide cache of search clients keyed by policy file, shared by every websocket session.
+
+    Each file is loaded once with `loader(path)`. When the file's mtime changes the new version is loaded
+    in a background thread and swapped in with a single assignment, so searches already running (and
+    searches started during the reload) keep using the previous client and are never blocked.
+
+    Args:
+        loader (callable): Builds a search client from a policy file path, e.g. `Search_Client`.
+        check_interval (float): Minimum seconds between mtime checks of the same file.
+    """
+
+    def __init__(self, loader: Callable[[str], Any], check_interval: float = 2.0):
+        self.loader = loader
+        self.check_interval = check_interval
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._reloading = set()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Any:
+        key = os.path.abspath(path)
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._load_first(key)
+        client, mtime = entry
+        now = time.monotonic()
+        if now - self._last_checked.get(key, 0.0) >= self.check_interval:
+            self._last_checked[key] = now
+            try:
+                current_mtime = os.path.getmtime(key)
+            except OSError:
+                return client  # file is being replaced, keep serving the loaded version
+            if current_mtime != mtime:
+                self._start_reload(key, current_mtime)
+        return client
+
+    def _load_first(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                mtime = os.path.getmtime(key)
+                entry = (self.loader(key), mtime)
+                self._entries[key] = entry
+                self._last_checked[key] = time.monotonic()
+                print("search index loaded", key)
+        return entry[0]
+
+    def _start_reload(self, key: str, mtime: float) -> None:
+        with self._lock:
+            if key in self._reloading:
+                return
+            self._reloading.add(key)
+        threading.Thread(target=self._reload, args=(key, mtime), daemon=True).start()
+
+    def _reload(self, key: str, mtime: float) -> None:
+        try:
+            client = self.loader(key)
+            self._entries[key] = (client, mtime)
+            print("search index reloaded", key)
+        except Exception as e:
+            # Most likely the file was read mid-write; the next mtime check retries.
+            print("search index reload failed, keeping previous version", key, e)
+        finally:
+            with self._lock:
+                self._reloading.discard(key)
@@ -8,7 +8,8 @@ from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime  
 import random  
 from dotenv import load_dotenv  
-from openai import AzureOpenAI  
+from agent_common.openai_clients import get_openai_client  
+from agent_common.llm_scheduler import get_llm_scheduler
 from pathlib import Path  
 from flight_tools import query_flights, search_airline_knowledgebase,load_user_flight_info, confirm_flight_change,check_change_booking
 import json  
@@ -47,11 +48,7 @@ Base = declarative_base()
 engine = create_engine('sqlite:///../../../data/hotel.db')  
 Session = sessionmaker(bind=engine)  
 session = Session()  
-client = AzureOpenAI(  
-    api_key=os.environ.get("AZURE_OPENAI_API_KEY"),  
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),  
-    azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),  
-)  
+client = get_openai_client()  
 chat_deployment=os.environ.get("AZURE_OPENAI_CHAT_DEPLOYMENT")
 flight_agent =load_entity('smart_prompt.yaml', "flight_agent")
 flight_function_spec = transform_tools(flight_agent.get('tools', []))
@@ -68,7 +65,7 @@ flight_function_map={
 def agent_function(user_request, system_message, function_spec, function_map):
         conversation= [{"role":"system", "content":system_message},{"role":"user", "content":user_request}]
 
-        response = client.chat.completions.create(  
+        response = get_llm_scheduler().request(client.chat.completions.create,  
             model=chat_deployment,  
             messages=conversation,  
             tools=function_spec,  